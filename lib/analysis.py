@@ -16,6 +16,7 @@
 # along with Scan.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
+from pathlib import Path
 
 from rich import box
 from rich.table import Table
@@ -38,6 +39,48 @@ def find_tool_shortname(desc):
     return desc
 
 
+def summarise_run(run, override_rules={}):
+    """Compute the summary for a single run in the SARIF file and
+    compare it against the build break rules
+
+    :param run: SARIF run
+    :param override_rules Build break rules to override for testing
+    :returns tuple of tool name, summary dict and boolean True if the build should break
+    """
+    tool_desc = run["tool"]["driver"]["name"]
+    tool_name = tool_desc
+    failed = False
+    # Initialise
+    tool_summary = {
+        "tool": tool_desc,
+        "critical": 0,
+        "high": 0,
+        "medium": 0,
+        "low": 0,
+        "status": "✅",
+    }
+    results = run.get("results", [])
+    metrics = run.get("properties", {}).get("metrics", None)
+    # If the result includes metrics use it. If not compute it
+    if metrics:
+        tool_summary.update(metrics)
+        tool_summary.pop("total", None)
+    else:
+        for aresult in results:
+            sev = aresult["properties"]["issue_severity"].lower()
+            tool_summary[sev] += 1
+    # Compare against the build break rule to determine status
+    default_rules = config.get("build_break_rules").get("default")
+    tool_rules = config.get("build_break_rules").get(tool_name, {})
+    build_break_rules = {**default_rules, **tool_rules, **override_rules}
+    for rsev in ["critical", "high", "medium", "low"]:
+        if build_break_rules.get("max_" + rsev) is not None:
+            if tool_summary.get(rsev) > build_break_rules["max_" + rsev]:
+                tool_summary["status"] = "❌"
+                failed = True
+    return tool_name, tool_summary, failed
+
+
 def summary(sarif_files, aggregate_file=None, override_rules={}):
     """Generate overall scan summary based on the generated
     SARIF file
@@ -62,39 +105,10 @@ def summary(sarif_files, aggregate_file=None, override_rules={}):
             for run in report_data["runs"]:
                 # Add it to the run data list for aggregation
                 run_data_list.append(run)
-                tool_desc = run["tool"]["driver"]["name"]
-                tool_name = tool_desc
-                # Initialise
-                report_summary[tool_name] = {
-                    "tool": tool_desc,
-                    "critical": 0,
-                    "high": 0,
-                    "medium": 0,
-                    "low": 0,
-                    "status": "✅",
-                }
-                results = run.get("results", [])
-                metrics = run.get("properties", {}).get("metrics", None)
-                # If the result includes metrics use it. If not compute it
-                if metrics:
-                    report_summary[tool_name].update(metrics)
-                    report_summary[tool_name].pop("total", None)
-                else:
-                    for aresult in results:
-                        sev = aresult["properties"]["issue_severity"].lower()
-                        report_summary[tool_name][sev] += 1
-                # Compare against the build break rule to determine status
-                default_rules = config.get("build_break_rules").get("default")
-                tool_rules = config.get("build_break_rules").get(tool_name, {})
-                build_break_rules = {**default_rules, **tool_rules, **override_rules}
-                for rsev in ["critical", "high", "medium", "low"]:
-                    if build_break_rules.get("max_" + rsev) is not None:
-                        if (
-                            report_summary.get(tool_name).get(rsev)
-                            > build_break_rules["max_" + rsev]
-                        ):
-                            report_summary[tool_name]["status"] = "❌"
-                            build_status = "fail"
+                tool_name, tool_summary, failed = summarise_run(run, override_rules)
+                report_summary[tool_name] = tool_summary
+                if failed:
+                    build_status = "fail"
     # Should we store the aggregate data
     if aggregate_file:
         # agg_sarif_file = aggregate_file.replace(".json", ".sarif")
@@ -104,6 +118,44 @@ def summary(sarif_files, aggregate_file=None, override_rules={}):
     return report_summary, build_status
 
 
+class BuildBreakGate(object):
+    """Evaluates the build break rules incrementally as the SARIF files
+    are produced so that the scan can stop once the build is known to fail
+    """
+
+    def __init__(self, reports_dir, override_rules={}):
+        self.reports_dir = reports_dir
+        self.override_rules = override_rules
+        self.evaluated = {}
+        self.failed_tools = []
+
+    def check(self, sarif_files=None):
+        """Evaluate the new or updated SARIF files
+
+        :param sarif_files: List of SARIF files. Defaults to the files in the reports directory
+        :returns boolean True if the build has failed
+        """
+        if sarif_files is None:
+            sarif_files = Path(self.reports_dir).rglob("*.sarif")
+        for sf in sarif_files:
+            sf = Path(sf)
+            try:
+                mtime = sf.stat().st_mtime
+                if self.evaluated.get(sf) == mtime:
+                    continue
+                self.evaluated[sf] = mtime
+                with open(sf, mode="r") as report_file:
+                    report_data = json.loads(report_file.read())
+            except (OSError, ValueError) as e:
+                LOG.debug(e)
+                continue
+            for run in (report_data or {}).get("runs", []):
+                tool_name, _, failed = summarise_run(run, self.override_rules)
+                if failed and tool_name not in self.failed_tools:
+                    self.failed_tools.append(tool_name)
+        return len(self.failed_tools) > 0
+
+
 def print_table(report_summary):
     """Print summary table
     """
@@ -0,0 +1,272 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+
+import lib.config as config
+import lib.jvmdaemon as jvmdaemon
+import lib.tools as tools
+import lib.utils as utils
+from lib.logger import LOG
+
+# Sub directory of the cache directory with the archives
+ARCHIVE_DIR = "appcds"
+
+ARCHIVE_SUFFIX = ".jsa"
+CLASSLIST_SUFFIX = ".classlist"
+# Marker to avoid repeating a dump that is not supported by the jvm
+FAILED_SUFFIX = ".failed"
+
+# Checksums of the jar files keyed by the path, size and modification time
+_checksums = {}
+
+# Dumps deferred until the tools have completed, since a dump takes as long as a run
+# of the tool
+_deferred = []
+_deferred_lock = threading.Lock()
+
+
+def get_tool_jars(args):
+    """
+    Method to identify the java based tool listed in appcds_tools along with its jar files
+
+    :param args: Command and args
+    :return: Tuple of the tool id and the list of jar files or (None, [])
+    """
+    appcds_tools = config.get("appcds_tools", [])
+    if os.path.basename(args[0]) == "java" and "-jar" in args[:-1]:
+        jar_file = args[args.index("-jar") + 1]
+        tool_id = os.path.basename(jar_file)
+        if tool_id in appcds_tools:
+            return tool_id, [jar_file]
+    elif len(args) > 1 and "pmd-bin" in args[0] and args[1] in appcds_tools:
+        lib_dir = tools.get_launcher_lib_dir(args[0])
+        return args[1], sorted(glob.glob(os.path.join(lib_dir, "*.jar")))
+    return None, []
+
+
+def file_checksum(fname):
+    """Compute the sha256 checksum of the file which is reused while the file is unchanged"""
+    stat = os.stat(fname)
+    key = (fname, stat.st_size, stat.st_mtime)
+    if key not in _checksums:
+        h = hashlib.sha256()
+        with open(fname, mode="rb") as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+                h.update(chunk)
+        _checksums[key] = h.hexdigest()
+    return _checksums[key]
+
+
+def get_archive_key(jar_files, env=None):
+    """
+    Method to compute the key of the archive. Archives are valid only for the
+    same jar files and the same jvm
+
+    :param jar_files: List of jar files
+    :param env: Environment variables with the java to use in the PATH
+    :return: Key string or None
+    """
+    java = shutil.which("java", path=(env or os.environ).get("PATH"))
+    if not java or not jar_files:
+        return None
+    java = os.path.realpath(java)
+    h = hashlib.sha256()
+    h.update("{}:{}".format(java, os.stat(java).st_mtime).encode())
+    for jar_file in jar_files:
+        h.update(file_checksum(jar_file).encode())
+    return h.hexdigest()[:16]
+
+
+def prepare(args, env=None):
+    """
+    Method to use the class data sharing archive of the java based tool. When the archive
+    does not exist, the classes loaded by this run are recorded so that the archive
+    can be created with build_archive once the tool has completed
+
+    :param args: Command and args
+    :param env: Environment variables
+    :return: Tuple of args, env and the pending dump or None
+    """
+    if not config.get("appcds_enabled"):
+        return args, env, None
+    try:
+        tool_id, jar_files = get_tool_jars(args)
+        key = get_archive_key(jar_files, env) if tool_id else None
+    except OSError as e:
+        LOG.debug(e)
+        return args, env, None
+    if not key:
+        return args, env, None
+    archive_dir = utils.get_cache_dir(ARCHIVE_DIR)
+    archive_prefix = os.path.join(archive_dir, "{}-{}".format(tool_id, key))
+    archive_file = archive_prefix + ARCHIVE_SUFFIX
+    if os.path.isfile(archive_file):
+        args, env = tools.add_jvm_options(
+            args, env, ["-Xshare:auto", "-XX:SharedArchiveFile=" + archive_file]
+        )
+        return args, env, None
+    if os.path.isfile(archive_prefix + FAILED_SUFFIX):
+        return args, env, None
+    classlist = "{}-{}{}".format(archive_prefix, uuid.uuid4().hex, CLASSLIST_SUFFIX)
+    args, env = tools.add_jvm_options(
+        args, env, ["-XX:DumpLoadedClassList=" + classlist]
+    )
+    pending = {
+        "tool_id": tool_id,
+        "args": args,
+        "env": env,
+        "classlist": classlist,
+        "archive_prefix": archive_prefix,
+    }
+    return args, env, pending
+
+
+def _remove(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+
+def build_archive(pending):
+    """
+    Method to create the archive from the classes loaded by the earlier run of the tool.
+    Archives of the other versions of the tool are removed
+
+    :param pending: Pending dump returned by prepare
+    :return: Archive file or None
+    """
+    classlist = pending["classlist"]
+    archive_prefix = pending["archive_prefix"]
+    archive_file = archive_prefix + ARCHIVE_SUFFIX
+    # Another run of the same tool has created the archive
+    if os.path.isfile(archive_file):
+        _remove(classlist)
+        return archive_file
+    if not os.path.isfile(classlist) or not os.path.getsize(classlist):
+        _remove(classlist)
+        return None
+    tmp_file = "{}-{}.tmp".format(archive_prefix, uuid.uuid4().hex)
+    # The dump uses the same launcher so that the class path matches the later runs
+    args = [a for a in pending["args"] if not a.startswith("-XX:DumpLoadedClassList")]
+    env = dict(pending["env"] or os.environ)
+    if "PMD_JAVA_OPTS" in env:
+        env["PMD_JAVA_OPTS"] = " ".join(
+            o
+            for o in env["PMD_JAVA_OPTS"].split(" ")
+            if not o.startswith("-XX:DumpLoadedClassList")
+        )
+    if os.path.basename(args[0]) == "java":
+        args = args[: args.index("-jar") + 2]
+    else:
+        args = args[:2]
+    args, env = tools.add_jvm_options(
+        args,
+        env,
+        [
+            "-Xshare:dump",
+            "-XX:SharedClassListFile=" + classlist,
+            "-XX:SharedArchiveFile=" + tmp_file,
+        ],
+    )
+    try:
+        cp = subprocess.run(
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            timeout=config.get("appcds_dump_timeout"),
+            check=False,
+        )
+        if cp.returncode or not os.path.isfile(tmp_file):
+            LOG.debug("Unable to create the class data archive for {}".format(args[0]))
+            open(archive_prefix + FAILED_SUFFIX, mode="w").close()
+            return None
+        for old_file in glob.glob(
+            os.path.join(os.path.dirname(archive_prefix), pending["tool_id"] + "-*")
+        ):
+            if old_file.endswith(ARCHIVE_SUFFIX) or old_file.endswith(FAILED_SUFFIX):
+                _remove(old_file)
+        os.replace(tmp_file, archive_file)
+        LOG.debug("Created the class data archive {}".format(archive_file))
+        return archive_file
+    except (OSError, subprocess.TimeoutExpired) as e:
+        LOG.debug(e)
+        return None
+    finally:
+        _remove(classlist)
+        _remove(tmp_file)
+
+
+def defer_archive(pending):
+    """
+    Method to create the archive once the scan has run all the tools
+
+    :param pending: Pending dump returned by prepare
+    """
+    with _deferred_lock:
+        _deferred.append(pending)
+
+
+def build_archives():
+    """
+    Method to create the archives deferred during the scan
+
+    :return: List of archive files
+    """
+    with _deferred_lock:
+        pending_list = list(_deferred)
+        del _deferred[:]
+    archive_files = []
+    for pending in pending_list:
+        archive_file = build_archive(pending)
+        if archive_file and archive_file not in archive_files:
+            archive_files.append(archive_file)
+    return archive_files
+
+
+def start_build():
+    """
+    Method to create the deferred archives in a background thread while the reports
+    are produced. The scan waits for the thread before it exits
+
+    :return: Thread instance or None when there is no archive to create
+    """
+    with _deferred_lock:
+        if not _deferred:
+            return None
+    thread = threading.Thread(target=build_archives, name="appcds")
+    thread.start()
+    return thread
+
+
+class AppCdsHook(tools.ToolHook):
+    """Hook to start the java based tools with the class data sharing archives"""
+
+    def prepare(self, tool_name, args, env=None, cwd=None):
+        # The daemon avoids the jvm startup altogether
+        if jvmdaemon.is_enabled() and jvmdaemon.get_launch(args, cwd, env):
+            return args, env, None
+        return prepare(args, env)
+
+    def complete(self, state, cp=None):
+        defer_archive(state)
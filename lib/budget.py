@@ -0,0 +1,173 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+from rich import box
+from rich.table import Table
+
+import lib.config as config
+import lib.scheduler as scheduler
+from lib.logger import LOG, console
+
+
+def _makespan(tasks, slots):
+    active = {k: t for k, t in tasks.items() if t.status == "pending"}
+    plan = scheduler.plan_tasks(active, slots)
+    return max([end for _, end in plan.values()] or [0]), plan
+
+
+def _skip(task, reason, dropped):
+    task.status = "skipped"
+    dropped.append(
+        {
+            "tool": task.name,
+            "action": reason,
+            "saving": int(task.predicted or 0),
+        }
+    )
+
+
+def _get_floor(tasks):
+    """
+    Method to select the cheapest tool of each project type, which is retained
+    however small the budget is so that the scan still produces results
+
+    :param tasks: Ordered dict of task name and Task with the predicted durations
+    :return: Set of task names
+    """
+    needed = set()
+    for t in tasks.values():
+        if t.status == "pending":
+            needed.update(t.deps)
+    cheapest = {}
+    for t in tasks.values():
+        if t.status != "pending" or t.name in needed:
+            continue
+        current = cheapest.get(t.type_str)
+        if current is None or (t.predicted or 0) < (current.predicted or 0):
+            cheapest[t.type_str] = t
+    return set(t.name for t in cheapest.values())
+
+
+def apply_time_budget(tasks, budget, slots):
+    """
+    Method to select the tools and their depth so that the predicted duration of
+    the scan fits the time budget. The downgrades in tool_budget_downgrades are applied
+    in order. Should the scan still exceed the budget the tasks predicted to finish last
+    are skipped, leaving out the tasks that other tasks depend on and the cheapest
+    tool of each project type
+
+    :param tasks: Ordered dict of task name and Task with the predicted durations
+    :param budget: Time budget in seconds
+    :param slots: Number of tools that can run in parallel
+    :return: List of dict describing the tools that were downgraded or skipped
+    """
+    dropped = []
+    makespan, plan = _makespan(tasks, slots)
+    if makespan <= budget:
+        return dropped
+    removed_args = dict(config.get("tool_args_removed", {}))
+    for step in config.get("tool_budget_downgrades", []):
+        task = tasks.get(step.get("task", step["tool"]))
+        if not task or task.status != "pending" or step["tool"] in removed_args:
+            continue
+        if step.get("skip"):
+            _skip(task, "skipped", dropped)
+        elif step.get("remove_args"):
+            removed_args[step["tool"]] = step["remove_args"]
+            before = task.predicted or 0
+            task.predicted = before * step.get("speedup", 1)
+            dropped.append(
+                {
+                    "tool": step["tool"],
+                    "action": "without " + " ".join(step["remove_args"]),
+                    "saving": int(before - task.predicted),
+                }
+            )
+        makespan, plan = _makespan(tasks, slots)
+        if makespan <= budget:
+            break
+    floor = _get_floor(tasks)
+    while makespan > budget:
+        needed = set(floor)
+        for t in tasks.values():
+            if t.status == "pending":
+                needed.update(t.deps)
+        candidates = [
+            name for name in plan.keys() if name not in needed and plan[name][1] > 0
+        ]
+        if not candidates:
+            break
+        last = max(candidates, key=lambda name: plan[name][1])
+        _skip(tasks[last], "skipped", dropped)
+        makespan, plan = _makespan(tasks, slots)
+    config.set("tool_args_removed", removed_args)
+    for d in dropped:
+        LOG.info(
+            "{} {} to complete the scan within {} seconds".format(
+                d["tool"], d["action"], int(budget)
+            )
+        )
+    if makespan > budget:
+        LOG.warning(
+            "Scan is predicted to take {} seconds, which exceeds the time budget of {} seconds. Tools still running at the deadline will be terminated".format(
+                int(makespan), int(budget)
+            )
+        )
+    return dropped
+
+
+def start_deadline(budget, start_time=None):
+    """
+    Method to set the deadline for the tools. Tools still running at the deadline are
+    terminated and their partial reports are converted
+
+    :param budget: Time budget in seconds
+    :param start_time: Time at which the scan started
+    :return: Remaining time in seconds
+    """
+    start_time = start_time or time.time()
+    config.set("scan_deadline", start_time + budget)
+    return max(start_time + budget - time.time(), 0)
+
+
+def get_remaining():
+    """
+    Method to find the time left until the deadline set by start_deadline
+
+    :return: Remaining time in seconds or None when the scan has no deadline
+    """
+    deadline = config.get("scan_deadline")
+    if not deadline:
+        return None
+    return max(deadline - time.time(), 1)
+
+
+def print_dropped(dropped):
+    """Print the tools that were downgraded or skipped to meet the time budget"""
+    if not dropped:
+        return
+    table = Table(
+        title="Dropped to meet the time budget",
+        box=box.DOUBLE_EDGE,
+        header_style="bold magenta",
+    )
+    table.add_column(header="Tool", justify="left")
+    table.add_column(header="Action", justify="left")
+    table.add_column(header="Saving", justify="right")
+    for d in dropped:
+        table.add_row(d["tool"], d["action"], "{}s".format(d["saving"]))
+    console.print(table)
@@ -77,7 +77,7 @@ def auto_build(type_list, src, reports_dir):
         try:
             dfn = getattr(sys.modules[__name__], "%s_build" % ptype, None)
             if dfn:
-                dfn(src, reports_dir, lang_tools)
+                ret = bool(dfn(src, reports_dir, lang_tools)) and ret
         except Exception:
             continue
     return ret
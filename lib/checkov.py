@@ -0,0 +1,109 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import os
+
+import lib.config as config
+import lib.convert as convertLib
+import lib.tools as tools
+import lib.utils as utils
+from lib.engine import convert_file
+from lib.executor import exec_tool, get_failure_reason
+from lib.logger import DEBUG, LOG
+from lib.scheduler import Task, merge_tasks
+
+# Task that runs checkov once for all the infrastructure types
+CHECKOV_TASK = "checkov"
+
+
+def checkov_merged_scan(tool_names, src, reports_dir, convert):
+    """
+    Method to run checkov once for all the infrastructure types. The json report is
+    split by the check type into the reports of the individual tools
+
+    :param tool_names: List of checkov based tool names
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :return: CompletedProcess instance
+    """
+    os.makedirs(reports_dir, exist_ok=True)
+    report_fname = utils.get_report_file(
+        CHECKOV_TASK, reports_dir, True, ext_name="json"
+    )
+    checkov_args = [a % dict(src=src) for a in tools.get_tool(tool_names[0]).cmd or []]
+    with io.open(report_fname, "w") as stdout:
+        cp = exec_tool(CHECKOV_TASK, checkov_args, cwd=src, stdout=stdout)
+    if not os.path.getsize(report_fname):
+        return cp
+    reports = {
+        t: utils.get_report_file(t, reports_dir, True, ext_name="json")
+        for t in tool_names
+    }
+    checkov_tools = config.get("checkov_tools")
+    try:
+        counts = convertLib.split_checkov_report(
+            report_fname,
+            reports,
+            {t: checkov_tools.get(t, {}).get("check_types", []) for t in tool_names},
+        )
+        LOG.debug("Split the checkov report {}".format(counts))
+    except Exception as e:
+        LOG.debug(e)
+        return cp
+    if not LOG.isEnabledFor(DEBUG):
+        os.remove(report_fname)
+    if convert:
+        failure_reason = get_failure_reason(CHECKOV_TASK, cp)
+        for tool_name, json_fname in reports.items():
+            convert_file(
+                checkov_args[0],
+                checkov_args[1:],
+                src,
+                json_fname,
+                utils.get_report_file(tool_name, reports_dir, True, ext_name="sarif"),
+                failure_reason=failure_reason,
+            )
+    return cp
+
+
+def merge_checkov_tasks(tasks, src, reports_dir, convert):
+    """
+    Method to replace the tasks of the checkov based tools with a single task when
+    more than one infrastructure type is part of the scan, so that the files are
+    parsed once
+
+    :param tasks: Ordered dict of task name and Task
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :return: Combined Task or None
+    """
+    tool_names = [
+        name
+        for name in config.get("checkov_tools").keys()
+        if name in tasks and tasks[name].status == "pending"
+    ]
+    if len(tool_names) < 2:
+        return None
+    task = Task(
+        CHECKOV_TASK,
+        "iac",
+        checkov_merged_scan,
+        (tool_names, src, reports_dir, convert),
+    )
+    LOG.debug("Running checkov once for {}".format(", ".join(tool_names)))
+    return merge_tasks(tasks, tool_names, task)
@@ -43,6 +43,36 @@ DEPSCAN_CMD = "/usr/local/bin/depscan"
 PMD_CMD = "/opt/pmd-bin/bin/run.sh pmd"
 SPOTBUGS_HOME = "/opt/spotbugs"
 
+# Directory used to persist caches and learnt tool statistics between runs
+SCAN_CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "shiftleft-scan",
+)
+
+# Directory shared by the scan processes on the same host to coordinate the tool slots.
+# SCAN_HOST_CPUS and SCAN_HOST_MEMORY (MB) override the capacity of the host
+SCAN_HOST_SLOTS_DIR = None
+
+# Run the java based tools listed in jvm_daemon_tools in a persistent jvm started on first use.
+# Suits the ide mode and pre-commit hooks where the jvm startup dominates the scan
+SCAN_JVM_DAEMON = False
+
+# Directory for the pmd analysis caches which defaults to the pmd directory within
+# SCAN_CACHE_DIR. Persist this directory between the CI builds to reuse the caches
+SCAN_PMD_CACHE_DIR = None
+pmd_cache_enabled = True
+
+# Directory for the psalm caches shared by the psalm based tools, which defaults to the
+# psalm directory within SCAN_CACHE_DIR. Persist this directory between the CI builds
+SCAN_PSALM_CACHE_DIR = None
+psalm_cache_enabled = True
+
+# Analyse only the classes changed since the previous run along with the classes referring
+# to them using spotbugs. Findings of the remaining classes are reused from the previous run.
+# Every class is analysed when more than spotbugs_incremental_max_ratio of them have changed
+SCAN_SPOTBUGS_INCREMENTAL = False
+spotbugs_incremental_max_ratio = 0.3
+
 # Flag to disable telemetry
 DISABLE_TELEMETRY = False
 
@@ -533,6 +563,373 @@ scan_tools_args_map = {
     },
 }
 
+"""
+Sizing of the jvm for the java based tools. The heap in MB is derived from the number of
+compiled classes and the size of the source files, within min and max. The memory slot of the
+tool is enlarged so that the heap is at most heap_ratio of the slot. Tools analysing files
+larger than large_file_bytes on average get a larger stack. The parallel collector is used
+for heaps of parallel_gc_heap MB or more. A tool that runs out of memory is retried once with
+twice the heap. Tools started with an explicit -Xmx are left unchanged
+"""
+jvm_heap_sizing = {
+    "base": 512,
+    "per_class_kb": 64,
+    "per_source_mb": 24,
+    "min": 512,
+    "max": 16384,
+    "heap_ratio": 0.75,
+    "large_file_bytes": 65536,
+    "large_file_stack": "4m",
+    "parallel_gc_heap": 2048,
+}
+
+"""
+Java based tools that can run in the persistent jvm daemon when SCAN_JVM_DAEMON is enabled,
+identified by the jar file or the pmd launcher command. The value is the main class or None
+to use the Main-Class of the jar. The daemon exits after being idle for jvm_daemon_idle_timeout
+seconds. Tools fall back to a new jvm whenever the daemon is not available
+"""
+jvm_daemon_tools = {
+    "spotbugs.jar": None,
+    "detekt-cli.jar": None,
+    "pmd": "net.sourceforge.pmd.PMD",
+}
+jvm_daemon_idle_timeout = 1800
+jvm_daemon_start_timeout = 30
+
+"""
+Java based tools that use class data sharing archives to start faster, identified by the jar
+file or the pmd launcher command. The archive is created in the cache directory from the
+classes loaded by the first run and is recreated whenever the jar files or the jvm change.
+The sl cli is not listed since it is a native binary that starts its own jvm with jar files
+it downloads, so the archive could neither be keyed on the jar files nor passed to that jvm
+"""
+appcds_tools = ["spotbugs.jar", "detekt-cli.jar", "pmd"]
+appcds_enabled = True
+appcds_dump_timeout = 120
+
+"""
+Tools based on pmd along with the extensions of the files they analyse. When more than one
+of these tools is part of the scan, pmd runs once for all of them using the combined
+rulesets and the report is split by the file extensions. Set merge_pmd_tools to false to
+run the tools separately
+"""
+pmd_tools = {
+    "source-java": {"language": "java", "extensions": [".java"]},
+    "source-apex": {"language": "apex", "extensions": [".cls", ".trigger"]},
+    "source-jsp": {
+        "language": "jsp",
+        "extensions": [".jsp", ".jspx", ".jspf", ".tag"],
+    },
+    "source-sql": {
+        "language": "plsql",
+        "extensions": [
+            ".sql",
+            ".trg",
+            ".prc",
+            ".fnc",
+            ".pld",
+            ".pls",
+            ".plh",
+            ".plb",
+            ".pck",
+            ".pks",
+            ".pkh",
+            ".pkb",
+            ".typ",
+            ".tyb",
+            ".tps",
+            ".tpb",
+        ],
+    },
+    "source-vf": {"language": "vf", "extensions": [".page", ".component"]},
+    "source-vm": {"language": "vm", "extensions": [".vm"]},
+}
+merge_pmd_tools = True
+
+"""
+Tools based on spotbugs along with the extensions of their source files. When more than
+one jvm language is part of the scan, spotbugs analyses the classes once and the xml report
+is split by the extension of the source files. Bugs in any other file are reported by the
+first tool. Set merge_spotbugs_tools to false to run the tools separately
+"""
+spotbugs_tools = {
+    "class": {"extensions": [".java"]},
+    "audit-jsp": {"extensions": [".jsp", ".jspx", ".jspf", ".tag"]},
+    "audit-kt": {"extensions": [".kt", ".kts"]},
+    "audit-scala": {"extensions": [".scala"]},
+    "audit-groovy": {"extensions": [".groovy"]},
+}
+merge_spotbugs_tools = True
+
+"""
+Tools based on checkov along with the check types they report. When more than one
+infrastructure type is part of the scan, checkov parses the files once and the failed
+checks are split by their check type. Check types not listed for any of the active tools
+are reported by the first tool. Set merge_checkov_tools to false to run the tools separately
+"""
+checkov_tools = {
+    "source-yaml": {"check_types": []},
+    "source-tf": {"check_types": ["terraform"]},
+    "source-aws": {"check_types": ["cloudformation", "serverless"]},
+    "source-k8s": {"check_types": ["kubernetes", "helm", "kustomize"]},
+}
+merge_checkov_tools = True
+
+"""
+Tools that rarely affect the build break rules. With --advisory-background these tools
+run in a detached background phase after the build status has been computed from the
+results of the remaining (gating) tools
+"""
+advisory_tools = [
+    "yamllint",
+    "staticcheck",
+    "kube-score",
+]
+
+"""
+Expensive tools that run after the cheap first tier tools in tiered mode (--tiered).
+The tools receive only the files flagged by the first tier tools (after) or referring
+to any of the source and sink keywords. Java tools are restricted to the packages of
+the selected files using option. The scope arguments are inserted before the analysis
+target, which is the last argument, or appended to the end of the command as per position.
+The tools are skipped when no file is selected and analyse everything when the selection
+exceeds tiered_max_ratio or tiered_max_files
+"""
+tiered_tools = {
+    "class": {
+        "after": ["source-java"],
+        "extensions": [".java"],
+        "scope": "packages",
+        "option": ["-onlyAnalyze"],
+        "position": "target",
+        "keywords": [
+            r"getParameter|getHeader|getCookies|getQueryString|getInputStream",
+            r"@RequestParam|@PathVariable|@RequestBody|@QueryParam|@FormParam",
+            r"Runtime\.getRuntime|ProcessBuilder|ScriptEngine",
+            r"createQuery|executeQuery|executeUpdate|prepareStatement|JdbcTemplate",
+            r"ObjectInputStream|XMLDecoder|readObject|DocumentBuilder|SAXParser",
+            r"MessageDigest|Cipher\.getInstance|SecureRandom|java\.util\.Random",
+            r"new File\(|FileInputStream|FileOutputStream|Paths\.get",
+            r"sendRedirect|getWriter|InitialContext|\.lookup\(",
+        ],
+    },
+    "taint-php": {
+        "after": [],
+        "extensions": [".php"],
+        "scope": "files",
+        "option": [],
+        # psalm takes the files after the options such as --report
+        "position": "end",
+        "keywords": [
+            r"\$_(GET|POST|REQUEST|COOKIE|FILES|SERVER|ENV)",
+            r"php://input|getenv\(",
+            r"\b(exec|shell_exec|system|passthru|popen|proc_open|eval|assert)\s*\(",
+            r"\b(mysqli?_query|pg_query|->query|->exec|->prepare)\b",
+            r"\b(unserialize|file_get_contents|file_put_contents|fopen|header)\s*\(",
+        ],
+    },
+}
+
+# Beyond these limits the tiered tools analyse everything
+tiered_max_ratio = 0.5
+tiered_max_files = 1000
+
+"""
+Expected cpu and memory (MB) usage for the tools. Used for admission control so that
+heavy tools such as spotbugs and psalm do not get started at the same time on small
+containers. Peak memory usage observed during previous runs takes precedence
+"""
+tool_resource_weights = {
+    "default": {"cpu": 1, "memory": 256},
+    "auto-build": {"cpu": 2, "memory": 2048},
+    "class": {"cpu": 2, "memory": 2048},
+    "audit-jsp": {"cpu": 2, "memory": 2048},
+    "spotbugs": {"cpu": 2, "memory": 3072},
+    "audit-kt": {"cpu": 2, "memory": 2048},
+    "audit-scala": {"cpu": 2, "memory": 2048},
+    "audit-groovy": {"cpu": 2, "memory": 2048},
+    "source-java": {"cpu": 1, "memory": 1024},
+    "source-pmd": {"cpu": 1, "memory": 1536},
+    "source-apex": {"cpu": 1, "memory": 1024},
+    "source-jsp": {"cpu": 1, "memory": 1024},
+    "source-sql": {"cpu": 1, "memory": 1024},
+    "source-vf": {"cpu": 1, "memory": 1024},
+    "source-vm": {"cpu": 1, "memory": 1024},
+    "source-kt": {"cpu": 1, "memory": 1024},
+    "source-php": {"cpu": 1, "memory": 2048},
+    "audit-php": {"cpu": 1, "memory": 2048},
+    "taint-php": {"cpu": 1, "memory": 2048},
+    "source-aws": {"cpu": 1, "memory": 512},
+    "source-k8s": {"cpu": 1, "memory": 512},
+    "source-tf": {"cpu": 1, "memory": 512},
+    "source-yaml": {"cpu": 1, "memory": 512},
+    "checkov": {"cpu": 1, "memory": 1024},
+    "depscan": {"cpu": 1, "memory": 512},
+    "NG SAST": {"cpu": 1, "memory": 1024},
+}
+
+"""
+Arguments that set the number of threads used by the tools internally, keyed by the name
+of the command, script or jar. %(threads)s is replaced with the share of the cpus given to
+the tool. Arguments without the placeholder are passed only when the share exceeds one cpu.
+Java based tools also get -XX:ActiveProcessorCount so that the jvm sizes its gc and
+compiler threads to the share
+"""
+tool_thread_args = {
+    "pmd": ["-threads", "%(threads)s"],
+    "psalm": ["--threads=%(threads)s"],
+    "detekt-cli.jar": ["--parallel"],
+}
+
+"""
+Wall clock limit in seconds for the tools. Use the tool name as the key to override
+the limit for a specific tool via .sastscanrc. A value of 0 disables the limit
+"""
+tool_timeouts = {}
+
+"""
+Default wall clock limit in seconds for each class of tools
+"""
+tool_class_timeouts = {
+    "init": 300,
+    "build": 1800,
+    "class": 2400,
+    "audit": 1800,
+    "source": 1200,
+    "cloud": 3600,
+    "default": 900,
+}
+
+"""
+Descriptors for the tools implemented as scan functions along with any override for the
+tools in scan_tools_args_map. input is one of dir, filelist or artifacts (build output),
+output is the format of the raw report and parser is the name used for the conversion to
+SARIF. incremental tools reuse the results of earlier runs and shardable tools accept
+any subset of their input. Refer to lib/tools.py for the attributes derived automatically
+"""
+tool_descriptors = {
+    "python": {
+        "type": "python",
+        "input": "dir",
+        "output": "json",
+        "parser": "source-python",
+        "shardable": True,
+    },
+    "class": {"type": "java", "input": "artifacts", "output": "xml", "parser": "class"},
+    "source-java": {
+        "type": "java",
+        "input": "dir",
+        "output": "csv",
+        "parser": "source-java",
+    },
+    "nodejs": {
+        "type": "nodejs",
+        "input": "filelist",
+        "output": "json",
+        "parser": "source-js",
+    },
+}
+
+"""
+Estimated cost for each class of tools when there is no history for the tool.
+base is the fixed cost in seconds and kloc is the additional seconds per 1000 lines of code
+"""
+tool_cost_estimates = {
+    "init": {"base": 30, "kloc": 0},
+    "build": {"base": 120, "kloc": 2},
+    "class": {"base": 120, "kloc": 8},
+    "audit": {"base": 60, "kloc": 4},
+    "source": {"base": 20, "kloc": 1},
+    "cloud": {"base": 120, "kloc": 4},
+    "default": {"base": 10, "kloc": 0.5},
+}
+
+"""
+Cheaper alternatives for the expensive tools when the scan has to complete within
+a time budget (--time-budget). The steps are applied in order until the predicted
+duration fits the budget. remove_args lists the arguments to drop for the tool and
+speedup is the expected fraction of the original duration. Steps with skip avoid running
+the task altogether. task defaults to the tool name and is needed only for the tools
+invoked by the scan functions
+"""
+tool_budget_downgrades = [
+    {"tool": "spotbugs", "remove_args": ["-effort:max"], "speedup": 0.6},
+    {"tool": "class", "remove_args": ["-effort:max"], "speedup": 0.6},
+    {"tool": "audit-jsp", "remove_args": ["-effort:max"], "speedup": 0.6},
+    {"tool": "audit-kt", "remove_args": ["-effort:max"], "speedup": 0.6},
+    {"tool": "audit-scala", "remove_args": ["-effort:max"], "speedup": 0.6},
+    {"tool": "audit-groovy", "remove_args": ["-effort:max"], "speedup": 0.6},
+    {
+        "tool": "audit-php",
+        "remove_args": ["--find-dead-code=always", "--find-unused-code=always"],
+        "speedup": 0.7,
+    },
+    {"tool": "taint-php", "skip": True},
+    {"tool": "staticcheck", "skip": True},
+]
+
+"""
+Source file extensions for each project type. Used to compute the size of the
+codebase relevant to a tool. Types not listed here use the size of the whole codebase
+"""
+type_extensions = {
+    "ansible": [".yml", ".yaml"],
+    "apex": [".cls", ".trigger"],
+    "aws": [".json", ".yml", ".yaml", ".tf"],
+    "bash": [".sh"],
+    "csharp": [".cs"],
+    "go": [".go"],
+    "groovy": [".groovy"],
+    "java": [".java"],
+    "jsp": [".jsp"],
+    "kotlin": [".kt", ".kts"],
+    "kubernetes": [".yml", ".yaml"],
+    "nodejs": [".js", ".jsx", ".ts", ".tsx", ".vue"],
+    "php": [".php"],
+    "plsql": [".sql"],
+    "puppet": [".pp"],
+    "python": [".py"],
+    "ruby": [".rb"],
+    "rust": [".rs"],
+    "scala": [".scala"],
+    "terraform": [".tf"],
+    "ts": [".ts", ".tsx"],
+    "vf": [".page", ".component", ".cmp"],
+    "vm": [".vm"],
+    "yaml": [".yml", ".yaml"],
+}
+
+"""
+Tools that need the output of the automatic build such as the class files or the
+installed packages. Keys could either be a tool name or a project type and the values
+are the project types whose build should complete before the tool is started.
+All the other tools run in parallel with the build
+"""
+build_dependent_tools = {
+    "class": ["java", "kotlin", "scala", "groovy"],
+    "java": ["java"],
+    "audit-jsp": ["java", "kotlin", "scala", "groovy"],
+    "audit-kt": ["kotlin"],
+    "audit-scala": ["scala", "java"],
+    "audit-groovy": ["groovy", "java"],
+    "depscan": ["nodejs"],
+    "csharp": ["csharp"],
+    "go": ["go"],
+    "php": ["php"],
+}
+
+"""
+Remove the raw reports produced by the tools after the conversion to SARIF. The raw
+reports are retained by default so that the SARIF files can be regenerated using --reprocess
+"""
+remove_raw_reports = False
+
+"""
+Project types sharing the same build system. Their builds run one after another
+"""
+build_groups = [["java", "kotlin", "scala", "groovy"]]
+
 """
 Map of build tools for various language types. Used for auto build feature
 """
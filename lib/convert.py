@@ -102,6 +102,92 @@ def convert_dataflow(working_dir, tool_args, dataflows):
     return location_list
 
 
+def repair_truncated_json(contents):
+    """
+    Recover the data from a truncated json document up to the last complete
+    element of the innermost array
+
+    :param contents: Truncated json string
+    :return: Parsed data or None if nothing could be recovered
+    """
+    stack = []
+    in_string = False
+    escape = False
+    last_complete = None
+    for i, ch in enumerate(contents):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if stack and stack[-1] == "[":
+                last_complete = (i + 1, list(stack))
+    if not last_complete:
+        return None
+    end, open_brackets = last_complete
+    closing = "".join("]" if b == "[" else "}" for b in reversed(open_brackets))
+    try:
+        return json.loads(contents[:end] + closing)
+    except json.decoder.JSONDecodeError:
+        return None
+
+
+def get_checkov_reports(report_data):
+    """Return the list of reports produced by checkov for each check type
+
+    :param report_data: checkov json which is a list when several frameworks are used
+    """
+    if isinstance(report_data, list):
+        return report_data
+    return [report_data] if report_data else []
+
+
+def split_checkov_report(report_file, report_files, check_types):
+    """Split the checkov report by the check type of the failed checks
+
+    :param report_file: checkov json report covering several frameworks
+    :param report_files: Dict of tool name and the json file to create
+    :param check_types: Dict of tool name and the list of check types such as terraform.
+        Checks of any other type are included in the report of the first tool
+
+    :return: Dict of tool name and the number of failed checks
+    """
+    with io.open(report_file, "r") as rfile:
+        contents = rfile.read()
+    try:
+        report_data = json.loads(contents)
+    except json.decoder.JSONDecodeError:
+        report_data = repair_truncated_json(contents)
+    type_map = {}
+    for tool_name, types in check_types.items():
+        if tool_name not in report_files:
+            continue
+        for check_type in types:
+            type_map.setdefault(check_type, tool_name)
+    default_tool = next(iter(report_files))
+    split_data = {tool_name: [] for tool_name in report_files.keys()}
+    counts = {tool_name: 0 for tool_name in report_files.keys()}
+    for rd in get_checkov_reports(report_data):
+        tool_name = type_map.get(rd.get("check_type"), default_tool)
+        split_data[tool_name].append(rd)
+        counts[tool_name] += len(rd.get("results", {}).get("failed_checks") or [])
+    for tool_name, fname in report_files.items():
+        with io.open(fname, "w") as outfile:
+            json.dump(split_data[tool_name], outfile)
+    return counts
+
+
 def extract_from_file(
     tool_name, tool_args, working_dir, report_file, file_path_list=None
 ):
@@ -127,20 +213,32 @@ def extract_from_file(
         # Static check use jsonlines format, duh
         if tool_name == "staticcheck":
             contents = rfile.read()
-            try:
-                issues = [
-                    json.loads(str(item)) for item in contents.strip().split("\n")
-                ]
-            except json.decoder.JSONDecodeError:
+            invalid_lines = 0
+            for item in contents.strip().split("\n"):
+                try:
+                    issues.append(json.loads(str(item)))
+                except json.decoder.JSONDecodeError:
+                    # Could be a partial line from a terminated run
+                    invalid_lines += 1
+            if invalid_lines and not issues:
                 LOG.warning(
                     "staticcheck produced no result since the project was not built before analysis!"
                 )
             return issues, metrics, skips
         if extn == ".json":
+            contents = rfile.read()
             try:
-                report_data = json.loads(rfile.read())
+                report_data = json.loads(contents)
             except json.decoder.JSONDecodeError:
-                return issues, metrics, skips
+                # Tools terminated after their time limit leave truncated reports behind
+                report_data = repair_truncated_json(contents)
+                if report_data is None:
+                    return issues, metrics, skips
+                LOG.debug(
+                    "Recovered partial results from the truncated report {}".format(
+                        report_file
+                    )
+                )
             # NG SAST (Formerly Inspect) uses vulnerabilities
             if tool_name == "ng-sast":
                 for v in report_data.get("vulnerabilities"):
@@ -216,11 +314,8 @@ def extract_from_file(
                             }
                         )
             elif tool_name == "checkov":
-                if isinstance(report_data, list):
-                    for rd in report_data:
-                        issues += rd.get("results", {}).get("failed_checks")
-                else:
-                    issues = report_data.get("results", {}).get("failed_checks")
+                for rd in get_checkov_reports(report_data):
+                    issues += rd.get("results", {}).get("failed_checks") or []
             elif isinstance(report_data, list):
                 issues = report_data
             else:
@@ -254,7 +349,13 @@ def extract_from_file(
 
 
 def convert_file(
-    tool_name, tool_args, working_dir, report_file, converted_file, file_path_list=None,
+    tool_name,
+    tool_args,
+    working_dir,
+    report_file,
+    converted_file,
+    file_path_list=None,
+    failure_reason=None,
 ):
     """Convert report file
 
@@ -264,6 +365,7 @@ def convert_file(
     :param report_file: Report file
     :param converted_file: Converted file
     :param file_path_list: Full file path for any manipulation
+    :param failure_reason: Reason if the tool did not complete successfully
 
     :return serialized_log: SARIF output data
     """
@@ -279,6 +381,7 @@ def convert_file(
         issues,
         converted_file,
         file_path_list,
+        failure_reason,
     )
 
 
@@ -291,6 +394,7 @@ def report(
     issues,
     crep_fname,
     file_path_list=None,
+    failure_reason=None,
 ):
     """Prints issues in SARIF format
 
@@ -302,6 +406,7 @@ def report(
     :param issues: issues data
     :param crep_fname: The output file name
     :param file_path_list: Full file path for any manipulation
+    :param failure_reason: Reason if the tool did not complete successfully
 
     :return serialized_log: SARIF output data
     """
@@ -364,7 +469,7 @@ def report(
                 invocations=[
                     om.Invocation(
                         end_time_utc=datetime.datetime.utcnow().strftime(TS_FORMAT),
-                        execution_successful=True,
+                        execution_successful=failure_reason is None,
                         working_directory=om.ArtifactLocation(uri=to_uri(wd_dir_log)),
                     )
                 ],
@@ -396,6 +501,10 @@ def report(
     invocation = run.invocations[0]
 
     add_skipped_file_notifications(skips, invocation)
+    if failure_reason:
+        invocation.tool_execution_notifications = [
+            om.Notification(level="error", message=om.Message(text=failure_reason))
+        ]
     add_results(tool_name, issues, run, file_path_list, working_dir)
 
     serialized_log = to_json(log)
@@ -14,19 +14,31 @@
 # along with Scan.  If not, see <https://www.gnu.org/licenses/>.
 
 import csv
+import io
+
+
+def _is_truncated(contents):
+    """Method to find if the last row was cut short, leaving a quoted field open"""
+    if not contents or contents.endswith("\n"):
+        return False
+    return contents[contents.rfind("\n") + 1 :].count('"') % 2 == 1
 
 
 def get_report_data(csvfile):
-    """Convert csv file to dict
+    """Convert csv file to dict. Rows cut short by a tool that was terminated
+    are skipped
 
     :param csvfile: CSV file to parse
     """
-    raw_data = csv.reader(csvfile, delimiter=",")
+    contents = csvfile.read()
+    rows = list(csv.reader(io.StringIO(contents), delimiter=","))
+    if len(rows) > 1 and _is_truncated(contents):
+        rows.pop()
     report_data = []
     headers = None
-    for row in raw_data:
+    for row in rows:
         if not headers:
             headers = [r.lower().replace(" ", "_") for r in row]
-        else:
+        elif len(row) == len(headers):
             report_data.append(dict(zip(headers, row)))
     return headers, report_data
@@ -0,0 +1,530 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rich.progress import Progress
+
+import lib.config as config
+import lib.convert as convertLib
+import lib.hostslots as hostslots
+import lib.manifest as manifest
+import lib.resources as resources
+import lib.tools as tools
+from lib.logger import LOG, console
+
+# Interval in seconds to sample the memory usage of the running tools
+MEMORY_SAMPLE_INTERVAL = 2
+
+# Seconds to wait for the tools to exit after SIGTERM before killing them
+KILL_GRACE_PERIOD = 10
+
+# Share of the heap that the tool should have used for the exit status 3 to be an
+# OutOfMemoryError rather than an exit status of the tool itself
+OOM_PEAK_RATIO = 0.5
+
+# Active engine for the current scan
+_engine = None
+
+# Flag to indicate if the conversion worker has loaded the parent config
+_worker_config_loaded = False
+
+
+def _has_heap_option(args, env):
+    """Method to find if the heap of the jvm is configured explicitly"""
+    env = env or {}
+    options = " ".join(
+        list(args) + [env.get("PMD_JAVA_OPTS", ""), env.get("JAVA_TOOL_OPTIONS", "")]
+    )
+    return "-Xmx" in options
+
+
+def _mp_context():
+    """Multiprocessing context for the conversion workers.
+    forkserver avoids forking a parent that is running many threads
+    """
+    try:
+        return multiprocessing.get_context("forkserver")
+    except ValueError:
+        return multiprocessing.get_context("spawn")
+
+
+def _convert_job(runtime_values, args):
+    """Conversion job executed in the worker process
+
+    :param runtime_values: Runtime config values from the parent process
+    :param args: Arguments for convert_file
+    """
+    global _worker_config_loaded
+    if not _worker_config_loaded:
+        config.runtimeValues.update(runtime_values)
+        config.reload()
+        _worker_config_loaded = True
+    convertLib.convert_file(*args)
+
+
+class ToolProcess(subprocess.CompletedProcess):
+    """CompletedProcess that also records if the tool was terminated after its time limit
+    or cancelled as the outcome of the scan is already known
+    """
+
+    def __init__(
+        self,
+        args,
+        returncode,
+        stdout=None,
+        timed_out=False,
+        timeout=None,
+        cancelled=False,
+    ):
+        super().__init__(args, returncode, stdout)
+        self.timed_out = timed_out
+        self.timeout = timeout
+        self.cancelled = cancelled
+
+
+async def _terminate_group(proc):
+    """Terminate the process group of the tool including any jvm children"""
+    if not hasattr(os, "killpg"):
+        proc.kill()
+        await proc.wait()
+        return
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            break
+        try:
+            await asyncio.wait_for(asyncio.shield(proc.wait()), KILL_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            continue
+    # Children could outlive the group leader
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    await proc.wait()
+
+
+class ExecutionEngine(object):
+    """
+    Runs the external tools from a single asyncio event loop.
+    The scan functions run in lightweight threads and hand over the tool
+    processes to the loop and the report conversion to a small process pool
+    """
+
+    def __init__(self, max_tools=None, convert_workers=None):
+        self.admission = resources.get_admission_controller(max_tools)
+        # Explicit limit allows more tools than the number of cpus
+        if max_tools:
+            self.admission.cpu_budget = max(self.admission.cpu_budget, max_tools)
+        self.max_tools = max_tools or self.admission.cpu_budget
+        self.host_slots = hostslots.get_host_slots()
+        self.convert_workers = convert_workers or min(4, self.max_tools)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.task_pool = ThreadPoolExecutor(max_workers=max(32, self.max_tools * 2))
+        self.convert_pool = _mp_context().Pool(processes=self.convert_workers)
+        self.progress = Progress(
+            console=console,
+            redirect_stderr=False,
+            redirect_stdout=False,
+            refresh_per_second=1,
+        )
+        self.processes = set()
+        self.cancelled = False
+        # Processes started by each task and the tasks that were cancelled individually
+        self.task_processes = {}
+        # Events cancelling the tools that run other than as a process, such as in the
+        # jvm daemon, keyed by the task
+        self.cancel_events = {}
+        self.revoked = set()
+        # Number of tasks that are running or yet to run
+        self.outstanding = 0
+
+    def run_until_complete(self, coro):
+        """Run the given coroutine in the event loop from the main thread"""
+        self.progress.start()
+        try:
+            return self.loop.run_until_complete(coro)
+        finally:
+            self.progress.stop()
+
+    def run_in_thread(self, fn, *args):
+        """Schedule the python function in the thread pool and return the future"""
+        return self.loop.run_in_executor(self.task_pool, fn, *args)
+
+    async def _monitor_memory(self, tool_name, proc):
+        """Sample the memory used by the tool process group and learn its peak usage
+
+        :return: Peak memory in MB
+        """
+        peak = 0
+        while proc.returncode is None:
+            peak = max(peak, resources.get_group_rss(proc.pid))
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(proc.wait()), MEMORY_SAMPLE_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                continue
+        resources.record_peak_memory(tool_name, peak)
+        return peak
+
+    def get_thread_share(self, weight):
+        """
+        Method to compute the number of cpus a tool can use internally. The cpus are
+        shared among the tasks yet to complete so that the last few tools get the
+        whole budget instead of leaving the cpus idle
+
+        :param weight: Weight of the tool
+        :return: Number of threads
+        """
+        outstanding = max(self.outstanding, self.admission.running, 1)
+        share = int(self.admission.cpu_budget // outstanding)
+        return max(share, int(weight.get("cpu", 1)), 1)
+
+    async def _run_process(
+        self,
+        tool_name,
+        args,
+        cwd,
+        env,
+        stdout,
+        stderr,
+        encoding,
+        task_name=None,
+        size=None,
+        memory_demand=None,
+        retry_oom=True,
+        runner=None,
+    ):
+        weight = resources.get_tool_weight(tool_name)
+        heap = None
+        if (
+            memory_demand
+            and tools.is_jvm_command(args)
+            and not _has_heap_option(args, env)
+        ):
+            weight, heap = resources.get_jvm_weight(
+                weight, memory_demand, self.admission.memory_budget
+            )
+        await self.admission.acquire(weight)
+        host_slot = None
+        try:
+            if self.cancelled or task_name in self.revoked:
+                return ToolProcess(args, -1, None, cancelled=True)
+            if self.host_slots:
+                host_slot = await self.host_slots.acquire(tool_name, weight)
+                if self.cancelled or task_name in self.revoked:
+                    return ToolProcess(args, -1, None, cancelled=True)
+            threads = self.get_thread_share(weight)
+            if runner:
+                cp = await self._run_runner(
+                    runner, task_name, threads, args, cwd, env, stdout
+                )
+                if cp is not None:
+                    return cp
+            tool_args, tool_env = args, env
+            args, env = tools.apply_thread_share(args, env, threads)
+            LOG.debug("{} can use {} threads".format(tool_name, threads))
+            if heap:
+                args, env = tools.add_jvm_options(
+                    args, env, resources.get_jvm_options(heap, size, threads)
+                )
+            # Each tool gets its own process group so that its children can be tracked
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=stdout,
+                stderr=stderr,
+                cwd=cwd,
+                env=env,
+                start_new_session=True
+            )
+            self.processes.add(proc)
+            self.task_processes.setdefault(task_name, set()).add(proc)
+            monitor = None
+            peak = 0
+            if os.path.isdir("/proc"):
+                monitor = self.loop.create_task(self._monitor_memory(tool_name, proc))
+            timeout = resources.get_tool_timeout(tool_name)
+            timed_out = False
+            try:
+                out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                LOG.warning(
+                    "{} did not complete within {} seconds and was terminated".format(
+                        tool_name, timeout
+                    )
+                )
+                await _terminate_group(proc)
+                out = None
+                timed_out = True
+            if monitor:
+                peak = await monitor
+            self.processes.discard(proc)
+            self.task_processes[task_name].discard(proc)
+        finally:
+            if host_slot is not None:
+                self.host_slots.release(host_slot)
+            await self.admission.release(weight)
+        if out is not None and encoding:
+            out = out.decode(encoding, errors="replace")
+        # Tools terminated by cancel exit due to the signal
+        cancelled = (self.cancelled or task_name in self.revoked) and (
+            proc.returncode or 0
+        ) < 0
+        # The jvm exits with the status 3 on OutOfMemoryError
+        if (
+            heap
+            and retry_oom
+            and not cancelled
+            and proc.returncode == 3
+            and (monitor is None or peak >= heap * OOM_PEAK_RATIO)
+        ):
+            LOG.info(
+                "{} ran out of memory with a {} MB heap. Retrying with a larger heap".format(
+                    tool_name, heap
+                )
+            )
+            if hasattr(stdout, "truncate"):
+                stdout.seek(0)
+                stdout.truncate()
+            return await self._run_process(
+                tool_name,
+                tool_args,
+                cwd,
+                tool_env,
+                stdout,
+                stderr,
+                encoding,
+                task_name,
+                size,
+                heap * 2,
+                False,
+            )
+        return ToolProcess(args, proc.returncode, out, timed_out, timeout, cancelled)
+
+    async def _run_runner(self, runner, task_name, threads, args, cwd, env, stdout):
+        """
+        Run the tool using the runner in a worker thread, which could be cancelled
+        along with the processes of the task
+
+        :return: CompletedProcess instance or None to run the tool as a process
+        """
+        # The jvm is shared with the other tools so only the tool threads are limited
+        args, env = tools.apply_thread_share(args, env, threads, jvm_options=False)
+        event = threading.Event()
+        events = self.cancel_events.setdefault(task_name, set())
+        events.add(event)
+        try:
+            return await self.loop.run_in_executor(
+                None,
+                functools.partial(
+                    runner, args, cwd=cwd, env=env, stdout=stdout, cancel_event=event
+                ),
+            )
+        finally:
+            events.discard(event)
+
+    def cancel(self):
+        """Terminate the running tools and prevent any new tool from starting.
+        Must be called from the event loop
+        """
+        self.cancelled = True
+        for events in self.cancel_events.values():
+            for event in events:
+                event.set()
+        for proc in list(self.processes):
+            if proc.returncode is None:
+                self.loop.create_task(_terminate_group(proc))
+
+    def cancel_task(self, task_name):
+        """Terminate the tools started by the given task and prevent the task from
+        starting any new tool. Must be called from the event loop
+        """
+        self.revoked.add(task_name)
+        for event in self.cancel_events.get(task_name, []):
+            event.set()
+        for proc in list(self.task_processes.get(task_name, [])):
+            if proc.returncode is None:
+                self.loop.create_task(_terminate_group(proc))
+
+    def run_process(
+        self,
+        tool_name,
+        args,
+        cwd=None,
+        env=None,
+        stdout=None,
+        stderr=None,
+        encoding="utf-8",
+        runner=None,
+    ):
+        """
+        Run the tool in the event loop once the resources are available and wait
+        for its completion. Must be called from a worker thread
+
+        :param runner: Optional callable to run the tool other than as a process,
+            which returns None when the tool has to run as a process
+        :return: CompletedProcess instance
+        """
+        task = manifest.get_current_task()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_process(
+                tool_name,
+                args,
+                cwd,
+                env,
+                stdout,
+                stderr,
+                encoding,
+                task.name if task else None,
+                task.size if task else None,
+                task.memory_demand if task else None,
+                runner=runner,
+            ),
+            self.loop,
+        )
+        return future.result()
+
+    def convert_file(self, *args):
+        """Convert the report using the conversion worker pool"""
+        return self.convert_pool.apply_async(
+            _convert_job, (dict(config.runtimeValues), args)
+        ).get()
+
+    def convert_files(self, jobs):
+        """
+        Convert the reports in parallel using the conversion worker pool
+
+        :param jobs: List of tuples with the arguments for convert_file
+        :return: List of exceptions for the jobs that failed
+        """
+        runtime_values = dict(config.runtimeValues)
+        results = [
+            self.convert_pool.apply_async(_convert_job, (runtime_values, args))
+            for args in jobs
+        ]
+        errors = []
+        for result in results:
+            try:
+                result.get()
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def shutdown(self):
+        self.task_pool.shutdown(wait=True)
+        self.convert_pool.close()
+        self.convert_pool.join()
+        self.loop.close()
+        if self.host_slots:
+            self.host_slots.release_all()
+        resources.save_learnt_weights()
+
+
+def get_engine():
+    """Return the active engine or None"""
+    return _engine
+
+
+def start_engine(max_tools=None, convert_workers=None):
+    """
+    Start the execution engine for the current scan
+
+    :param max_tools: Maximum number of tools to run at once
+    :param convert_workers: Number of report conversion workers
+    :return: ExecutionEngine instance
+    """
+    global _engine
+    if not max_tools and config.get("SCAN_MAX_TOOLS"):
+        max_tools = int(config.get("SCAN_MAX_TOOLS"))
+    if not convert_workers and config.get("SCAN_CONVERT_WORKERS"):
+        convert_workers = int(config.get("SCAN_CONVERT_WORKERS"))
+    _engine = ExecutionEngine(max_tools, convert_workers)
+    LOG.debug(
+        "Execution engine started with {} tool slots and {} conversion workers".format(
+            _engine.max_tools, _engine.convert_workers
+        )
+    )
+    return _engine
+
+
+def shutdown_engine():
+    """Stop the active engine"""
+    global _engine
+    if _engine:
+        _engine.shutdown()
+    _engine = None
+
+
+def convert_file(
+    tool_name,
+    tool_args,
+    working_dir,
+    report_file,
+    converted_file,
+    file_path_list=None,
+    failure_reason=None,
+):
+    """
+    Convert the report file to SARIF. The conversion is performed by the
+    engine worker pool when a scan is in progress and inline otherwise
+
+    :param tool_name: tool name
+    :param tool_args: tool args
+    :param working_dir: Working directory
+    :param report_file: Report file
+    :param converted_file: Converted file
+    :param file_path_list: Full file path for any manipulation
+    :param failure_reason: Reason if the tool did not complete successfully
+    """
+    manifest.record_file(report_file)
+    manifest.record_file(converted_file)
+    manifest.record_conversion(
+        tool_name=tool_name,
+        tool_args=tool_args,
+        working_dir=working_dir,
+        report_file=report_file,
+        converted_file=converted_file,
+        file_path_list=file_path_list,
+        failure_reason=failure_reason,
+    )
+    args = (
+        tool_name,
+        tool_args,
+        working_dir,
+        report_file,
+        converted_file,
+        file_path_list,
+        failure_reason,
+    )
+    if _engine:
+        try:
+            return _engine.convert_file(*args)
+        except Exception as e:
+            LOG.debug(e)
+            LOG.debug(
+                "Conversion worker failed for {}. Retrying inline".format(tool_name)
+            )
+    convertLib.convert_file(*args)
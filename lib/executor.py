@@ -21,12 +21,28 @@ import reporter.grafeas as grafeas
 import reporter.licence as licence
 from rich.progress import Progress
 
+import lib.appcds as appcds
 import lib.config as config
-import lib.convert as convertLib
+import lib.jvmdaemon as jvmdaemon
+import lib.manifest as manifest
+import lib.pmdcache as pmdcache
+import lib.psalmcache as psalmcache
+import lib.spotbugscache as spotbugscache
+import lib.tiers as tiers
+import lib.tools as tools
 import lib.utils as utils
+from lib.engine import convert_file, get_engine
 from lib.logger import DEBUG, LOG, console
+from lib.manifest import record_file
 from lib.telemetry import track
 
+# Hooks adapting the commands of the tools in the order they are applied
+tools.register_hook(pmdcache.PmdCacheHook())
+tools.register_hook(psalmcache.PsalmCacheHook())
+tools.register_hook(spotbugscache.SpotbugsCacheHook())
+tools.register_hook(appcds.AppCdsHook())
+tools.register_hook(jvmdaemon.JvmDaemonHook())
+
 
 def use_java(env):
     """
@@ -78,6 +94,25 @@ def should_convert(convert, tool_name, command, report_fname):
     return False
 
 
+def get_failure_reason(tool_name, cp):
+    """
+    Method to describe why the tool did not complete successfully
+
+    :param tool_name: Tool name
+    :param cp: CompletedProcess instance returned by exec_tool
+    :return: Reason string or None if the tool completed normally
+    """
+    if cp is not None and getattr(cp, "timed_out", False):
+        return "{} did not complete within {} seconds and was terminated. The results are partial".format(
+            tool_name, cp.timeout
+        )
+    if cp is not None and getattr(cp, "cancelled", False):
+        return "{} was cancelled since the build has already failed. The results are partial".format(
+            tool_name
+        )
+    return None
+
+
 def exec_tool(
     tool_name, args, cwd=None, env=utils.get_env(), stdout=subprocess.DEVNULL
 ):
@@ -94,27 +129,64 @@ def exec_tool(
     Returns:
       CompletedProcess instance
     """
+    engine = get_engine()
+    # Tools started from the scan threads share the engine progress bar
+    if engine:
+        return _exec_tool(engine.progress, engine, tool_name, args, cwd, env, stdout)
     with Progress(
         console=console,
         redirect_stderr=False,
         redirect_stdout=False,
         refresh_per_second=1,
     ) as progress:
-        task = None
-        try:
-            env = use_java(env)
-            LOG.debug('⚡︎ Executing {} "{}"'.format(tool_name, " ".join(args)))
-            stderr = subprocess.DEVNULL
-            if LOG.isEnabledFor(DEBUG):
-                stderr = subprocess.STDOUT
-            tool_verb = "Scanning with"
-            if "init" in tool_name:
-                tool_verb = "Initializing"
-            elif "build" in tool_name:
-                tool_verb = "Building with"
-            task = progress.add_task(
-                "[green]" + tool_verb + " " + tool_name, total=100, start=False
+        return _exec_tool(progress, None, tool_name, args, cwd, env, stdout)
+
+
+def _exec_tool(progress, engine, tool_name, args, cwd, env, stdout):
+    task = None
+    cp = None
+    try:
+        env = use_java(env)
+        # Arguments could be removed to complete the scan within the time budget
+        removed_args = config.get("tool_args_removed", {}).get(tool_name)
+        if removed_args:
+            args = [a for a in args if a not in removed_args]
+        # Tiered tools are restricted to the files selected for the task
+        args = tiers.add_scope_args(tool_name, args)
+        # Hooks such as the persistent caches adapt the command
+        descriptor = tools.get_tool(tool_name)
+        args, env, pending = descriptor.prepare(args, env, cwd)
+        cp = descriptor.reuse(pending, args, cwd)
+        if cp is not None:
+            descriptor.complete(pending, cp)
+            return cp
+        LOG.debug('⚡︎ Executing {} "{}"'.format(tool_name, " ".join(args)))
+        stderr = subprocess.DEVNULL
+        if LOG.isEnabledFor(DEBUG):
+            stderr = subprocess.STDOUT
+        tool_verb = "Scanning with"
+        if "init" in tool_name:
+            tool_verb = "Initializing"
+        elif "build" in tool_name:
+            tool_verb = "Building with"
+        task = progress.add_task(
+            "[green]" + tool_verb + " " + tool_name, total=100, start=False
+        )
+        # Hooks could run the tool such as in the jvm daemon, within the engine limits
+        if engine:
+            cp = engine.run_process(
+                tool_name,
+                args,
+                cwd=cwd,
+                env=env,
+                stdout=stdout,
+                stderr=stderr,
+                encoding="utf-8",
+                runner=descriptor.run,
             )
+        else:
+            cp = descriptor.run(args, cwd=cwd, env=env, stdout=stdout)
+        if cp is None:
             cp = subprocess.run(
                 args,
                 stdout=stdout,
@@ -125,18 +197,24 @@ def exec_tool(
                 shell=False,
                 encoding="utf-8",
             )
-            if cp and stdout == subprocess.PIPE:
-                for line in cp.stdout:
-                    progress.update(task, completed=5)
-            if cp and LOG.isEnabledFor(DEBUG) and cp.returncode:
-                LOG.debug(cp.stdout)
-            progress.update(task, completed=100, total=100)
-            return cp
-        except Exception as e:
-            if task:
-                progress.update(task, completed=20, total=10, visible=False)
-            LOG.debug(e)
-            return None
+        if cp and stdout == subprocess.PIPE:
+            for line in cp.stdout:
+                progress.update(task, completed=5)
+        if cp and LOG.isEnabledFor(DEBUG) and cp.returncode:
+            LOG.debug(cp.stdout)
+        if cp:
+            descriptor.complete(pending, cp)
+        progress.update(task, completed=100, total=100)
+        return cp
+    except Exception as e:
+        if task is not None:
+            progress.update(task, completed=20, total=10, visible=False)
+        LOG.debug(e)
+        # Tools that could not be started fail the task running them in the scheduler
+        current = manifest.get_current_task()
+        if cp is None and current is not None:
+            current.exception = e
+        return cp
 
 
 def execute_default_cmd(
@@ -161,6 +239,9 @@ def execute_default_cmd(
       convert Boolean to enable normalisation of reports json
       scan_mode Scan mode string
       repo_context Repo context
+
+    Returns:
+      CompletedProcess instance from the tool execution
     """
     # Check if there is a default command specified for the given type
     # Create the reports dir
@@ -179,15 +260,7 @@ def execute_default_cmd(
         scan_mode=scan_mode,
     )
     # Try to detect if the output could be json
-    outext = ".out"
-    if "json" in default_cmd:
-        outext = ".json"
-    elif "csv" in default_cmd:
-        outext = ".csv"
-    elif "sarif" in default_cmd:
-        outext = ".sarif"
-    elif "xml" in default_cmd:
-        outext = ".xml"
+    outext = "." + tools.guess_output_format(default_cmd)
     report_fname = report_fname_prefix + outext
 
     # If the command doesn't support file output then redirect stdout automatically
@@ -200,7 +273,7 @@ def execute_default_cmd(
         LOG.debug("Output will be written to {}".format(report_fname))
 
     # If the command is requesting list of files then construct the argument
-    filelist_prefix = "(filelist="
+    filelist_prefix = tools.FILELIST_PREFIX
     if default_cmd.find(filelist_prefix) > -1:
         si = default_cmd.find(filelist_prefix)
         ei = default_cmd.find(")", si + 10)
@@ -214,22 +287,39 @@ def execute_default_cmd(
     # Suppress psalm output
     if should_suppress_output(type_str, cmd_with_args[0]):
         stdout = subprocess.DEVNULL
-    exec_tool(tool_name, cmd_with_args, cwd=src, stdout=stdout)
+    try:
+        cp = exec_tool(tool_name, cmd_with_args, cwd=src, stdout=stdout)
+    finally:
+        if stdout and hasattr(stdout, "close"):
+            stdout.close()
+    record_file(report_fname)
     # Should we attempt to convert the report to sarif format
     if should_convert(convert, tool_name, cmd_with_args[0], report_fname):
         crep_fname = utils.get_report_file(
             tool_name, reports_dir, convert, ext_name="sarif"
         )
+        failure_reason = get_failure_reason(tool_name, cp)
         if cmd_with_args[0] == "java" or "pmd-bin" in cmd_with_args[0]:
-            convertLib.convert_file(
-                tool_name, cmd_with_args, src, report_fname, crep_fname,
+            convert_file(
+                tool_name,
+                cmd_with_args,
+                src,
+                report_fname,
+                crep_fname,
+                failure_reason=failure_reason,
             )
         else:
-            convertLib.convert_file(
-                cmd_with_args[0], cmd_with_args[1:], src, report_fname, crep_fname,
+            convert_file(
+                cmd_with_args[0],
+                cmd_with_args[1:],
+                src,
+                report_fname,
+                crep_fname,
+                failure_reason=failure_reason,
             )
+        # Raw reports are retained by default to allow reprocessing
         try:
-            if not LOG.isEnabledFor(DEBUG):
+            if config.get("remove_raw_reports") and not LOG.isEnabledFor(DEBUG):
                 os.remove(report_fname)
         except Exception:
             LOG.debug("Unable to remove file {}".format(report_fname))
@@ -265,3 +355,4 @@ def execute_default_cmd(
                         lf,
                         html_fname,
                     )
+    return cp
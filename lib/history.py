@@ -0,0 +1,292 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import threading
+import time
+
+import lib.config as config
+import lib.resources as resources
+import lib.tools as tools
+import lib.utils as utils
+from lib.logger import LOG
+
+HISTORY_FILE = "tool-history.json"
+
+# Size of the codebase computed during the previous runs
+INVENTORY_FILE = "inventory.json"
+
+# Lines of code are estimated from the file size instead of reading every file
+AVERAGE_LINE_BYTES = 32
+
+# Number of runs to remember for each tool
+MAX_SAMPLES = 10
+
+# Number of runs of the closest size used for the prediction
+NEAREST_SAMPLES = 3
+
+_history = None
+_history_lock = threading.Lock()
+
+# Inventories computed by this process keyed by the source directory and signature
+_inventories = {}
+
+
+def _empty_stats():
+    return {"files": 0, "bytes": 0, "loc": 0}
+
+
+def _estimate_lines(size):
+    return -(-size // AVERAGE_LINE_BYTES)
+
+
+def _build_inventory(src):
+    source_exts = set()
+    for exts in config.get("type_extensions", {}).values():
+        source_exts.update(exts)
+    inventory = {"total": _empty_stats(), "extensions": {}}
+    for root, dirs, files in os.walk(src):
+        utils.filter_ignored_dirs(dirs)
+        if utils.is_ignored_dir(src, os.path.relpath(root, src)):
+            continue
+        for file in files:
+            if utils.is_ignored_file(src, file):
+                continue
+            try:
+                size = os.path.getsize(os.path.join(root, file))
+            except OSError:
+                continue
+            ext = os.path.splitext(file)[1].lower()
+            stats = inventory["extensions"].setdefault(ext, _empty_stats())
+            loc = _estimate_lines(size) if ext in source_exts else 0
+            for s in (stats, inventory["total"]):
+                s["files"] += 1
+                s["bytes"] += size
+                s["loc"] += loc
+    return inventory
+
+
+def get_inventory(src):
+    """
+    Method to compute the size of the codebase by file extension. Only the file sizes
+    are read and the lines are estimated for the extensions listed in type_extensions.
+    The inventory is reused while the signature of the source directory is unchanged
+
+    :param src: Source directory
+    :return: Dict with the overall totals and the stats for each extension
+    """
+    src = os.path.abspath(src)
+    key = "{}:{}".format(src, utils.get_tree_signature(src))
+    if key in _inventories:
+        return _inventories[key]
+    cache_file = os.path.join(utils.get_cache_dir(), INVENTORY_FILE)
+    try:
+        with open(cache_file, mode="r") as fp:
+            cached = json.load(fp)
+    except Exception:
+        cached = {}
+    inventory = cached.get(key)
+    if not inventory:
+        inventory = _build_inventory(src)
+        try:
+            # Only the inventory of the latest signature is kept for each directory
+            cached = {k: v for k, v in cached.items() if not k.startswith(src + ":")}
+            cached[key] = inventory
+            with open(cache_file, mode="w") as fp:
+                json.dump(cached, fp)
+        except OSError as e:
+            LOG.debug(e)
+    _inventories[key] = inventory
+    return inventory
+
+
+def get_type_size(inventory, type_str):
+    """
+    Method to compute the size of the codebase relevant to the given project type
+
+    :param inventory: Inventory from get_inventory
+    :param type_str: Project type
+    :return: Dict with files, bytes and loc
+    """
+    if not inventory:
+        return _empty_stats()
+    exts = config.get("type_extensions", {}).get(type_str)
+    if not exts:
+        return dict(inventory["total"])
+    size = _empty_stats()
+    for ext in exts:
+        stats = inventory["extensions"].get(ext, {})
+        for k in size.keys():
+            size[k] += stats.get(k, 0)
+    return size
+
+
+def _history_file():
+    return os.path.join(utils.get_cache_dir(), HISTORY_FILE)
+
+
+def load_history():
+    """Load the tool durations recorded during the previous runs"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = {}
+            try:
+                with open(_history_file(), mode="r") as fp:
+                    _history = json.load(fp)
+            except Exception as e:
+                LOG.debug(e)
+        return _history
+
+
+def save_history():
+    """Persist the tool durations to the cache directory"""
+    if _history is None:
+        return
+    try:
+        with _history_lock:
+            with open(_history_file(), mode="w") as fp:
+                json.dump(_history, fp)
+    except Exception as e:
+        LOG.debug(e)
+
+
+def record_duration(tool_name, size, duration):
+    """
+    Record the time taken by the tool for a codebase of the given size
+
+    :param tool_name: Tool or task name
+    :param size: Dict with files, bytes and loc
+    :param duration: Duration in seconds
+    """
+    if duration is None:
+        return
+    history = load_history()
+    sample = dict(size)
+    sample["duration"] = round(duration, 2)
+    sample["time"] = int(time.time())
+    with _history_lock:
+        samples = history.setdefault(tool_name, [])
+        samples.append(sample)
+        del samples[:-MAX_SAMPLES]
+
+
+def estimate_duration(tool_name, size):
+    """
+    Method to estimate the duration of a tool that has never been run before
+
+    :param tool_name: Tool name
+    :param size: Dict with files, bytes and loc
+    :return: Duration in seconds
+    """
+    estimate = tools.get_tool(tool_name).cost
+    return estimate.get("base", 0) + estimate.get("kloc", 0) * size["loc"] / 1000
+
+
+def predict_duration(tool_name, size):
+    """
+    Method to predict the duration of the tool for a codebase of the given size.
+    The runs of the closest size are scaled linearly by lines of code. Tools without
+    any history fall back to the estimate for the class of the tool
+
+    :param tool_name: Tool name
+    :param size: Dict with files, bytes and loc
+    :return: Tuple of duration in seconds and the source of the prediction
+    """
+    samples = load_history().get(tool_name)
+    if not samples:
+        return estimate_duration(tool_name, size), "estimate"
+    loc = size.get("loc", 0) + 1
+    nearest = sorted(samples, key=lambda s: abs(s.get("loc", 0) + 1 - loc))[
+        :NEAREST_SAMPLES
+    ]
+    predicted = 0
+    for s in nearest:
+        ratio = loc / (s.get("loc", 0) + 1)
+        # Fixed startup cost means the tools do not scale down linearly
+        predicted += s["duration"] * max(ratio, 0.5)
+    return predicted / len(nearest), "history"
+
+
+def count_classes(src):
+    """
+    Method to count the compiled classes in the source directory. The classes are
+    counted afresh on every call since the build could have produced them
+
+    :param src: Source directory
+    :return: Number of class files
+    """
+    classes = 0
+    for root, dirs, files in os.walk(src):
+        utils.filter_ignored_dirs(dirs)
+        classes += len([f for f in files if f.endswith(".class")])
+    return classes
+
+
+def _uses_classes(task):
+    """Method to find if the task analyses the output of the build"""
+    return any(
+        tools.get_tool(name, task.type_str).needs_build
+        for name in task.merged or [task.name]
+    )
+
+
+def annotate_tasks(tasks, inventory, src=None):
+    """
+    Method to set the size and the predicted duration for the tasks in the graph.
+    The heap of the tasks analysing the build output is sized once they start
+
+    :param tasks: Ordered dict of task name and Task
+    :param inventory: Inventory from get_inventory
+    :param src: Source directory containing the compiled classes
+    """
+    for task in tasks.values():
+        task.size = get_type_size(inventory, task.type_str)
+        task.predicted, task.prediction_source = predict_duration(task.name, task.size)
+        task.memory_demand = resources.get_jvm_memory_demand(task.size)
+        if src and _uses_classes(task):
+            task.class_dir = src
+
+
+def update_memory_demand(task):
+    """
+    Method to size the heap of the task from the classes present when it starts
+
+    :param task: Task about to run
+    """
+    if task.class_dir:
+        task.memory_demand = resources.get_jvm_memory_demand(
+            task.size, count_classes(task.class_dir)
+        )
+
+
+def record_tasks(tasks):
+    """
+    Record the duration of the tasks that ran to completion and persist the history
+
+    :param tasks: Ordered dict of task name and executed Task
+    """
+    for task in tasks.values():
+        if task.status != "success" or task.size is None:
+            continue
+        # Tools that were not run do not have an exit code
+        if task.returncode is None:
+            continue
+        # Duration of a tool terminated due to the time limit is not representative
+        if getattr(task.result, "timed_out", False):
+            continue
+        record_duration(task.name, task.size, task.duration)
+    save_history()
@@ -0,0 +1,230 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import os
+import uuid
+
+import lib.config as config
+import lib.resources as resources
+from lib.logger import LOG
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Lock serialising the changes to the slot files across the scan processes
+LEDGER_LOCK_FILE = ".ledger.lock"
+
+SLOT_SUFFIX = ".slot"
+
+# Interval in seconds to check for free capacity while waiting for a slot
+POLL_INTERVAL = 1
+
+# Interval in seconds to retry the ledger lock held by another scan process
+LEDGER_POLL_INTERVAL = 0.05
+
+
+def _try_lock(fd):
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class HostSlots(object):
+    """
+    Shares the cpu and memory of the host between independent scan processes,
+    for example several scan containers running side by side on a CI host.
+
+    Every running tool is represented by a slot file in the shared directory that
+    records its weight. The owner keeps the slot file locked for as long as the tool
+    runs, so the slots of a process that died are identified by their lock being free
+    and reclaimed. Advisory locks are honoured across containers that mount the
+    same directory on the same host
+    """
+
+    def __init__(self, slots_dir, cpu_budget, memory_budget=None):
+        self.slots_dir = slots_dir
+        self.cpu_budget = cpu_budget
+        self.memory_budget = memory_budget
+        self.held = {}
+        os.makedirs(slots_dir, exist_ok=True)
+
+    def _ledger(self):
+        """Lock the ledger without blocking the event loop
+
+        :return: File descriptor of the locked ledger or None when another scan
+            process is updating the slots
+        """
+        fd = os.open(
+            os.path.join(self.slots_dir, LEDGER_LOCK_FILE), os.O_RDWR | os.O_CREAT
+        )
+        if _try_lock(fd):
+            return fd
+        os.close(fd)
+        return None
+
+    def get_usage(self):
+        """
+        Method to compute the weights of the tools running on the host.
+        Slots left behind by processes that are no longer running are removed
+
+        :return: Tuple of the number of tools, cpu and memory in use
+        """
+        running, cpu, memory = 0, 0, 0
+        for fname in os.listdir(self.slots_dir):
+            if not fname.endswith(SLOT_SUFFIX):
+                continue
+            slot_file = os.path.join(self.slots_dir, fname)
+            if slot_file in self.held.values():
+                weight = self._read_weight(slot_file)
+            else:
+                try:
+                    fd = os.open(slot_file, os.O_RDONLY)
+                except OSError:
+                    continue
+                try:
+                    if _try_lock(fd):
+                        LOG.debug("Reclaiming stale tool slot {}".format(fname))
+                        try:
+                            os.unlink(slot_file)
+                        except FileNotFoundError:
+                            # Slot released by its owner in the meantime
+                            pass
+                        continue
+                    weight = self._read_weight(slot_file)
+                finally:
+                    os.close(fd)
+            running += 1
+            cpu += weight.get("cpu", 1)
+            memory += weight.get("memory", 0)
+        return running, cpu, memory
+
+    @staticmethod
+    def _read_weight(slot_file):
+        try:
+            with open(slot_file, mode="r") as fp:
+                return json.load(fp)
+        except Exception:
+            # Slot that is still being written
+            return {"cpu": 1, "memory": 0}
+
+    def _acquire_locked(self, tool_name, weight):
+        """Acquire a slot for the tool while holding the ledger lock"""
+        running, cpu, memory = self.get_usage()
+        if running and cpu + weight.get("cpu", 1) > self.cpu_budget:
+            return None
+        if (
+            running
+            and self.memory_budget
+            and memory + weight.get("memory", 0) > self.memory_budget
+        ):
+            return None
+        slot_id = uuid.uuid4().hex
+        slot_file = os.path.join(self.slots_dir, slot_id + SLOT_SUFFIX)
+        fd = os.open(slot_file, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        data = dict(weight)
+        data["tool"] = tool_name
+        os.write(fd, json.dumps(data).encode())
+        self.held[fd] = slot_file
+        return fd
+
+    def try_acquire(self, tool_name, weight):
+        """
+        Acquire a slot for the tool if its weight fits within the free capacity of the host.
+        A tool is always admitted when nothing else is running on the host
+
+        :param tool_name: Tool name
+        :param weight: Dict with cpu and memory
+        :return: Slot id or None if the host is busy or another scan process is
+            updating the slots
+        """
+        ledger_fd = self._ledger()
+        if ledger_fd is None:
+            return None
+        try:
+            return self._acquire_locked(tool_name, weight)
+        finally:
+            os.close(ledger_fd)
+
+    async def acquire(self, tool_name, weight):
+        """Wait until the host has capacity for the tool
+
+        :param tool_name: Tool name
+        :param weight: Dict with cpu and memory
+        :return: Slot id to be passed to release
+        """
+        waiting = False
+        while True:
+            ledger_fd = self._ledger()
+            if ledger_fd is None:
+                await asyncio.sleep(LEDGER_POLL_INTERVAL)
+                continue
+            try:
+                slot = self._acquire_locked(tool_name, weight)
+            finally:
+                os.close(ledger_fd)
+            if slot is not None:
+                return slot
+            if not waiting:
+                LOG.debug("Waiting for a host slot to run {}".format(tool_name))
+                waiting = True
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def release(self, slot):
+        """Release the slot acquired for the tool"""
+        slot_file = self.held.pop(slot, None)
+        if slot_file is None:
+            return
+        try:
+            os.unlink(slot_file)
+        except OSError:
+            pass
+        os.close(slot)
+
+    def release_all(self):
+        for slot in list(self.held.keys()):
+            self.release(slot)
+
+
+def get_host_slots():
+    """
+    Construct the host coordinator when SCAN_HOST_SLOTS_DIR is configured.
+    The capacity defaults to the cpus and the physical memory of the host and
+    can be overridden with SCAN_HOST_CPUS and SCAN_HOST_MEMORY (MB)
+
+    :return: HostSlots instance or None
+    """
+    slots_dir = config.get("SCAN_HOST_SLOTS_DIR")
+    if not slots_dir:
+        return None
+    if fcntl is None:
+        LOG.debug("Host slot coordination is not supported on this platform")
+        return None
+    cpus = config.get("SCAN_HOST_CPUS")
+    memory = config.get("SCAN_HOST_MEMORY")
+    try:
+        cpus = int(cpus) if cpus else os.cpu_count() or 1
+        memory = int(memory) if memory else resources.get_physical_memory()
+        return HostSlots(slots_dir, cpus, memory)
+    except (OSError, ValueError) as e:
+        LOG.warning("Unable to use the host slots directory {}".format(slots_dir))
+        LOG.debug(e)
+        return None
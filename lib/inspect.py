@@ -18,8 +18,8 @@ import os
 import requests
 
 import lib.config as config
-import lib.convert as convertLib
 import lib.utils as utils
+from lib.engine import convert_file
 from lib.executor import exec_tool
 from lib.logger import LOG
 from lib.telemetry import track
@@ -264,7 +264,7 @@ def inspect_scan(language, src, reports_dir, convert, repo_context):
         crep_fname = utils.get_report_file(
             "ng-sast", reports_dir, convert, ext_name="sarif"
         )
-        convertLib.convert_file("ng-sast", sl_args[1:], src, report_fname, crep_fname)
+        convert_file("ng-sast", sl_args[1:], src, report_fname, crep_fname)
     track({"id": run_uuid, "scan_mode": "ng-sast", "sl_args": sl_args})
 
 
@@ -0,0 +1,387 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import contextlib
+import glob
+import json
+import os
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import lib.config as config
+import lib.resources as resources
+import lib.tools as tools
+import lib.utils as utils
+from lib.logger import LOG
+
+# Source of the daemon relative to TOOLS_CONFIG_DIR
+DAEMON_SOURCE = "jvm-daemon/ScanDaemon.java"
+
+# Files in the cache directory with the connection details and the daemon log
+STATE_FILE = "jvm-daemon.json"
+PORT_FILE = "jvm-daemon.port"
+LOG_FILE = "jvm-daemon.log"
+
+# Lock serialising the start of the daemon across the scan processes
+START_LOCK_FILE = "jvm-daemon.lock"
+
+# Marker to avoid starting the daemon again on a jvm that cannot run it
+FAILED_FILE = "jvm-daemon.failed"
+
+# Seconds to wait for a connection to the running daemon
+CONNECT_TIMEOUT = 2
+
+# Interval in seconds to check for the port file while the daemon starts
+POLL_INTERVAL = 0.2
+
+# Interval in seconds to check if the tool has been cancelled while it runs
+CANCEL_POLL_INTERVAL = 1
+
+# Line sent to the daemon to interrupt the tool
+CANCEL_REQUEST = b"cancel\n"
+
+# Java versions that need the security manager to be allowed explicitly
+SECURITY_MANAGER_ALLOW_VERSION = 12
+
+JAVA_VERSION_REGEX = re.compile(r'version "(?:1\.)?(\d+)')
+
+
+class ToolCancelled(Exception):
+    """Raised when the tool running in the daemon has been cancelled"""
+
+
+def is_enabled():
+    """Method to find if the tools should run in the persistent jvm daemon"""
+    return tools.get_flag("SCAN_JVM_DAEMON")
+
+
+def get_launch(args, cwd=None, env=None):
+    """
+    Method to identify the class path, main class and arguments of a java based tool
+    listed in jvm_daemon_tools. Relative paths are resolved against the working
+    directory of the tool since the daemon has its own working directory. Tools with
+    options for their own jvm, such as the heap size, have to run in a new jvm
+
+    :param args: Command and args
+    :param cwd: Working directory of the tool
+    :param env: Environment variables of the tool
+    :return: Tuple of class path entries, main class or None to use the jar manifest
+        and the tool args. None when the tool cannot run in the daemon
+    """
+    if not args or any("\n" in a for a in args):
+        return None
+    daemon_tools = config.get("jvm_daemon_tools", {})
+    if os.path.basename(args[0]) == "java":
+        # Options between java and -jar are meant for the jvm
+        if len(args) < 3 or args[1] != "-jar":
+            return None
+        jar_file = args[2]
+        if os.path.basename(jar_file) not in daemon_tools:
+            return None
+        classpath = [jar_file]
+        main_class = daemon_tools[os.path.basename(jar_file)]
+        tool_args = args[3:]
+    elif len(args) > 1 and "pmd-bin" in args[0] and args[1] in daemon_tools:
+        # pmd scripts pass the options to the jvm
+        if (env or {}).get("PMD_JAVA_OPTS", "").strip():
+            return None
+        # pmd launcher script loads the jar files in the lib directory
+        lib_dir = tools.get_launcher_lib_dir(args[0])
+        classpath = sorted(glob.glob(os.path.join(lib_dir, "*.jar")))
+        main_class = daemon_tools[args[1]]
+        tool_args = args[2:]
+    else:
+        return None
+    if not classpath:
+        return None
+    if cwd:
+        classpath = [os.path.join(cwd, c) for c in classpath]
+        tool_args = [
+            os.path.join(cwd, a)
+            if not os.path.isabs(a) and os.path.exists(os.path.join(cwd, a))
+            else a
+            for a in tool_args
+        ]
+    return classpath, main_class, tool_args
+
+
+def _read_state():
+    try:
+        with open(os.path.join(utils.get_cache_dir(), STATE_FILE), mode="r") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _connect(state):
+    try:
+        return socket.create_connection(
+            ("127.0.0.1", state["port"]), timeout=CONNECT_TIMEOUT
+        )
+    except (OSError, KeyError, TypeError):
+        return None
+
+
+@contextlib.contextmanager
+def _start_lock():
+    """Hold the lock on the daemon start so that the scans running at once share one daemon"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(
+        os.path.join(utils.get_cache_dir(), START_LOCK_FILE), os.O_RDWR | os.O_CREAT
+    )
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def get_java_version(java):
+    """
+    Method to identify the major version of the jvm
+
+    :param java: java command
+    :return: Major version such as 11 or None
+    """
+    try:
+        cp = subprocess.run(
+            [java, "-version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=CONNECT_TIMEOUT * 10,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        LOG.debug(e)
+        return None
+    match = JAVA_VERSION_REGEX.search(cp.stdout.decode("utf-8", errors="replace"))
+    return int(match.group(1)) if match else None
+
+
+def start_daemon(env=None):
+    """
+    Start the daemon in the background using the java single-file source launcher.
+    The daemon exits by itself after being idle for jvm_daemon_idle_timeout seconds.
+    The daemon refuses to start on the jvms that cannot trap System.exit, which is
+    remembered until java changes
+
+    :param env: Environment variables with the java to use in the PATH
+    :return: Dict with the pid, port and token of the daemon or None
+    """
+    source = os.path.join(config.get("TOOLS_CONFIG_DIR"), DAEMON_SOURCE)
+    env = dict(env or os.environ)
+    java = shutil.which("java", path=env.get("PATH"))
+    if not os.path.isfile(source) or not java:
+        return None
+    cache_dir = utils.get_cache_dir()
+    java = os.path.realpath(java)
+    java_key = "{}:{}".format(java, os.stat(java).st_mtime)
+    failed_file = os.path.join(cache_dir, FAILED_FILE)
+    if os.path.isfile(failed_file):
+        with open(failed_file, mode="r") as fp:
+            if fp.read() == java_key:
+                return None
+    port_file = os.path.join(cache_dir, PORT_FILE)
+    try:
+        os.remove(port_file)
+    except OSError:
+        pass
+    cmd = [java]
+    version = get_java_version(java)
+    if version and version >= SECURITY_MANAGER_ALLOW_VERSION:
+        cmd.append("-Djava.security.manager=allow")
+    cmd += [source, port_file, str(config.get("jvm_daemon_idle_timeout"))]
+    token = uuid.uuid4().hex
+    env["SCAN_JVM_DAEMON_TOKEN"] = token
+    with open(os.path.join(cache_dir, LOG_FILE), mode="a") as log_fp:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=log_fp,
+            stderr=subprocess.STDOUT,
+            cwd=cache_dir,
+            env=env,
+            start_new_session=True,
+        )
+    deadline = time.time() + config.get("jvm_daemon_start_timeout")
+    while time.time() < deadline and proc.poll() is None:
+        if os.path.isfile(port_file):
+            with open(port_file, mode="r") as fp:
+                state = {"pid": proc.pid, "port": int(fp.read()), "token": token}
+            state_file = os.path.join(cache_dir, STATE_FILE)
+            with open(os.open(state_file, os.O_WRONLY | os.O_CREAT, 0o600), "w") as fp:
+                fp.truncate()
+                json.dump(state, fp)
+            LOG.debug("Started the jvm daemon on port {}".format(state["port"]))
+            return state
+        time.sleep(POLL_INTERVAL)
+    LOG.debug("Unable to start the jvm daemon. Check {}".format(LOG_FILE))
+    if proc.poll() is None:
+        proc.kill()
+    else:
+        with open(failed_file, mode="w") as fp:
+            fp.write(java_key)
+    return None
+
+
+def _get_connection(env=None):
+    """
+    Method to connect to the running daemon or to start it. The start is serialised
+    across the scans and the state is read again once the lock is held, since another
+    scan could have started the daemon meanwhile
+
+    :param env: Environment variables
+    :return: Tuple of the socket and the state or (None, None)
+    """
+    state = _read_state()
+    sock = _connect(state) if state else None
+    if sock:
+        return sock, state
+    with _start_lock():
+        state = _read_state()
+        sock = _connect(state) if state else None
+        if not sock:
+            state = start_daemon(env)
+            sock = _connect(state) if state else None
+    if not sock:
+        return None, None
+    return sock, state
+
+
+def _recv_exact(sock, size, deadline, cancel_event=None):
+    data = b""
+    while len(data) < size:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ToolCancelled()
+        if deadline is not None and time.time() > deadline:
+            raise socket.timeout()
+        try:
+            chunk = sock.recv(size - len(data))
+        except socket.timeout:
+            continue
+        if not chunk:
+            raise ConnectionError("jvm daemon closed the connection")
+        data += chunk
+    return data
+
+
+def _cancel(sock):
+    """Ask the daemon to interrupt the tool. Closing the connection does the same"""
+    try:
+        sock.sendall(CANCEL_REQUEST)
+    except OSError:
+        pass
+
+
+def run_tool(
+    tool_name,
+    args,
+    cwd=None,
+    env=None,
+    stdout=subprocess.DEVNULL,
+    cancel_event=None,
+):
+    """
+    Run the java based tool in the persistent jvm daemon which is started on first use.
+    The tool is interrupted in the daemon when it exceeds its time limit or when the
+    cancel event is set
+
+    :param tool_name: Tool name
+    :param args: Command and args
+    :param cwd: Working directory
+    :param env: Environment variables
+    :param stdout: stdout configuration as used for subprocess
+    :param cancel_event: Optional threading.Event set to cancel the tool
+    :return: CompletedProcess instance or None if the tool has to be run as a process
+    """
+    launch = get_launch(args, cwd, env)
+    if not launch:
+        return None
+    classpath, main_class, tool_args = launch
+    sock, state = _get_connection(env)
+    if not sock:
+        return None
+    timeout = resources.get_tool_timeout(tool_name)
+    # Tools without a time limit run until they complete or are cancelled
+    deadline = time.time() + timeout if timeout else None
+    output = []
+    try:
+        with sock:
+            sock.settimeout(CANCEL_POLL_INTERVAL)
+            request = [state["token"], main_class or ""]
+            request += [str(len(classpath))] + classpath
+            request += [str(len(tool_args))] + tool_args
+            sock.sendall(("\n".join(request) + "\n").encode("utf-8"))
+            try:
+                while True:
+                    (size,) = struct.unpack(
+                        ">i", _recv_exact(sock, 4, deadline, cancel_event)
+                    )
+                    if size < 0:
+                        (returncode,) = struct.unpack(
+                            ">i", _recv_exact(sock, 4, deadline, cancel_event)
+                        )
+                        break
+                    output.append(_recv_exact(sock, size, deadline, cancel_event))
+            except (socket.timeout, ToolCancelled):
+                _cancel(sock)
+                raise
+    except socket.timeout:
+        LOG.warning(
+            "{} did not complete within {} seconds and was interrupted".format(
+                tool_name, timeout
+            )
+        )
+        cp = subprocess.CompletedProcess(args, -9)
+        cp.timed_out = True
+        cp.timeout = timeout
+        return cp
+    except ToolCancelled:
+        cp = subprocess.CompletedProcess(args, -15)
+        cp.cancelled = True
+        return cp
+    except (OSError, struct.error) as e:
+        LOG.debug(e)
+        return None
+    text = b"".join(output).decode("utf-8", errors="replace")
+    if hasattr(stdout, "write"):
+        stdout.write(text)
+    LOG.debug("{} completed in the jvm daemon".format(tool_name))
+    return subprocess.CompletedProcess(
+        args, returncode, text if stdout == subprocess.PIPE else None
+    )
+
+
+class JvmDaemonHook(tools.ToolHook):
+    """Hook to run the java based tools in the persistent jvm daemon"""
+
+    def run(self, tool_name, args, cwd=None, env=None, stdout=None, cancel_event=None):
+        if not is_enabled():
+            return None
+        return run_tool(
+            tool_name, args, cwd=cwd, env=env, stdout=stdout, cancel_event=cancel_event
+        )
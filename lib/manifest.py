@@ -0,0 +1,259 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import threading
+from hashlib import blake2b
+
+import lib.config as config
+import lib.utils as utils
+from lib.logger import LOG
+
+MANIFEST_FILE = "scan-manifest.json"
+
+# Task executed by the current worker thread
+_local = threading.local()
+
+
+def set_current_task(task):
+    """Associate the task with the current thread so that the files it produces can be recorded"""
+    _local.task = task
+
+
+def get_current_task():
+    """Task running in the current thread or None"""
+    return getattr(_local, "task", None)
+
+
+def record_file(fname):
+    """
+    Record the file as an output of the task running in the current thread
+
+    :param fname: Report file
+    """
+    task = getattr(_local, "task", None)
+    if task is None or not fname:
+        return
+    if fname not in task.files:
+        task.files.append(fname)
+
+
+def record_conversion(**kwargs):
+    """
+    Record the arguments used to convert a raw report to SARIF so that
+    the conversion can be repeated with --reprocess
+
+    :param kwargs: Arguments to convert_file
+    """
+    task = getattr(_local, "task", None)
+    if task is None:
+        return
+    task.conversions.append(kwargs)
+
+
+def get_task_fingerprint(task):
+    """
+    Method to compute the fingerprint of the inputs to the task which includes
+    the tool arguments, any argument removed due to the time budget and the arguments
+    added to restrict the tiered tools to the selected files. The source is covered
+    by the fingerprint of the source directory recorded for the whole run
+
+    :param task: Task
+    :return: Hash string
+    """
+    h = blake2b(digest_size=utils.HASH_DIGEST_SIZE)
+    h.update(
+        json.dumps(
+            [
+                task.name,
+                getattr(task.fn, "__name__", str(task.fn)),
+                task.args,
+                config.get("tool_args_removed", {}).get(task.name),
+                task.scope_args,
+            ],
+            default=str,
+            sort_keys=True,
+        ).encode()
+    )
+    return h.hexdigest()
+
+
+class RunManifest(object):
+    """
+    Records the tools executed in the run along with the fingerprint of their
+    inputs, the exit status and the report files they produced. The manifest is
+    saved after every task so that an interrupted run can be resumed
+    """
+
+    def __init__(self, reports_dir, src, run_uuid=None):
+        self.reports_dir = reports_dir
+        self.src = src
+        self.manifest_file = os.path.join(reports_dir, MANIFEST_FILE)
+        self._source_fingerprint = None
+        self._fingerprint_thread = None
+        self.data = {
+            "run_uuid": run_uuid,
+            "src": src,
+            "fingerprint": None,
+            "tasks": {},
+        }
+        self.lock = threading.Lock()
+        self.fingerprint_lock = threading.Lock()
+
+    @property
+    def source_fingerprint(self):
+        """
+        Fingerprint of the source directory. The fingerprint is computed on first use
+        since it requires a walk of the source directory for checkouts without git
+        """
+        with self.fingerprint_lock:
+            if self._source_fingerprint is None:
+                self._source_fingerprint = utils.get_source_fingerprint(
+                    self.src, self.reports_dir
+                )
+                with self.lock:
+                    self.data["fingerprint"] = self._source_fingerprint
+            return self._source_fingerprint
+
+    def _compute_fingerprint(self):
+        if self.source_fingerprint:
+            self.save()
+
+    def wait(self):
+        """Wait for the fingerprint of the source directory to be recorded"""
+        if self._fingerprint_thread:
+            self._fingerprint_thread.join()
+
+    def _load_data(self):
+        try:
+            with open(self.manifest_file, mode="r") as fp:
+                return json.load(fp)
+        except Exception as e:
+            LOG.debug(e)
+            return {}
+
+    def load(self):
+        """Load the manifest from the previous run
+
+        :return: Dict of task name and the recorded entries
+        """
+        return self._load_data().get("tasks", {})
+
+    def load_previous(self):
+        """Use the entries from the previous run as the entries of this run"""
+        self.data["tasks"] = self.load()
+        return self.data["tasks"]
+
+    def resume(self, tasks):
+        """
+        Mark the tasks that completed during the previous run with the same inputs as
+        complete. Tasks that are missing, failed, never started or stale run again
+
+        :param tasks: Ordered dict of task name and Task
+        :return: List of resumed task names
+        """
+        previous_data = self._load_data()
+        fingerprint = previous_data.get("fingerprint")
+        if not fingerprint or fingerprint != self.source_fingerprint:
+            return []
+        previous = previous_data.get("tasks", {})
+        resumed = []
+        for task in tasks.values():
+            if task.status != "pending":
+                continue
+            entry = previous.get(task.name)
+            if not entry or entry.get("status") != "success":
+                continue
+            # Tools that were never started have no exit code. Any exit code is accepted
+            # otherwise since the scanners exit with non-zero when reporting issues
+            if entry.get("returncode") is None:
+                continue
+            if entry.get("fingerprint") != get_task_fingerprint(task):
+                continue
+            if not all(os.path.exists(f) for f in entry.get("files", [])):
+                continue
+            task.status = "success"
+            task.returncode = entry.get("returncode")
+            task.files = list(entry.get("files", []))
+            task.resumed = True
+            self.data["tasks"][task.name] = entry
+            resumed.append(task.name)
+        return resumed
+
+    def record(self, task):
+        """Record the completed task and save the manifest
+
+        :param task: Completed Task
+        """
+        status = task.status
+        if getattr(task.result, "timed_out", False) or getattr(
+            task.result, "cancelled", False
+        ):
+            status = "partial"
+        # Source is fingerprinted in the background while the remaining tools run
+        if self._source_fingerprint is None and self._fingerprint_thread is None:
+            self._fingerprint_thread = threading.Thread(
+                target=self._compute_fingerprint, daemon=True
+            )
+            self._fingerprint_thread.start()
+        with self.lock:
+            self.data["tasks"][task.name] = {
+                "type": task.type_str,
+                "status": status,
+                "returncode": task.returncode,
+                "start_time": task.start_time,
+                "end_time": task.end_time,
+                "fingerprint": get_task_fingerprint(task),
+                # Raw reports are removed after the conversion
+                "files": [f for f in task.files if os.path.exists(f)],
+                "conversions": list(task.conversions),
+            }
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically"""
+        try:
+            os.makedirs(self.reports_dir, exist_ok=True)
+            tmp_file = self.manifest_file + ".tmp"
+            with self.lock:
+                with open(tmp_file, mode="w") as fp:
+                    json.dump(self.data, fp, indent=2)
+                os.replace(tmp_file, self.manifest_file)
+        except Exception as e:
+            LOG.debug(e)
+
+    def get_conversions(self):
+        """List of the conversions recorded for all the tasks"""
+        result = []
+        for entry in self.data["tasks"].values():
+            result += entry.get("conversions", [])
+        return result
+
+    def get_files(self, ext_name=None):
+        """
+        Method to list the existing report files produced by the tools in this run
+
+        :param ext_name: Optional extension such as .sarif to filter the files
+        :return: List of files
+        """
+        result = []
+        for entry in self.data["tasks"].values():
+            for f in entry.get("files", []):
+                if ext_name and not f.endswith(ext_name):
+                    continue
+                if os.path.exists(f) and f not in result:
+                    result.append(f)
+        return result
@@ -0,0 +1,186 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import csv
+import os
+
+import lib.config as config
+import lib.tools as tools
+import lib.utils as utils
+from lib.engine import convert_file
+from lib.executor import exec_tool, get_failure_reason
+from lib.logger import DEBUG, LOG
+from lib.scheduler import Task, merge_tasks
+
+# Task that runs pmd once for all the pmd based tools
+PMD_TASK = "source-pmd"
+
+
+def get_ruleset(tool_name):
+    """
+    Method to find the ruleset used by the pmd based tool
+
+    :param tool_name: Tool name
+    :return: Ruleset path
+    """
+    cmd = tools.get_tool(tool_name).cmd or []
+    if "-R" in cmd[:-1]:
+        return cmd[cmd.index("-R") + 1]
+    return config.get("TOOLS_CONFIG_DIR") + "/rules-pmd.xml"
+
+
+def get_tool_for_file(fname, tool_names):
+    """
+    Method to identify the pmd based tool responsible for the given file
+
+    :param fname: File name from the pmd report
+    :param tool_names: List of the active pmd based tools
+    :return: Tool name or None if the file belongs to an inactive language
+    """
+    ext = os.path.splitext(fname)[1].lower()
+    for tool_name, lang in config.get("pmd_tools").items():
+        if ext in lang.get("extensions", []):
+            return tool_name if tool_name in tool_names else None
+    # Languages such as xml without a dedicated tool
+    return tool_names[0]
+
+
+def split_report(report_fname, tool_names, reports_dir):
+    """
+    Method to split the combined pmd csv report into the reports of the individual tools
+
+    :param report_fname: Combined csv report
+    :param tool_names: List of the active pmd based tools
+    :param reports_dir: Reports directory
+    :return: Dict of tool name and csv report
+    """
+    reports = {
+        t: utils.get_report_file(t, reports_dir, True, ext_name="csv")
+        for t in tool_names
+    }
+    writers = {}
+    files = []
+    try:
+        for tool_name, fname in reports.items():
+            fp = open(fname, mode="w", newline="")
+            files.append(fp)
+            writers[tool_name] = csv.writer(fp, quoting=csv.QUOTE_ALL)
+        with open(report_fname, mode="r", newline="") as rfile:
+            reader = csv.reader(rfile, delimiter=",")
+            headers = next(reader, None)
+            if not headers:
+                return reports
+            for w in writers.values():
+                w.writerow(headers)
+            file_idx = [h.lower() for h in headers].index("file")
+            for row in reader:
+                if len(row) <= file_idx:
+                    continue
+                tool_name = get_tool_for_file(row[file_idx], tool_names)
+                if tool_name:
+                    writers[tool_name].writerow(row)
+    finally:
+        for fp in files:
+            fp.close()
+    return reports
+
+
+def pmd_merged_scan(tool_names, src, reports_dir, convert):
+    """
+    Method to run pmd once for all the pmd based tools. The combined report is
+    split by the language of the files into the reports of the individual tools.
+    Arguments removed from any of the tools to meet the time budget are left out
+
+    :param tool_names: List of pmd based tool names
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :return: CompletedProcess instance
+    """
+    pmd_cmd = config.get("PMD_CMD").split(" ")
+    if not utils.check_command(pmd_cmd[0]):
+        LOG.warning(
+            "Java scanner is not available. Please check if your build uses shiftleft/scan or shiftleft/scan-java as the image"
+        )
+        return None
+    report_fname = utils.get_report_file(PMD_TASK, reports_dir, True, ext_name="csv")
+    rulesets = []
+    for tool_name in tool_names:
+        ruleset = get_ruleset(tool_name)
+        if ruleset not in rulesets:
+            rulesets.append(ruleset)
+    pmd_args = [
+        *pmd_cmd,
+        "-no-cache",
+        "--failOnViolation",
+        "false",
+        "-d",
+        src,
+        "-r",
+        report_fname,
+        "-f",
+        "csv",
+        "-R",
+        ",".join(rulesets),
+    ]
+    removed_args = config.get("tool_args_removed", {})
+    for tool_name in tool_names:
+        pmd_args = [a for a in pmd_args if a not in removed_args.get(tool_name, [])]
+    cp = exec_tool(PMD_TASK, pmd_args, src)
+    if not os.path.isfile(report_fname):
+        return cp
+    reports = split_report(report_fname, tool_names, reports_dir)
+    if not LOG.isEnabledFor(DEBUG):
+        os.remove(report_fname)
+    if convert:
+        failure_reason = get_failure_reason(PMD_TASK, cp)
+        for tool_name, csv_fname in reports.items():
+            convert_file(
+                tool_name,
+                pmd_args[1:],
+                src,
+                csv_fname,
+                utils.get_report_file(tool_name, reports_dir, True, ext_name="sarif"),
+                failure_reason=failure_reason,
+            )
+    return cp
+
+
+def merge_pmd_tasks(tasks, src, reports_dir, convert):
+    """
+    Method to replace the tasks of the pmd based tools with a single task when
+    more than one such tool is part of the scan. Dependencies on the replaced tasks
+    are moved to the combined task. Tools with direct arguments run separately
+
+    :param tasks: Ordered dict of task name and Task
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :return: Combined Task or None
+    """
+    tool_names = [
+        name
+        for name, task in tasks.items()
+        if name in config.get("pmd_tools")
+        and task.status == "pending"
+        and not config.get(name + "_direct_args")
+    ]
+    if len(tool_names) < 2:
+        return None
+    task = Task(
+        PMD_TASK, "pmd", pmd_merged_scan, (tool_names, src, reports_dir, convert)
+    )
+    LOG.debug("Running pmd once for {}".format(", ".join(tool_names)))
+    return merge_tasks(tasks, tool_names, task)
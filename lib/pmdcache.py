@@ -0,0 +1,114 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import glob
+import hashlib
+import os
+
+import lib.config as config
+import lib.tools as tools
+import lib.utils as utils
+from lib.logger import LOG
+
+# Sub directory of the cache directory with the pmd analysis caches
+CACHE_DIR = "pmd"
+
+CACHE_SUFFIX = ".cache"
+
+
+def get_cache_dir():
+    """
+    Directory with the pmd analysis caches. Point SCAN_PMD_CACHE_DIR to a directory
+    persisted by the CI between the builds to reuse the caches
+
+    :return: Directory path
+    """
+    cache_dir = config.get("SCAN_PMD_CACHE_DIR")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+    return utils.get_cache_dir(CACHE_DIR)
+
+
+def get_pmd_version(pmd_cmd):
+    """
+    Method to identify the version of pmd from the jar files next to the launcher
+
+    :param pmd_cmd: pmd launcher script
+    :return: Name of the pmd-core jar or None
+    """
+    lib_dir = tools.get_launcher_lib_dir(pmd_cmd)
+    core_jars = sorted(glob.glob(os.path.join(lib_dir, "pmd-core-*.jar")))
+    return os.path.basename(core_jars[-1]) if core_jars else None
+
+
+def get_cache_file(tool_name, args, cwd=None):
+    """
+    Method to construct the cache file for the pmd run. The cache is specific to the
+    repository and the tool, while the key covers the pmd version and the contents of the
+    rulesets so that a change to either of them starts a new cache
+
+    :param tool_name: Tool name
+    :param args: pmd command and args
+    :param cwd: Working directory
+    :return: Tuple of the cache file and the prefix shared by all the caches of the
+        repository and the tool
+    """
+    src = os.path.abspath(tools.get_arg_value(args, "-d") or cwd or os.getcwd())
+    h = hashlib.sha256()
+    h.update(str(get_pmd_version(args[0])).encode())
+    for ruleset in (tools.get_arg_value(args, "-R") or "").split(","):
+        h.update(ruleset.encode())
+        if os.path.isfile(ruleset):
+            with open(ruleset, mode="rb") as fp:
+                h.update(fp.read())
+    prefix = tools.get_cache_prefix(get_cache_dir(), src, tool_name)
+    return prefix + h.hexdigest()[:12] + CACHE_SUFFIX, prefix
+
+
+def apply_cache(tool_name, args, cwd=None):
+    """
+    Method to replace -no-cache in the pmd command with a persistent analysis cache,
+    so that the files unchanged since the previous run are not analysed again.
+    Caches created for an earlier pmd version or rulesets are removed
+
+    :param tool_name: Tool name
+    :param args: Command and args
+    :param cwd: Working directory
+    :return: List of args
+    """
+    if (
+        not config.get("pmd_cache_enabled")
+        or "pmd-bin" not in args[0]
+        or "-no-cache" not in args
+    ):
+        return args
+    try:
+        cache_file, prefix = get_cache_file(tool_name, args, cwd)
+        for old_file in glob.glob(glob.escape(prefix) + "*" + CACHE_SUFFIX):
+            if old_file != cache_file:
+                os.remove(old_file)
+    except OSError as e:
+        LOG.debug(e)
+        return args
+    idx = args.index("-no-cache")
+    return args[:idx] + ["-cache", cache_file] + args[idx + 1 :]
+
+
+class PmdCacheHook(tools.ToolHook):
+    """Hook to run pmd with the persistent analysis cache"""
+
+    def prepare(self, tool_name, args, env=None, cwd=None):
+        return apply_cache(tool_name, args, cwd), env, None
@@ -0,0 +1,325 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+import lib.config as config
+import lib.tools as tools
+import lib.utils as utils
+from lib.logger import LOG
+
+# Sub directory of the cache directory with the psalm caches
+CACHE_DIR = "psalm"
+
+# Sub directory of the psalm caches with the generated configuration files
+CONFIG_DIR = "config"
+
+CONFIG_FILE = "psalm.xml"
+CONFIG_SUFFIX = ".xml"
+
+# Configuration files that make psalm --init refuse to run
+USER_CONFIG_FILES = [CONFIG_FILE, "psalm.xml.dist"]
+
+# Arguments that disable the psalm caches
+NO_CACHE_ARGS = ["--no-cache", "--no-file-cache"]
+
+# Versions of psalm keyed by the path of the psalm script
+_versions = {}
+
+
+def get_cache_dir():
+    """
+    Directory with the psalm caches. Point SCAN_PSALM_CACHE_DIR to a directory
+    persisted by the CI between the builds to reuse the caches
+
+    :return: Directory path
+    """
+    cache_dir = config.get("SCAN_PSALM_CACHE_DIR")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+    return utils.get_cache_dir(CACHE_DIR)
+
+
+def is_psalm(args):
+    """Method to find if the command is psalm"""
+    return bool(args) and os.path.basename(args[0]) == "psalm"
+
+
+def get_psalm_version(psalm_cmd, env=None):
+    """
+    Method to identify the version of psalm from the composer metadata of the
+    vendor directory containing the psalm installation. The path and modification time
+    of the psalm script are used when the metadata is not available
+
+    :param psalm_cmd: psalm command
+    :param env: Environment variables with the PATH to search
+    :return: Version string or None if psalm is not installed
+    """
+    psalm_cmd = shutil.which(psalm_cmd, path=(env or os.environ).get("PATH"))
+    if not psalm_cmd:
+        return None
+    psalm_cmd = os.path.realpath(psalm_cmd)
+    if psalm_cmd in _versions:
+        return _versions[psalm_cmd]
+    version = "{}:{}".format(psalm_cmd, os.stat(psalm_cmd).st_mtime)
+    parent = os.path.dirname(psalm_cmd)
+    while parent != os.path.dirname(parent):
+        installed = os.path.join(parent, "composer", "installed.json")
+        if os.path.basename(parent) == "vendor" and os.path.isfile(installed):
+            try:
+                with open(installed, mode="r") as fp:
+                    packages = json.load(fp)
+                # composer 2 wraps the list of packages
+                if isinstance(packages, dict):
+                    packages = packages.get("packages", [])
+                for pkg in packages:
+                    if pkg.get("name") == "vimeo/psalm":
+                        version = pkg.get("version_normalized") or pkg.get("version")
+            except (OSError, ValueError, AttributeError) as e:
+                LOG.debug(e)
+            break
+        parent = os.path.dirname(parent)
+    _versions[psalm_cmd] = version
+    return version
+
+
+def _get_root(args, cwd):
+    for a in args:
+        if a.startswith("--root="):
+            return os.path.abspath(a[len("--root=") :])
+    return os.path.abspath(cwd or os.getcwd())
+
+
+def _get_prefix(src, kind):
+    return tools.get_cache_prefix(os.path.join(get_cache_dir(), kind), src)
+
+
+def _remove_stale(prefix, keep):
+    for old_path in glob.glob(glob.escape(prefix) + "*"):
+        if old_path == keep:
+            continue
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.remove(old_path)
+
+
+def get_analysis_cache(args, env=None, cwd=None):
+    """
+    Method to construct the cache directory for the psalm analysis. The directory
+    is shared by all the psalm based tools of the repository, while the key covers
+    composer.lock and the psalm version so that a change to the dependencies or
+    an upgrade of psalm starts a new cache
+
+    :param args: psalm command and args
+    :param env: Environment variables
+    :param cwd: Working directory
+    :return: Tuple of the cache directory and the prefix shared by all the caches of
+        the repository. None when psalm is not installed
+    """
+    version = get_psalm_version(args[0], env)
+    if not version:
+        return None
+    src = _get_root(args, cwd)
+    h = hashlib.sha256()
+    h.update(version.encode())
+    lock_file = os.path.join(src, "composer.lock")
+    if os.path.isfile(lock_file):
+        with open(lock_file, mode="rb") as fp:
+            h.update(fp.read())
+    prefix = _get_prefix(src, "analysis")
+    return prefix + h.hexdigest()[:12], prefix
+
+
+def apply_cache(args, env=None, cwd=None):
+    """
+    Method to replace --no-cache and --no-file-cache in the psalm command with a
+    persistent cache directory, so that the files parsed by one psalm based tool are
+    reused by the others and by the later runs. Caches created for an earlier
+    composer.lock or psalm version are removed
+
+    :param args: Command and args
+    :param env: Environment variables
+    :param cwd: Working directory
+    :return: Tuple of args and env
+    """
+    if (
+        not config.get("psalm_cache_enabled")
+        or not is_psalm(args)
+        or "--init" in args
+        or "--no-cache" not in args
+    ):
+        return args, env
+    try:
+        cache = get_analysis_cache(args, env, cwd)
+        if not cache:
+            return args, env
+        cache_dir, prefix = cache
+        _remove_stale(prefix, cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        LOG.debug(e)
+        return args, env
+    # psalm keeps its caches in XDG_CACHE_HOME unless the project configures otherwise
+    env = dict(env or os.environ)
+    env["XDG_CACHE_HOME"] = cache_dir
+    return [a for a in args if a not in NO_CACHE_ARGS], env
+
+
+def get_layout_key(src):
+    """
+    Method to compute a key for the parts of the source directory used by psalm --init,
+    namely composer.json and the directories containing php files
+
+    :param src: Source directory
+    :return: Hash string
+    """
+    h = hashlib.sha256()
+    composer_file = os.path.join(src, "composer.json")
+    if os.path.isfile(composer_file):
+        with open(composer_file, mode="rb") as fp:
+            h.update(fp.read())
+    for root, dirs, files in os.walk(src):
+        utils.filter_ignored_dirs(dirs)
+        dirs[:] = [d for d in dirs if d != "vendor" and not d.startswith(".")]
+        dirs.sort()
+        if any(f.endswith(".php") for f in files):
+            h.update((os.path.relpath(root, src) + "\n").encode())
+    return h.hexdigest()
+
+
+def get_config_cache(args, env=None, cwd=None):
+    """
+    Method to construct the file caching the configuration generated by psalm --init.
+    The key covers the psalm version, the init arguments and the source layout
+
+    :param args: Command and args
+    :param env: Environment variables
+    :param cwd: Working directory
+    :return: Cache file or None when the command is not psalm --init or the project
+        has its own configuration
+    """
+    if not config.get("psalm_cache_enabled") or not is_psalm(args):
+        return None
+    if "--init" not in args:
+        return None
+    src = _get_root(args, cwd)
+    if any(os.path.exists(os.path.join(src, f)) for f in USER_CONFIG_FILES):
+        return None
+    try:
+        version = get_psalm_version(args[0], env)
+        if not version:
+            return None
+        h = hashlib.sha256()
+        h.update(version.encode())
+        h.update(" ".join(a for a in args[1:] if a != "--root=" + src).encode())
+        h.update(get_layout_key(src).encode())
+        prefix = _get_prefix(src, CONFIG_DIR)
+    except OSError as e:
+        LOG.debug(e)
+        return None
+    return prefix + h.hexdigest()[:12] + CONFIG_SUFFIX
+
+
+def restore_config(config_cache, args, cwd=None):
+    """
+    Method to copy the cached configuration into the project so that psalm --init
+    can be skipped
+
+    :param config_cache: Cache file returned by get_config_cache
+    :param args: Command and args
+    :param cwd: Working directory
+    :return: True if the configuration was restored
+    """
+    if not os.path.isfile(config_cache):
+        return False
+    try:
+        shutil.copyfile(config_cache, os.path.join(_get_root(args, cwd), CONFIG_FILE))
+        return True
+    except OSError as e:
+        LOG.debug(e)
+        return False
+
+
+def save_config(config_cache, args, cwd=None):
+    """
+    Method to cache the configuration generated by psalm --init. Configurations
+    generated for an earlier source layout are removed
+
+    :param config_cache: Cache file returned by get_config_cache
+    :param args: Command and args
+    :param cwd: Working directory
+    """
+    src = _get_root(args, cwd)
+    config_file = os.path.join(src, CONFIG_FILE)
+    if not os.path.isfile(config_file):
+        return
+    tmp_file = config_cache + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(config_cache), exist_ok=True)
+        shutil.copyfile(config_file, tmp_file)
+        os.replace(tmp_file, config_cache)
+        _remove_stale(_get_prefix(src, CONFIG_DIR), config_cache)
+    except OSError as e:
+        LOG.debug(e)
+
+
+class PsalmCacheHook(tools.ToolHook):
+    """
+    Hook to share the persistent cache between the psalm based tools and to skip
+    psalm --init when the configuration for the source layout is cached
+    """
+
+    def prepare(self, tool_name, args, env=None, cwd=None):
+        args, env = apply_cache(args, env, cwd)
+        config_cache = get_config_cache(args, env, cwd)
+        if not config_cache:
+            return args, env, None
+        return args, env, {"config_cache": config_cache, "args": args, "cwd": cwd}
+
+    def reuse(self, state, args, cwd=None):
+        if not restore_config(state["config_cache"], args, cwd):
+            return None
+        LOG.debug("Reusing the cached psalm configuration")
+        state["restored"] = True
+        return subprocess.CompletedProcess(args, 0)
+
+    def complete(self, state, cp=None):
+        if cp and not cp.returncode and not state.get("restored"):
+            save_config(state["config_cache"], state["args"], state["cwd"])
+
+
+def order_tasks(tasks):
+    """
+    Method to run the psalm based tools one after the other, so that the tools
+    started later reuse the files parsed by the earlier ones instead of
+    parsing the codebase at the same time
+
+    :param tasks: Ordered dict of task name and Task
+    """
+    previous = None
+    for task in tasks.values():
+        cmd = task.args[0] if task.args and isinstance(task.args[0], list) else None
+        if not cmd or not is_psalm(cmd) or "--init" in cmd:
+            continue
+        if previous:
+            task.deps.add(previous)
+        previous = task.name
@@ -0,0 +1,119 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from pathlib import Path
+
+import lib.engine as engine
+import lib.tools as tools
+from lib.executor import should_convert
+from lib.logger import LOG
+
+# Suffix used for the raw reports by the tools
+REPORT_SUFFIX = "-report"
+
+
+def jobs_from_file_names(reports_dir, src):
+    """
+    Method to construct the conversion jobs based on the naming convention
+    `<tool>-report.<ext>` of the raw reports. Used when the run manifest is not available
+
+    :param reports_dir: Reports directory
+    :param src: Source directory
+    :return: List of tuples with the arguments for convert_file
+    """
+    jobs = []
+    for report_file in sorted(Path(reports_dir).glob("*" + REPORT_SUFFIX + ".*")):
+        if report_file.suffix == ".sarif":
+            continue
+        tool = tools.get_tool(report_file.name[: report_file.name.rfind(REPORT_SUFFIX)])
+        tool_name = tool.parser
+        tool_args = []
+        # Default commands are converted using the command name except for java based tools
+        if tool.cmd:
+            tool_args = tool.cmd[1:] if tool_name == tool.cmd[0] else tool.cmd
+        report_file = report_file.as_posix()
+        if not should_convert(True, tool_name, tool_name, report_file):
+            continue
+        converted_file = report_file[: report_file.rfind(REPORT_SUFFIX)]
+        converted_file += REPORT_SUFFIX + ".sarif"
+        jobs.append(
+            (tool_name, tool_args, src, report_file, converted_file, None, None)
+        )
+    return jobs
+
+
+def jobs_from_manifest(run_manifest, src):
+    """
+    Method to construct the conversion jobs recorded in the run manifest
+
+    :param run_manifest: RunManifest with the entries from the previous run
+    :param src: Source directory which takes precedence if the recorded directory is missing
+    :return: List of tuples with the arguments for convert_file
+    """
+    jobs = []
+    for c in run_manifest.get_conversions():
+        if not os.path.isfile(c.get("report_file", "")):
+            continue
+        working_dir = c.get("working_dir")
+        if not working_dir or not os.path.isdir(working_dir):
+            working_dir = src
+        jobs.append(
+            (
+                c.get("tool_name"),
+                c.get("tool_args"),
+                working_dir,
+                c.get("report_file"),
+                c.get("converted_file"),
+                c.get("file_path_list"),
+                c.get("failure_reason"),
+            )
+        )
+    return jobs
+
+
+def reprocess(reports_dir, src, run_manifest):
+    """
+    Regenerate the SARIF files from the raw reports in parallel without running any tool.
+    The conversions recorded in the run manifest are repeated and the raw reports are
+    identified by their file names when there is no manifest
+
+    :param reports_dir: Reports directory
+    :param src: Source directory
+    :param run_manifest: RunManifest for the reports directory
+    :return: List of SARIF files
+    """
+    run_manifest.load_previous()
+    jobs = jobs_from_manifest(run_manifest, src)
+    sarif_files = run_manifest.get_files(".sarif")
+    if not jobs:
+        jobs = jobs_from_file_names(reports_dir, src)
+        sarif_files = []
+    sarif_files += [j[4] for j in jobs if j[4] not in sarif_files]
+    if not jobs:
+        LOG.warning(
+            "No raw reports were found in {}. Please run the scan without --reprocess".format(
+                reports_dir
+            )
+        )
+        return []
+    LOG.info("Reprocessing {} reports from {}".format(len(jobs), reports_dir))
+    active_engine = engine.start_engine()
+    try:
+        for e in active_engine.convert_files(jobs):
+            LOG.debug(e)
+    finally:
+        engine.shutdown_engine()
+    return [f for f in sarif_files if os.path.isfile(f)]
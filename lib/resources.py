@@ -0,0 +1,411 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+
+import lib.config as config
+import lib.utils as utils
+from lib.logger import LOG
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# cgroup v1 reports a very large number when there is no memory limit
+UNLIMITED_MEMORY = 1 << 60
+
+# Memory in MB reserved for scan itself and the report conversion
+MEMORY_RESERVE = 512
+
+LEARNT_WEIGHTS_FILE = "tool-resources.json"
+
+_learnt_weights = None
+_learnt_lock = threading.Lock()
+
+
+def _read_file(fname):
+    try:
+        with open(fname, mode="r") as fp:
+            return fp.read().strip()
+    except Exception:
+        return None
+
+
+def get_cgroup_cpu_limit(cgroup_root=CGROUP_ROOT):
+    """
+    Method to find the cpu quota enforced by cgroup v2 or v1
+
+    :param cgroup_root: Root of the cgroup filesystem
+    :return: Number of cpus as float or None if there is no quota
+    """
+    # cgroup v2 uses "quota period" or "max period"
+    cpu_max = _read_file(os.path.join(cgroup_root, "cpu.max"))
+    if cpu_max:
+        parts = cpu_max.split()
+        if len(parts) == 2 and parts[0] != "max":
+            try:
+                return int(parts[0]) / int(parts[1])
+            except ValueError:
+                return None
+        return None
+    for cpu_dir in ["cpu", "cpu,cpuacct", "cpuacct,cpu"]:
+        quota = _read_file(os.path.join(cgroup_root, cpu_dir, "cpu.cfs_quota_us"))
+        period = _read_file(os.path.join(cgroup_root, cpu_dir, "cpu.cfs_period_us"))
+        if quota and period:
+            try:
+                quota = int(quota)
+                period = int(period)
+            except ValueError:
+                return None
+            if quota > 0 and period > 0:
+                return quota / period
+            return None
+    return None
+
+
+def get_cgroup_memory_limit(cgroup_root=CGROUP_ROOT):
+    """
+    Method to find the memory limit enforced by cgroup v2 or v1
+
+    :param cgroup_root: Root of the cgroup filesystem
+    :return: Memory limit in MB or None if there is no limit
+    """
+    limit = _read_file(os.path.join(cgroup_root, "memory.max"))
+    if limit is None:
+        limit = _read_file(os.path.join(cgroup_root, "memory", "memory.limit_in_bytes"))
+    if not limit or limit == "max":
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        return None
+    if limit >= UNLIMITED_MEMORY:
+        return None
+    return limit // (1024 * 1024)
+
+
+def get_cpu_count():
+    """
+    Method to find the number of cpus available to scan taking into account
+    the cpu affinity and any container quota
+
+    :return: Number of cpus as an integer
+    """
+    cpus = os.cpu_count() or 1
+    if hasattr(os, "sched_getaffinity"):
+        cpus = min(cpus, len(os.sched_getaffinity(0)))
+    quota = get_cgroup_cpu_limit()
+    if quota:
+        cpus = min(cpus, max(1, int(math.ceil(quota))))
+    return cpus
+
+
+def get_physical_memory():
+    """
+    Method to find the physical memory of the host in MB
+
+    :return: Memory in MB or None if this could not be determined
+    """
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def get_memory_limit():
+    """
+    Method to find the memory available to scan in MB
+
+    :return: Memory in MB or None if this could not be determined
+    """
+    physical = get_physical_memory()
+    limit = get_cgroup_memory_limit()
+    if limit and physical:
+        return min(limit, physical)
+    return limit or physical
+
+
+def _learnt_weights_file():
+    return os.path.join(utils.get_cache_dir(), LEARNT_WEIGHTS_FILE)
+
+
+def load_learnt_weights():
+    """Load the peak memory usage recorded during the previous runs"""
+    global _learnt_weights
+    with _learnt_lock:
+        if _learnt_weights is None:
+            _learnt_weights = {}
+            try:
+                data = _read_file(_learnt_weights_file())
+                if data:
+                    _learnt_weights = json.loads(data)
+            except Exception as e:
+                LOG.debug(e)
+        return _learnt_weights
+
+
+def record_peak_memory(tool_name, peak_mb):
+    """
+    Record the peak memory observed for the tool. Recent observations are
+    weighted more to adapt to the changes in the codebase
+
+    :param tool_name: Tool name
+    :param peak_mb: Peak memory usage in MB
+    """
+    if not peak_mb:
+        return
+    weights = load_learnt_weights()
+    with _learnt_lock:
+        existing = weights.get(tool_name, {}).get("memory")
+        if existing:
+            peak_mb = int((existing + peak_mb * 3) / 4)
+        weights.setdefault(tool_name, {})["memory"] = int(peak_mb)
+
+
+def save_learnt_weights():
+    """Persist the learnt weights to the cache directory"""
+    if _learnt_weights is None:
+        return
+    try:
+        with _learnt_lock:
+            with open(_learnt_weights_file(), mode="w") as fp:
+                json.dump(_learnt_weights, fp)
+    except Exception as e:
+        LOG.debug(e)
+
+
+def get_tool_weight(tool_name):
+    """
+    Method to compute the cpu and memory weight for the given tool.
+    Learnt memory usage takes precedence over the declared weight
+
+    :param tool_name: Tool name
+    :return: Dict with cpu and memory (MB)
+    """
+    weights = config.get("tool_resource_weights")
+    weight = dict(weights.get("default", {"cpu": 1, "memory": 256}))
+    weight.update(weights.get(tool_name, {}))
+    learnt = load_learnt_weights().get(tool_name, {})
+    if learnt.get("memory"):
+        # Allow some headroom over the observed peak
+        weight["memory"] = int(learnt.get("memory") * 1.2)
+    return weight
+
+
+def get_jvm_memory_demand(size, classes=0):
+    """
+    Method to estimate the heap required by a java based tool from the size of the codebase
+
+    :param size: Dict with the files, bytes and loc relevant to the tool
+    :param classes: Number of compiled classes
+    :return: Heap size in MB
+    """
+    sizing = config.get("jvm_heap_sizing")
+    source_mb = (size or {}).get("bytes", 0) / (1024 * 1024)
+    demand = (
+        sizing["base"]
+        + classes * sizing["per_class_kb"] / 1024
+        + source_mb * sizing["per_source_mb"]
+    )
+    return int(min(max(demand, sizing["min"]), sizing["max"]))
+
+
+def get_jvm_weight(weight, demand, memory_budget=None):
+    """
+    Method to enlarge the memory slot of the java based tool to fit the heap it requires
+
+    :param weight: Weight of the tool
+    :param demand: Heap size in MB
+    :param memory_budget: Memory budget of the scan in MB
+    :return: Tuple of the weight and the heap size in MB that fits within the slot
+    """
+    ratio = config.get("jvm_heap_sizing")["heap_ratio"]
+    weight = dict(weight)
+    memory = max(weight.get("memory", 0), int(math.ceil(demand / ratio)))
+    if memory_budget:
+        memory = min(memory, memory_budget)
+    weight["memory"] = memory
+    return weight, min(demand, int(memory * ratio))
+
+
+def get_jvm_options(heap, size, threads):
+    """
+    Method to construct the heap, stack and garbage collector options of the jvm
+
+    :param heap: Heap size in MB
+    :param size: Dict with the files, bytes and loc relevant to the tool
+    :param threads: Number of cpus given to the tool
+    :return: List of jvm options
+    """
+    sizing = config.get("jvm_heap_sizing")
+    options = ["-Xmx{}m".format(heap)]
+    size = size or {}
+    # Deeply nested generated code overflows the default stack
+    if (
+        size.get("files")
+        and size.get("bytes", 0) / size["files"] > sizing["large_file_bytes"]
+    ):
+        options.append("-Xss" + sizing["large_file_stack"])
+    if heap < sizing["parallel_gc_heap"] or threads < 2:
+        options.append("-XX:+UseSerialGC")
+    else:
+        options.append("-XX:+UseParallelGC")
+    # Exit with the status 3 instead of continuing with a broken analysis
+    options.append("-XX:+ExitOnOutOfMemoryError")
+    return options
+
+
+def get_tool_class(tool_name):
+    """
+    Method to identify the class of the tool for the purpose of limits
+
+    :param tool_name: Tool name
+    :return: One of init, build, class, audit, source, cloud or default
+    """
+    if "init" in tool_name:
+        return "init"
+    if "build" in tool_name:
+        return "build"
+    if tool_name == "class" or (
+        tool_name.startswith("audit-")
+        and tool_name in config.get("build_dependent_tools", {})
+    ):
+        return "class"
+    if tool_name.startswith("audit") or tool_name.startswith("taint"):
+        return "audit"
+    if tool_name.startswith("source"):
+        return "source"
+    if tool_name in ["NG SAST", "ng-sast", "inspect"]:
+        return "cloud"
+    return "default"
+
+
+def get_tool_timeout(tool_name):
+    """
+    Method to find the wall clock limit for the tool
+
+    :param tool_name: Tool name
+    :return: Limit in seconds or None if the tool can run forever
+    """
+    timeout = config.get("tool_timeouts", {}).get(tool_name)
+    if timeout is None:
+        class_timeouts = config.get("tool_class_timeouts")
+        timeout = class_timeouts.get(
+            get_tool_class(tool_name), class_timeouts.get("default")
+        )
+    try:
+        timeout = int(timeout)
+    except (TypeError, ValueError):
+        timeout = 0
+    # Tools must complete before the deadline when the scan has a time budget
+    deadline = config.get("scan_deadline")
+    if deadline:
+        remaining = max(int(deadline - time.time()), 1)
+        timeout = min(timeout, remaining) if timeout > 0 else remaining
+    return timeout if timeout > 0 else None
+
+
+def get_group_rss(pgid):
+    """
+    Method to compute the resident memory of all the processes in the process group.
+    Tools such as pmd spawn the jvm as a child process so the whole group is considered
+
+    :param pgid: Process group id
+    :return: Resident memory in MB
+    """
+    rss_pages = 0
+    try:
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            stat = _read_file(os.path.join("/proc", pid, "stat"))
+            if not stat:
+                continue
+            # Process name could contain spaces so split after the closing bracket
+            fields = stat[stat.rfind(")") + 2 :].split()
+            if len(fields) > 21 and int(fields[2]) == pgid:
+                rss_pages += int(fields[21])
+    except Exception:
+        return 0
+    return rss_pages * page_size // (1024 * 1024)
+
+
+class AdmissionController(object):
+    """
+    Admits tools only while the sum of their cpu and memory weights fit
+    within the budget. A tool is always admitted when nothing else is running
+    so that a tool heavier than the whole budget can still make progress
+    """
+
+    def __init__(self, cpu_budget, memory_budget=None, max_tools=None):
+        self.cpu_budget = cpu_budget
+        self.memory_budget = memory_budget
+        self.max_tools = max_tools
+        self.cpu_used = 0
+        self.memory_used = 0
+        self.running = 0
+        self.condition = None
+
+    def fits(self, weight):
+        if self.running == 0:
+            return True
+        if self.max_tools and self.running >= self.max_tools:
+            return False
+        if self.cpu_used + weight.get("cpu", 1) > self.cpu_budget:
+            return False
+        if (
+            self.memory_budget
+            and self.memory_used + weight.get("memory", 0) > self.memory_budget
+        ):
+            return False
+        return True
+
+    async def acquire(self, weight):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            while not self.fits(weight):
+                await self.condition.wait()
+            self.running += 1
+            self.cpu_used += weight.get("cpu", 1)
+            self.memory_used += weight.get("memory", 0)
+
+    async def release(self, weight):
+        async with self.condition:
+            self.running -= 1
+            self.cpu_used -= weight.get("cpu", 1)
+            self.memory_used -= weight.get("memory", 0)
+            self.condition.notify_all()
+
+
+def get_admission_controller(max_tools=None):
+    """
+    Construct the admission controller based on the cpu and memory available to the container
+
+    :param max_tools: Optional upper limit for the number of tools
+    :return: AdmissionController instance
+    """
+    cpus = get_cpu_count()
+    memory = get_memory_limit()
+    if memory:
+        memory = max(memory - MEMORY_RESERVE, MEMORY_RESERVE)
+    LOG.debug(
+        "Resource budget for the tools: {} cpus and {} MB memory".format(cpus, memory)
+    )
+    return AdmissionController(cpus, memory, max_tools)
@@ -0,0 +1,498 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+from collections import OrderedDict
+
+import lib.config as config
+import lib.history as history
+import lib.manifest as manifest
+import lib.resources as resources
+import lib.tools as tools
+from lib.engine import shutdown_engine, start_engine
+from lib.executor import execute_default_cmd
+from lib.logger import LOG
+
+BUILD_TASK = "auto-build"
+
+
+class Task(object):
+    """A single node in the tool execution graph"""
+
+    def __init__(self, name, type_str, fn, args=(), deps=None):
+        self.name = name
+        self.type_str = type_str
+        self.fn = fn
+        self.args = args
+        self.deps = set(deps or [])
+        # One of pending, running, success, failed, skipped
+        self.status = "pending"
+        self.result = None
+        self.returncode = None
+        self.exception = None
+        self.start_time = None
+        self.end_time = None
+        # Size of the codebase relevant to the task and the predicted duration
+        self.size = None
+        self.memory_demand = None
+        # Directory whose compiled classes are counted to size the heap when the task starts
+        self.class_dir = None
+        self.predicted = None
+        self.prediction_source = None
+        # Report files produced by the task and if it was completed in an earlier run
+        self.files = []
+        self.conversions = []
+        self.resumed = False
+        # Tools served by the task when it replaces the tasks of several tools,
+        # along with the replaced tasks
+        self.merged = []
+        self.replaced = []
+        # Arguments restricting a tiered tool to the selected files
+        self.scope_args = None
+
+    def __repr__(self):
+        return "Task({}, {}, deps={})".format(self.name, self.status, sorted(self.deps))
+
+    @property
+    def duration(self):
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+
+def get_cmd_map(type_str, scan_mode):
+    """
+    Method to find the command map for the given type. Scan mode specific
+    commands such as php-ide takes precedence over the default commands
+
+    :param type_str: Project type
+    :param scan_mode: Scan mode string
+    :return: List or dict of commands or None
+    """
+    cmd_map_list = config.get("scan_tools_args_map").get(type_str + "-" + scan_mode)
+    if not cmd_map_list:
+        cmd_map_list = config.get("scan_tools_args_map").get(type_str)
+    return cmd_map_list
+
+
+def _add_task(tasks, task):
+    """Add the task to the graph making sure the name is unique"""
+    if task.name in tasks:
+        task.name = "{}:{}".format(task.type_str, task.name)
+    tasks[task.name] = task
+    return task
+
+
+def get_build_task_name(type_str):
+    """Name of the automatic build task for the given project type"""
+    return "{}-{}".format(BUILD_TASK, type_str)
+
+
+def _add_build_tasks(tasks, type_list, src, reports_dir, build_fn):
+    """
+    Add a build task for every project type supported by the automatic build.
+    Builds that share the build system run one after another to avoid clobbering
+    the build output of each other
+    """
+    build_types = [t for t in type_list if t in config.get("build_tools_map", {})]
+    for type_str in build_types:
+        task = _add_task(
+            tasks,
+            Task(
+                get_build_task_name(type_str),
+                type_str,
+                build_fn,
+                ([type_str], src, reports_dir),
+            ),
+        )
+        for group in config.get("build_groups", []):
+            if type_str not in group:
+                continue
+            previous = [
+                get_build_task_name(t)
+                for t in build_types[: build_types.index(type_str)]
+                if t in group
+            ]
+            if previous:
+                task.deps.add(previous[-1])
+    return build_types
+
+
+def _get_scan_functions(scan_module, type_str):
+    """
+    Method to find the scan functions for the given type. Types with a
+    `<type>_scan_tasks` function can run their analyzers as separate tasks
+
+    :return: Dict of task name and scan function
+    """
+    tasks_fn = getattr(scan_module, "%s_scan_tasks" % type_str, None)
+    if tasks_fn:
+        return tasks_fn()
+    dfn = getattr(scan_module, "%s_scan" % type_str, None)
+    if dfn:
+        return {type_str: dfn}
+    return {}
+
+
+def build_task_graph(
+    type_list,
+    src,
+    reports_dir,
+    convert,
+    scan_mode,
+    repo_context,
+    scan_module,
+    build_fn=None,
+    on_missing=None,
+):
+    """
+    Method to construct the tool execution graph for the given project types
+
+    Tools configured via scan_tools_args_map become execute_default_cmd tasks
+    and the remaining types are mapped to the `<type>_scan` functions in scan_module.
+    Edges are added so that any init command runs before the other commands
+    of the same type and the tools listed in build_dependent_tools wait only for
+    the build of the project types they need. The remaining tools start right away.
+
+    :param type_list: List of project types
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :param scan_mode: Scan mode string
+    :param repo_context: Repo context
+    :param scan_module: Module containing the `_scan` functions
+    :param build_fn: Optional auto build function accepting (type_list, src, reports_dir)
+    :param on_missing: Callback invoked with the type for types without any scanner
+    :return: Ordered dict of task name and Task
+    """
+    tasks = OrderedDict()
+    build_types = []
+    if build_fn:
+        build_types = _add_build_tasks(tasks, type_list, src, reports_dir, build_fn)
+    for type_str in type_list:
+        cmd_map_list = get_cmd_map(type_str, scan_mode)
+        type_tasks = []
+        if cmd_map_list:
+            # Default command list can be in the form of a list or dict
+            if isinstance(cmd_map_list, list):
+                cmd_map_list = {type_str: cmd_map_list}
+            for cmd_key, cmd_val in cmd_map_list.items():
+                type_tasks.append(
+                    _add_task(
+                        tasks,
+                        Task(
+                            cmd_key,
+                            type_str,
+                            execute_default_cmd,
+                            (
+                                list(cmd_val),
+                                type_str,
+                                cmd_key,
+                                src,
+                                reports_dir,
+                                convert,
+                                scan_mode,
+                                repo_context,
+                            ),
+                        ),
+                    )
+                )
+        else:
+            scan_fns = _get_scan_functions(scan_module, type_str)
+            if not scan_fns:
+                if on_missing:
+                    on_missing(type_str)
+                continue
+            for name, dfn in scan_fns.items():
+                type_tasks.append(
+                    _add_task(
+                        tasks,
+                        Task(
+                            name,
+                            type_str,
+                            dfn,
+                            (src, reports_dir, convert, repo_context),
+                        ),
+                    )
+                )
+        init_tasks = [t.name for t in type_tasks if "init" in t.name]
+        for t in type_tasks:
+            if "init" not in t.name:
+                t.deps.update(init_tasks)
+            needs = tools.get_tool(t.name, t.type_str).needs_build
+            t.deps.update(get_build_task_name(b) for b in needs if b in build_types)
+    return tasks
+
+
+def split_tasks(tasks, names):
+    """
+    Method to split the graph into the tasks with the given names and the rest.
+    Dependencies between the two graphs are dropped, so the tasks in each graph
+    can run on their own provided the other graph has already run
+
+    :param tasks: Ordered dict of task name and Task
+    :param names: List of task names
+    :return: Tuple of two ordered dicts with the remaining tasks and the named tasks
+    """
+    rest, named = OrderedDict(), OrderedDict()
+    for name, task in tasks.items():
+        target = named if name in names else rest
+        target[name] = task
+    for graph in (rest, named):
+        for task in graph.values():
+            task.deps = set(d for d in task.deps if d in graph)
+    return rest, named
+
+
+def merge_tasks(tasks, names, task):
+    """
+    Method to replace the named tasks with a single task that serves all of them.
+    Dependencies of the named tasks are moved to the new task and the tasks depending
+    on any of the named tasks wait for the new task instead
+
+    :param tasks: Ordered dict of task name and Task
+    :param names: List of task names to replace
+    :param task: Task replacing the named tasks
+    :return: The new task
+    """
+    task.merged = list(names)
+    task.replaced = [tasks.pop(name) for name in task.merged]
+    for replaced in task.replaced:
+        task.deps.update(replaced.deps)
+    names = set(names)
+    task.deps -= names
+    tasks[task.name] = task
+    for t in tasks.values():
+        if t.deps & names:
+            t.deps = (t.deps - names) | {task.name}
+    return task
+
+
+def _run_task(task):
+    """Invoke the task function in the worker"""
+    manifest.set_current_task(task)
+    history.update_memory_demand(task)
+    try:
+        return task.fn(*task.args)
+    finally:
+        manifest.set_current_task(None)
+
+
+def _ready_tasks(tasks):
+    """Return the pending tasks whose dependencies have completed.
+    Tasks with the longest predicted duration are returned first
+    """
+    ready = []
+    for task in tasks.values():
+        if task.status != "pending":
+            continue
+        if all(
+            tasks[d].status in ("success", "failed", "skipped")
+            for d in task.deps
+            if d in tasks
+        ):
+            ready.append(task)
+    ready.sort(key=lambda t: t.predicted or 0, reverse=True)
+    return ready
+
+
+def _complete_task(task, future):
+    """Collect the result, exit code and exception for the finished task"""
+    task.end_time = time.time()
+    try:
+        task.result = future.result()
+        # A tool invoked by the task could not be started
+        if task.exception is not None:
+            raise task.exception
+        # Tasks can return either the return code or a CompletedProcess
+        if isinstance(task.result, bool):
+            task.returncode = 0 if task.result else 1
+        elif isinstance(task.result, int):
+            task.returncode = task.result
+        elif hasattr(task.result, "returncode"):
+            task.returncode = task.result.returncode
+        task.status = "success"
+    except Exception as e:
+        task.exception = e
+        task.status = "failed"
+        LOG.debug(e)
+        LOG.warning(
+            "Scan using the {} plugin did not produce valid result".format(task.name)
+        )
+
+
+def _skip_pending(tasks, reason):
+    """Mark the tasks that have not started yet as skipped"""
+    for task in tasks.values():
+        if task.status == "pending":
+            task.status = "skipped"
+            LOG.debug("Skipping {} as {}".format(task.name, reason))
+
+
+def _revise_graph(engine, tasks, future):
+    """
+    Replace the graph with the revised graph. Tasks missing from the revised graph
+    are skipped or cancelled if already running, while the new tasks are added.
+    Pending tasks serving a different set of tools are replaced, while the tools
+    missing from a task that has already started run as separate tasks
+
+    :return: Set of the removed task names
+    """
+    try:
+        revised = future.result()
+    except Exception as e:
+        LOG.debug(e)
+        return set()
+    if revised is None:
+        return set()
+    removed = set()
+    for name, task in tasks.items():
+        if name in revised:
+            continue
+        if task.status == "pending":
+            task.status = "skipped"
+        elif task.status == "running":
+            engine.cancel_task(name)
+        else:
+            continue
+        removed.add(name)
+        LOG.debug("Removing {} from the scan".format(name))
+    for name, task in revised.items():
+        existing = tasks.get(name)
+        if existing is None:
+            tasks[name] = task
+            LOG.debug("Adding {} to the scan".format(name))
+        elif sorted(existing.merged) != sorted(task.merged):
+            _revise_merged(tasks, existing, task)
+    return removed
+
+
+def _revise_merged(tasks, existing, task):
+    """Update the task serving several tools with the tools of the revised task"""
+    if existing.status == "pending":
+        tasks[task.name] = task
+        LOG.debug("Replacing {} to scan {}".format(task.name, ", ".join(task.merged)))
+        return
+    for replaced in task.replaced:
+        if replaced.name not in existing.merged and replaced.name not in tasks:
+            tasks[replaced.name] = replaced
+            LOG.debug("Adding {} to the scan".format(replaced.name))
+
+
+async def _run_graph(engine, tasks, on_complete=None, revise=None):
+    running = {}
+    removed = set()
+    revision = engine.run_in_thread(revise) if revise else None
+    while True:
+        for task in _ready_tasks(tasks):
+            task.status = "running"
+            task.start_time = time.time()
+            running[engine.run_in_thread(_run_task, task)] = task
+        engine.outstanding = sum(
+            1 for t in tasks.values() if t.status in ("pending", "running")
+        )
+        waiting = list(running.keys())
+        if revision:
+            waiting.append(revision)
+        if not waiting:
+            break
+        done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            if future is revision:
+                revision = None
+                if not engine.cancelled:
+                    removed.update(_revise_graph(engine, tasks, future))
+                continue
+            task = running.pop(future)
+            _complete_task(task, future)
+            if task.name in removed:
+                # Results of the cancelled task are not relevant to the scan
+                task.status = "skipped"
+                task.files = []
+                task.conversions = []
+            if on_complete and not engine.cancelled and on_complete(task):
+                engine.cancel()
+                _skip_pending(tasks, "the scan was cancelled")
+
+
+def run_tasks(tasks, max_workers=None, on_complete=None, revise=None):
+    """
+    Execute the tasks in the graph starting each task as soon as its dependencies are complete.
+    The tasks run in threads while the tools they invoke are managed by the execution engine
+
+    :param tasks: Ordered dict of task name and Task
+    :param max_workers: Maximum number of tools to run in parallel
+    :param on_complete: Optional callback invoked with every completed Task. Returning True
+        cancels the running tools and skips the remaining tasks
+    :param revise: Optional function invoked in a thread while the tasks run. The function
+        returns either None or the revised graph which replaces the tasks that have not
+        completed yet
+    :return: The same dict with the status, result and exceptions populated
+    """
+    engine = start_engine(max_tools=max_workers)
+    try:
+        engine.run_until_complete(_run_graph(engine, tasks, on_complete, revise))
+    finally:
+        shutdown_engine()
+    # Anything still pending has a dependency cycle
+    for task in tasks.values():
+        if task.status == "pending":
+            task.status = "skipped"
+            LOG.warning("Skipping {} due to unresolved dependencies".format(task.name))
+    return tasks
+
+
+def get_tool_slots():
+    """Number of tools that can run in parallel used for planning the schedule"""
+    if config.get("SCAN_MAX_TOOLS"):
+        return int(config.get("SCAN_MAX_TOOLS"))
+    return resources.get_cpu_count()
+
+
+def plan_tasks(tasks, slots):
+    """
+    Simulate the execution of the graph using the predicted durations.
+    Ready tasks are started longest first whenever a slot is free
+
+    :param tasks: Ordered dict of task name and Task with the predictions
+    :param slots: Number of tools that can run in parallel
+    :return: Ordered dict of task name and a tuple of predicted start and end in seconds
+    """
+    plan = OrderedDict()
+    finish = {}
+    running = []
+    now = 0
+    pending = OrderedDict(tasks)
+    slots = max(1, slots)
+    while pending or running:
+        ready = [
+            t
+            for t in pending.values()
+            if all(finish.get(d, now + 1) <= now for d in t.deps if d in tasks)
+        ]
+        ready.sort(key=lambda t: t.predicted or 0, reverse=True)
+        for task in ready[: slots - len(running)]:
+            end = now + (task.predicted or 0)
+            plan[task.name] = (now, end)
+            finish[task.name] = end
+            running.append(end)
+            del pending[task.name]
+        if not running:
+            # Remaining tasks have a dependency cycle
+            break
+        running.sort()
+        now = running.pop(0)
+    return plan
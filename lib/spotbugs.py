@@ -0,0 +1,157 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+
+import lib.config as config
+import lib.tools as tools
+import lib.utils as utils
+import lib.xml_parser as xml_parser
+from lib.engine import convert_file
+from lib.executor import exec_tool, get_failure_reason
+from lib.logger import DEBUG, LOG
+from lib.scheduler import Task, merge_tasks
+
+# Task that runs spotbugs once for all the jvm languages
+SPOTBUGS_TASK = "spotbugs"
+
+
+def get_spotbugs_args(src, report_fname, jars_list=None):
+    """
+    Method to construct the spotbugs command with the security rules
+
+    :param src: Project dir
+    :param report_fname: xml report to create
+    :param jars_list: Optional file listing the jar files for the auxiliary classpath
+    :return: List of command and args
+    """
+    aux_args = ["-auxclasspathFromFile", jars_list] if jars_list else []
+    return [
+        "java",
+        "-jar",
+        config.get("SPOTBUGS_HOME") + "/lib/spotbugs.jar",
+        "-textui",
+        "-include",
+        config.get("TOOLS_CONFIG_DIR") + "/spotbugs/include.xml",
+        "-exclude",
+        config.get("TOOLS_CONFIG_DIR") + "/spotbugs/exclude.xml",
+        "-noClassOk",
+        *aux_args,
+        "-sourcepath",
+        src,
+        "-quiet",
+        "-medium",
+        "-xml:withMessages",
+        "-effort:max",
+        "-nested:false",
+        "-output",
+        report_fname,
+        src,
+    ]
+
+
+def spotbugs_merged_scan(tool_names, src, reports_dir, convert):
+    """
+    Method to run spotbugs once for all the jvm languages. The xml report is split
+    by the extension of the source files into the reports of the individual tools
+
+    :param tool_names: List of spotbugs based tool names
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :return: CompletedProcess instance
+    """
+    if not config.get("SPOTBUGS_HOME"):
+        LOG.warning(
+            "Java class analyzer is not available. Please check if your build uses shiftleft/scan or shiftleft/scan-java as the image"
+        )
+        return None
+    report_fname = utils.get_report_file(
+        SPOTBUGS_TASK, reports_dir, True, ext_name="xml"
+    )
+    jar_files = utils.find_jar_files()
+    with tempfile.NamedTemporaryFile(mode="w") as fp:
+        fp.writelines([str(x) + "\n" for x in jar_files])
+        fp.flush()
+        spotbugs_args = get_spotbugs_args(src, report_fname, fp.name)
+        cp = exec_tool(SPOTBUGS_TASK, spotbugs_args, src)
+    if not os.path.isfile(report_fname):
+        return cp
+    reports = {
+        t: utils.get_report_file(t, reports_dir, True, ext_name="xml")
+        for t in tool_names
+    }
+    spotbugs_tools = config.get("spotbugs_tools")
+    try:
+        counts = xml_parser.split_report(
+            report_fname,
+            reports,
+            {t: spotbugs_tools.get(t, {}).get("extensions", []) for t in tool_names},
+        )
+        LOG.debug("Split the spotbugs report {}".format(counts))
+    except Exception as e:
+        LOG.debug(e)
+        return cp
+    if not LOG.isEnabledFor(DEBUG):
+        os.remove(report_fname)
+    if convert:
+        failure_reason = get_failure_reason(SPOTBUGS_TASK, cp)
+        for tool_name, xml_fname in reports.items():
+            # The filelist fixes the partial paths reported for the java files
+            file_path_list = None
+            if tool_name == "class":
+                file_path_list = utils.find_files(src, ".java")
+            convert_file(
+                tool_name,
+                spotbugs_args[1:],
+                src,
+                xml_fname,
+                utils.get_report_file(tool_name, reports_dir, True, ext_name="sarif"),
+                file_path_list,
+                failure_reason=failure_reason,
+            )
+    return cp
+
+
+def merge_spotbugs_tasks(tasks, src, reports_dir, convert, tiered=False):
+    """
+    Method to replace the tasks of the spotbugs based tools with a single task when
+    more than one jvm language is part of the scan, so that the classes are analysed once
+
+    :param tasks: Ordered dict of task name and Task
+    :param src: Project dir
+    :param reports_dir: Directory for output reports
+    :param convert: Boolean to enable normalisation of reports json
+    :param tiered: Boolean to keep the tiered tools separate
+    :return: Combined Task or None
+    """
+    tool_names = [
+        name
+        for name in config.get("spotbugs_tools").keys()
+        if name in tasks
+        and tasks[name].status == "pending"
+        and not (tiered and tools.get_tool(name, tasks[name].type_str).tiered)
+    ]
+    if len(tool_names) < 2:
+        return None
+    task = Task(
+        SPOTBUGS_TASK,
+        "java",
+        spotbugs_merged_scan,
+        (tool_names, src, reports_dir, convert),
+    )
+    LOG.debug("Running spotbugs once for {}".format(", ".join(tool_names)))
+    return merge_tasks(tasks, tool_names, task)
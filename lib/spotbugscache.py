@@ -0,0 +1,404 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import glob
+import hashlib
+import json
+import os
+import re
+import struct
+import subprocess
+import tempfile
+from xml.etree.ElementTree import Element, ElementTree, tostring
+
+from defusedxml.ElementTree import fromstring, parse
+
+import lib.appcds as appcds
+import lib.config as config
+import lib.tools as tools
+import lib.utils as utils
+import lib.xml_parser as xml_parser
+from lib.logger import LOG
+
+# Sub directory of the cache directory with the state of the previous runs
+CACHE_DIR = "spotbugs"
+
+STATE_SUFFIX = ".json"
+
+CLASS_MAGIC = 0xCAFEBABE
+
+# Size in bytes of the constant pool entries other than utf8, keyed by the tag
+CONSTANT_SIZES = {
+    3: 4,
+    4: 4,
+    5: 8,
+    6: 8,
+    7: 2,
+    8: 2,
+    9: 4,
+    10: 4,
+    11: 4,
+    12: 4,
+    15: 3,
+    16: 2,
+    17: 4,
+    18: 4,
+    19: 2,
+    20: 2,
+}
+
+# Types referred to by the field, method and generic signatures
+DESCRIPTOR_REGEX = re.compile(r"L([\w/$]+)[;<]")
+
+
+def is_enabled():
+    """Method to find if spotbugs should analyse only the changed classes"""
+    return tools.get_flag("SCAN_SPOTBUGS_INCREMENTAL")
+
+
+def get_class_info(data):
+    """
+    Method to read the name of the class and the classes it refers to from the
+    constant pool of the class file
+
+    :param data: Contents of the class file
+    :return: Tuple of the internal class name and the set of referred class names.
+        None if the data is not a class file
+    """
+    if len(data) < 10 or struct.unpack_from(">I", data)[0] != CLASS_MAGIC:
+        return None
+    (count,) = struct.unpack_from(">H", data, 8)
+    offset = 10
+    utf8 = {}
+    class_refs = {}
+    idx = 1
+    try:
+        while idx < count:
+            tag = data[offset]
+            if tag == 1:
+                (size,) = struct.unpack_from(">H", data, offset + 1)
+                utf8[idx] = data[offset + 3 : offset + 3 + size].decode(
+                    "utf-8", errors="replace"
+                )
+                offset += 3 + size
+            elif tag in CONSTANT_SIZES:
+                if tag == 7:
+                    (class_refs[idx],) = struct.unpack_from(">H", data, offset + 1)
+                offset += 1 + CONSTANT_SIZES[tag]
+            else:
+                return None
+            # long and double take two entries
+            idx += 2 if tag in (5, 6) else 1
+        (this_class,) = struct.unpack_from(">H", data, offset + 2)
+    except (IndexError, struct.error):
+        return None
+    name = utf8.get(class_refs.get(this_class))
+    if not name:
+        return None
+    refs = set()
+    for name_idx in class_refs.values():
+        ref = utf8.get(name_idx, "")
+        # Array classes refer to the element type
+        if ref.startswith("["):
+            refs.update(DESCRIPTOR_REGEX.findall(ref))
+        elif ref:
+            refs.add(ref)
+    for value in utf8.values():
+        if "L" in value and ";" in value:
+            refs.update(DESCRIPTOR_REGEX.findall(value))
+    refs.discard(name)
+    return name, refs
+
+
+def build_index(class_dir):
+    """
+    Method to index the compiled classes in the directory by the checksum of their
+    contents along with the classes they refer to
+
+    :param class_dir: Directory analysed by spotbugs
+    :return: Dict of class name and a dict with the file, checksum and referred classes
+    """
+    index = {}
+    for root, dirs, files in os.walk(class_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.endswith(".class"):
+                continue
+            fname = os.path.join(root, file)
+            try:
+                with open(fname, mode="rb") as fp:
+                    data = fp.read()
+            except OSError:
+                continue
+            info = get_class_info(data)
+            if not info:
+                continue
+            name, refs = info
+            index[name] = {
+                "file": fname,
+                "hash": hashlib.sha256(data).hexdigest(),
+                "refs": sorted(refs),
+            }
+    return index
+
+
+def get_targets(index, previous):
+    """
+    Method to select the classes changed since the previous run along with the
+    classes that refer to them directly
+
+    :param index: Class index of the current run
+    :param previous: Class checksums of the previous run
+    :return: Set of class names to analyse
+    """
+    changed = set(
+        name for name, entry in index.items() if previous.get(name) != entry["hash"]
+    )
+    # Classes referring to a removed class have to be analysed again as well
+    changed.update(name for name in previous.keys() if name not in index)
+    targets = set(name for name in changed if name in index)
+    for name, entry in index.items():
+        if changed.intersection(entry["refs"]):
+            targets.add(name)
+    return targets
+
+
+def get_state_file(tool_name, args):
+    """
+    Method to construct the file with the state of the previous run. The state is
+    specific to the repository and the tool, while the key covers the spotbugs
+    arguments along with the contents of the files they refer to, such as the
+    filters and the auxiliary classpath
+
+    :param tool_name: Tool name
+    :param args: spotbugs command and args
+    :return: Tuple of the state file and the prefix shared by all the states of the
+        repository and the tool
+    """
+    src = os.path.abspath(args[-1])
+    skip_values = (
+        tools.get_arg_value(args, "-output"),
+        tools.get_arg_value(args, "-sourcepath"),
+    )
+    h = hashlib.sha256()
+    for a in args[1:-1]:
+        if a in skip_values:
+            continue
+        if a == tools.get_arg_value(args, "-auxclasspathFromFile"):
+            # Jar files are listed by path so their contents are hashed instead
+            with open(a, mode="r") as fp:
+                for entry in fp.read().splitlines():
+                    h.update(entry.encode())
+                    if os.path.isfile(entry):
+                        h.update(appcds.file_checksum(entry).encode())
+        elif os.path.isfile(a):
+            h.update(appcds.file_checksum(a).encode())
+        else:
+            h.update(a.encode())
+        h.update(b"\0")
+    prefix = tools.get_cache_prefix(utils.get_cache_dir(CACHE_DIR), src, tool_name)
+    return prefix + h.hexdigest()[:12] + STATE_SUFFIX, prefix
+
+
+def _read_state(state_file):
+    try:
+        with open(state_file, mode="r") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def prepare(tool_name, args):
+    """
+    Method to restrict spotbugs to the classes changed since the previous run and the
+    classes that refer to them. The remaining classes are added to the auxiliary
+    classpath and their findings are taken from the previous run by complete
+
+    :param tool_name: Tool name
+    :param args: Command and args
+    :return: Tuple of args and the pending merge or None
+    """
+    if (
+        not is_enabled()
+        or len(args) < 3
+        or os.path.basename(tools.get_arg_value(args, "-jar") or "") != "spotbugs.jar"
+        or not tools.get_arg_value(args, "-output")
+        or not os.path.isdir(args[-1])
+    ):
+        return args, None
+    try:
+        state_file, prefix = get_state_file(tool_name, args)
+        index = build_index(args[-1])
+    except OSError as e:
+        LOG.debug(e)
+        return args, None
+    if not index:
+        return args, None
+    pending = {
+        "state_file": state_file,
+        "prefix": prefix,
+        "report_file": tools.get_arg_value(args, "-output"),
+        "index": index,
+        "targets": None,
+        "targets_file": None,
+    }
+    state = _read_state(state_file)
+    if not state:
+        return args, pending
+    targets = get_targets(index, state.get("classes", {}))
+    if len(targets) > len(index) * config.get("spotbugs_incremental_max_ratio"):
+        LOG.debug("{} classes changed. Analysing all the classes".format(len(targets)))
+        return args, pending
+    pending["targets"] = targets
+    pending["state"] = state
+    LOG.debug(
+        "Analysing {} of {} classes with {}".format(len(targets), len(index), tool_name)
+    )
+    if not targets:
+        return args, pending
+    with tempfile.NamedTemporaryFile(
+        mode="w", prefix=os.path.basename(prefix), suffix=".txt", delete=False
+    ) as fp:
+        fp.writelines([index[name]["file"] + "\n" for name in sorted(targets)])
+        pending["targets_file"] = fp.name
+    # Classes that are not analysed are still needed to resolve the analysed classes
+    args = args[:-1] + ["-auxclasspath", args[-1], "-analyzeFromFile", fp.name]
+    return args, pending
+
+
+def _get_class_name(bug):
+    return (xml_parser.get_bug_class(bug) or "").replace(".", "/")
+
+
+def _merge_findings(root, pending):
+    """
+    Method to add the findings of the previous run for the classes that were not
+    analysed to the report
+
+    :param root: Root element of the report
+    :param pending: Pending merge returned by prepare
+    :return: Dict of class name and the reused findings
+    """
+    targets = pending["targets"]
+    # Bugs follow the project details and precede the summary elements
+    pos = 0
+    for i, child in enumerate(root):
+        if child.tag.lower() in ("buginstance", "project"):
+            pos = i + 1
+    reused = {}
+    for name, bugs in pending["state"].get("findings", {}).items():
+        if name not in pending["index"] or name in targets:
+            continue
+        reused[name] = bugs
+        for bug in bugs:
+            root.insert(pos, fromstring(bug))
+            pos += 1
+    ElementTree(root).write(
+        pending["report_file"], encoding="utf-8", xml_declaration=True
+    )
+    return reused
+
+
+def _save_state(pending, root, findings):
+    """
+    Method to save the class checksums and the findings for the next run. States of
+    the earlier spotbugs arguments are removed
+
+    :param pending: Pending merge returned by prepare
+    :param root: Root element of the report
+    :param findings: Dict of class name and the findings
+    """
+    state = {
+        "root": root.tag,
+        "classes": {name: entry["hash"] for name, entry in pending["index"].items()},
+        "findings": findings,
+    }
+    state_file = pending["state_file"]
+    tmp_file = state_file + ".tmp"
+    try:
+        with open(tmp_file, mode="w") as fp:
+            json.dump(state, fp)
+        os.replace(tmp_file, state_file)
+        for old_file in glob.glob(glob.escape(pending["prefix"]) + "*" + STATE_SUFFIX):
+            if old_file != state_file:
+                os.remove(old_file)
+    except OSError as e:
+        LOG.debug(e)
+
+
+def _read_report(pending, cp):
+    if pending["targets"] is not None and cp is None:
+        return Element(pending["state"].get("root", "BugCollection"))
+    if not os.path.isfile(pending["report_file"]):
+        return None
+    try:
+        return parse(pending["report_file"]).getroot()
+    except Exception as e:
+        LOG.debug(e)
+        return None
+
+
+def complete(pending, cp=None):
+    """
+    Method to add the findings of the previous run for the classes that were not
+    analysed to the spotbugs report and to save the state for the next run
+
+    :param pending: Pending merge returned by prepare
+    :param cp: CompletedProcess instance or None when spotbugs was not run since
+        no class has changed
+    :return: Number of findings taken from the previous run
+    """
+    if pending["targets_file"]:
+        try:
+            os.remove(pending["targets_file"])
+        except OSError:
+            pass
+    root = _read_report(pending, cp)
+    if root is None:
+        return 0
+    findings = {}
+    for child in root:
+        if child.tag.lower() == "BugInstance".lower():
+            findings.setdefault(_get_class_name(child), []).append(
+                tostring(child, encoding="unicode")
+            )
+    reused = 0
+    if pending["targets"] is not None:
+        reused_findings = _merge_findings(root, pending)
+        findings.update(reused_findings)
+        reused = sum(len(bugs) for bugs in reused_findings.values())
+        LOG.debug("Reused {} findings from the previous run".format(reused))
+    # Partial results are not saved for the next run
+    if cp is None or not (cp.returncode or getattr(cp, "timed_out", False)):
+        _save_state(pending, root, findings)
+    return reused
+
+
+class SpotbugsCacheHook(tools.ToolHook):
+    """Hook to analyse only the classes changed since the previous spotbugs run"""
+
+    def prepare(self, tool_name, args, env=None, cwd=None):
+        args, pending = prepare(tool_name, args)
+        return args, env, pending
+
+    def reuse(self, state, args, cwd=None):
+        if state["targets"] != set():
+            return None
+        LOG.debug("No class has changed since the previous spotbugs run")
+        return subprocess.CompletedProcess(args, 0)
+
+    def complete(self, state, cp=None):
+        # Findings of the previous run are reused as is when spotbugs was not run
+        complete(state, None if state["targets"] == set() else cp)
@@ -0,0 +1,250 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import functools
+import json
+import os
+import re
+from urllib.parse import unquote
+
+import lib.config as config
+import lib.manifest as manifest
+import lib.tools as tools
+import lib.utils as utils
+from lib.logger import LOG
+
+# Number of lines to search for the java package declaration
+PACKAGE_SEARCH_LINES = 50
+
+PACKAGE_REGEX = re.compile(r"^\s*package\s+([\w.]+)\s*;")
+
+
+def find_source_files(src, extensions):
+    """
+    Method to list the source files with the given extensions
+
+    :param src: Source directory
+    :param extensions: List of file extensions such as .java
+    :return: List of file paths
+    """
+    result = []
+    for ext in extensions:
+        result += utils.find_files(src, ext)
+    return result
+
+
+def build_keyword_index(files, keywords):
+    """
+    Method to find the files that refer to any of the source or sink keywords
+
+    :param files: List of file paths
+    :param keywords: List of regular expressions
+    :return: Set of matching file paths
+    """
+    if not keywords:
+        return set()
+    pattern = re.compile("|".join("(?:{})".format(k) for k in keywords))
+    matches = set()
+    for fname in files:
+        try:
+            with open(fname, mode="r", errors="ignore") as fp:
+                if pattern.search(fp.read()):
+                    matches.add(fname)
+        except OSError:
+            continue
+    return matches
+
+
+def get_flagged_files(sarif_files, files, src):
+    """
+    Method to identify the files with any result in the given SARIF files
+
+    :param sarif_files: List of SARIF files produced by the first tier tools
+    :param files: List of candidate file paths
+    :param src: Source directory
+    :return: Set of file paths with at least one result
+    """
+    by_name = {}
+    for fname in files:
+        by_name.setdefault(os.path.basename(fname), []).append(
+            (fname, os.path.relpath(fname, src))
+        )
+    flagged = set()
+    for sf in sarif_files:
+        try:
+            with open(sf, mode="r") as fp:
+                report_data = json.load(fp)
+        except Exception as e:
+            LOG.debug(e)
+            continue
+        for run in report_data.get("runs", []):
+            for result in run.get("results", []):
+                for loc in result.get("locations", []):
+                    uri = (
+                        loc.get("physicalLocation", {})
+                        .get("artifactLocation", {})
+                        .get("uri")
+                    )
+                    if not uri:
+                        continue
+                    uri = unquote(uri)
+                    # Uri could be relative, a file uri or a workspace url
+                    for fname, rel in by_name.get(os.path.basename(uri), []):
+                        if uri == rel or uri.endswith("/" + rel):
+                            flagged.add(fname)
+    return flagged
+
+
+def get_java_package(fname):
+    """
+    Method to find the package declared in the java source file
+
+    :param fname: Java file
+    :return: Package name or None for the default package
+    """
+    try:
+        with open(fname, mode="r", errors="ignore") as fp:
+            for i, line in enumerate(fp):
+                if i >= PACKAGE_SEARCH_LINES:
+                    break
+                m = PACKAGE_REGEX.match(line)
+                if m:
+                    return m.group(1)
+    except OSError:
+        pass
+    return None
+
+
+def get_scope_args(rule, selected):
+    """
+    Method to construct the arguments that restrict the tool to the selected files
+
+    :param rule: Tiered tool configuration
+    :param selected: List of selected file paths
+    :return: List of arguments or None when the tool has to analyse everything
+    """
+    if rule.get("scope") == "packages":
+        packages = set()
+        for fname in selected:
+            package = get_java_package(fname)
+            if not package:
+                # Classes in the default package cannot be selected
+                return None
+            packages.add(package + ".*")
+        return list(rule.get("option", [])) + [",".join(sorted(packages))]
+    return list(rule.get("option", [])) + sorted(selected)
+
+
+def select_scope(tool_name, rule, src, sarif_files):
+    """
+    Method to select the files for the second tier tool based on the results of the
+    first tier tools along with the source and sink keyword index
+
+    :param tool_name: Tool name
+    :param rule: Tiered tool configuration
+    :param src: Source directory
+    :param sarif_files: List of SARIF files produced by the first tier tools
+    :return: Tuple of the number of selected files and the scope arguments. Arguments
+        are None if the whole codebase has to be analysed
+    """
+    files = find_source_files(src, rule.get("extensions", []))
+    if not files:
+        return 0, None
+    selected = get_flagged_files(sarif_files, files, src)
+    selected.update(build_keyword_index(files, rule.get("keywords")))
+    if not selected:
+        return 0, []
+    max_files = rule.get("max_files", config.get("tiered_max_files"))
+    if len(selected) > len(files) * config.get("tiered_max_ratio") or (
+        max_files and len(selected) > max_files
+    ):
+        LOG.debug(
+            "{} of {} files were selected for {}. Analysing everything".format(
+                len(selected), len(files), tool_name
+            )
+        )
+        return len(selected), None
+    return len(selected), get_scope_args(rule, selected)
+
+
+def add_scope_args(tool_name, args):
+    """
+    Method to add the scope arguments of the tiered tool running in the current task.
+    The arguments are inserted at the position configured for the tool
+
+    :param tool_name: Tool name
+    :param args: Command and args
+    :return: List of args
+    """
+    task = manifest.get_current_task()
+    if task is None or task.name != tool_name or not task.scope_args:
+        return args
+    rule = tools.get_tool(tool_name, task.type_str).tiered or {}
+    if rule.get("position") == "end":
+        return args + list(task.scope_args)
+    return args[:-1] + list(task.scope_args) + args[-1:]
+
+
+def _scoped(fn, task, rule, src, first_tier):
+    """Wrap the task function to compute the scope once the first tier has completed"""
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        sarif_files = []
+        for t in first_tier:
+            sarif_files += [f for f in t.files if f.endswith(".sarif")]
+        if any(t.status != "success" for t in first_tier):
+            # Results of the first tier are incomplete so everything has to be analysed
+            count, scope_args = 0, None
+        else:
+            count, scope_args = select_scope(task.name, rule, src, sarif_files)
+        if scope_args == []:
+            LOG.info(
+                "No file was flagged for {} by the first tier tools. Skipping".format(
+                    task.name
+                )
+            )
+            return 0
+        if scope_args:
+            LOG.info("{} will analyse {} flagged files".format(task.name, count))
+        task.scope_args = scope_args
+        return fn(*args)
+
+    return wrapper
+
+
+def apply_tiers(tasks, src):
+    """
+    Method to run the expensive tools listed in tiered_tools after the cheap first tier
+    tools and restrict them to the files flagged by the first tier or referring to the
+    source and sink keywords. Expensive tools are skipped when nothing is flagged
+
+    :param tasks: Ordered dict of task name and Task
+    :param src: Source directory
+    :return: List of the tiered task names
+    """
+    tiered = []
+    for tool_name, task in tasks.items():
+        rule = tools.get_tool(tool_name, task.type_str).tiered
+        if not rule or task.status != "pending":
+            continue
+        after = set(rule.get("after", []))
+        first_tier = [
+            t for t in tasks.values() if t.name in after or after & set(t.merged)
+        ]
+        task.deps.update(t.name for t in first_tier)
+        task.fn = _scoped(task.fn, task, rule, src, first_tier)
+        tiered.append(tool_name)
+    return tiered
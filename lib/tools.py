@@ -0,0 +1,478 @@
+# This file is part of Scan.
+
+# Scan is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Scan is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import lib.config as config
+import lib.resources as resources
+
+# Kinds of input accepted by the tools
+INPUT_DIR = "dir"
+INPUT_FILELIST = "filelist"
+INPUT_ARTIFACTS = "artifacts"
+
+FILELIST_PREFIX = "(filelist="
+
+# Tools registered via register_tool
+_registry = OrderedDict()
+
+# Hooks registered via register_hook in the order they are applied
+_hooks = []
+
+
+def guess_output_format(cmd_str):
+    """
+    Method to guess the format of the report from the command line
+
+    :param cmd_str: Command line as a string
+    :return: One of json, csv, sarif, xml or out
+    """
+    for fmt in ["json", "csv", "sarif", "xml"]:
+        if fmt in cmd_str:
+            return fmt
+    return "out"
+
+
+def find_command(tool_name, type_str=None):
+    """
+    Method to find the command template for the tool configured via scan_tools_args_map
+
+    :param tool_name: Tool name
+    :param type_str: Optional project type to limit the search
+    :return: Tuple of project type and list of command and args or (None, None)
+    """
+    for cmd_type, cmd_map_list in config.get("scan_tools_args_map").items():
+        if type_str and cmd_type != type_str:
+            continue
+        if isinstance(cmd_map_list, list):
+            cmd_map_list = {cmd_type: cmd_map_list}
+        if tool_name in cmd_map_list:
+            return cmd_type, list(cmd_map_list[tool_name])
+    return None, None
+
+
+class ToolHook(object):
+    """
+    Base class of the hooks that adapt the command of a tool before it runs and process
+    the results once it has completed, such as the persistent caches of the tools.
+    Hooks inspect the command and return it unchanged for the tools they do not support
+    """
+
+    def prepare(self, tool_name, args, env=None, cwd=None):
+        """
+        Method to adapt the command before the tool runs
+
+        :param tool_name: Tool name
+        :param args: Command and args
+        :param env: Environment variables
+        :param cwd: Working directory
+        :return: Tuple of args, env and the state passed to reuse and complete or None
+        """
+        return args, env, None
+
+    def reuse(self, state, args, cwd=None):
+        """
+        Method to reuse the results of an earlier run instead of running the tool
+
+        :param state: State returned by prepare
+        :param args: Command and args
+        :param cwd: Working directory
+        :return: CompletedProcess instance or None to run the tool
+        """
+        return None
+
+    def run(self, tool_name, args, cwd=None, env=None, stdout=None, cancel_event=None):
+        """
+        Method to run the tool other than as a separate process
+
+        :param tool_name: Tool name
+        :param args: Command and args
+        :param cwd: Working directory
+        :param env: Environment variables
+        :param stdout: stdout configuration as used for subprocess
+        :param cancel_event: Optional threading.Event set to cancel the tool
+        :return: CompletedProcess instance or None to run the tool as a process
+        """
+        return None
+
+    def complete(self, state, cp=None):
+        """
+        Method to process the results once the tool has completed
+
+        :param state: State returned by prepare
+        :param cp: CompletedProcess instance
+        """
+
+
+class ToolDescriptor(object):
+    """
+    Declarative description of an analyzer. Tools configured via scan_tools_args_map
+    are described automatically, while the tools implemented as scan functions are
+    declared in tool_descriptors. Any attribute that is not declared is derived from the
+    command and the existing config such as tool_resource_weights, tool_cost_estimates
+    and build_dependent_tools, so that the schedulers and caches use a single API
+    instead of special casing the tool names
+
+    :param name: Tool or task name
+    :param type_str: Project type
+    :param cmd: Command template with the args
+    :param input_kind: One of dir, filelist or artifacts (build output)
+    :param output_format: Format of the raw report such as json, csv or xml
+    :param parser: Name used to convert the raw report to SARIF
+    :param incremental: Boolean to indicate the tool reuses the results of earlier runs
+    :param shardable: Boolean to indicate the input can be split across processes
+    :param hooks: List of ToolHook instances. Defaults to the hooks registered via
+        register_hook
+    """
+
+    def __init__(
+        self,
+        name,
+        type_str=None,
+        cmd=None,
+        input_kind=None,
+        output_format=None,
+        parser=None,
+        incremental=False,
+        shardable=None,
+        hooks=None,
+    ):
+        self.name = name
+        self.type_str = type_str
+        self.cmd = cmd
+        self._input_kind = input_kind
+        self._output_format = output_format
+        self._parser = parser
+        self.incremental = incremental
+        self._shardable = shardable
+        self._hooks = hooks
+
+    def __repr__(self):
+        return "ToolDescriptor({}, {}, {})".format(
+            self.name, self.input_kind, self.output_format
+        )
+
+    @property
+    def input_kind(self):
+        if self._input_kind:
+            return self._input_kind
+        if self.cmd and FILELIST_PREFIX in " ".join(self.cmd):
+            return INPUT_FILELIST
+        if self.tool_class == "class":
+            return INPUT_ARTIFACTS
+        return INPUT_DIR
+
+    @property
+    def output_format(self):
+        if self._output_format:
+            return self._output_format
+        if self.cmd:
+            return guess_output_format(" ".join(self.cmd))
+        return None
+
+    @property
+    def parser(self):
+        if self._parser:
+            return self._parser
+        if not self.cmd:
+            return self.name
+        # Reports of the java based tools are identified using the tool name
+        if is_jvm_command(self.cmd):
+            return self.name
+        return self.cmd[0]
+
+    @property
+    def shardable(self):
+        if self._shardable is not None:
+            return self._shardable
+        return self.input_kind == INPUT_FILELIST
+
+    @property
+    def tool_class(self):
+        return resources.get_tool_class(self.name)
+
+    @property
+    def weight(self):
+        """Expected cpu and memory (MB) including the peak memory learnt from earlier runs"""
+        return resources.get_tool_weight(self.name)
+
+    @property
+    def cost(self):
+        """Dict with the base duration in seconds and the seconds per thousand lines"""
+        estimates = config.get("tool_cost_estimates")
+        return estimates.get(
+            self.name, estimates.get(self.tool_class, estimates.get("default"))
+        )
+
+    @property
+    def timeout(self):
+        return resources.get_tool_timeout(self.name)
+
+    @property
+    def needs_build(self):
+        """Project types whose build output the tool analyses"""
+        build_tools = config.get("build_dependent_tools", {})
+        return build_tools.get(self.name, build_tools.get(self.type_str, []))
+
+    @property
+    def advisory(self):
+        return self.name in config.get("advisory_tools", [])
+
+    @property
+    def tiered(self):
+        """Tiered mode configuration or None"""
+        return config.get("tiered_tools", {}).get(self.name)
+
+    @property
+    def hooks(self):
+        if self._hooks is not None:
+            return self._hooks
+        return list(_hooks)
+
+    def prepare(self, args, env=None, cwd=None):
+        """
+        Method to adapt the command using the hooks of the tool
+
+        :param args: Command and args
+        :param env: Environment variables
+        :param cwd: Working directory
+        :return: Tuple of args, env and the list of hook and state pairs
+        """
+        pending = []
+        for hook in self.hooks:
+            args, env, state = hook.prepare(self.name, args, env, cwd)
+            if state is not None:
+                pending.append((hook, state))
+        return args, env, pending
+
+    def reuse(self, pending, args, cwd=None):
+        """
+        Method to find if a hook could provide the results without running the tool
+
+        :param pending: Hook and state pairs returned by prepare
+        :param args: Command and args
+        :param cwd: Working directory
+        :return: CompletedProcess instance or None
+        """
+        for hook, state in pending:
+            cp = hook.reuse(state, args, cwd)
+            if cp is not None:
+                return cp
+        return None
+
+    def run(self, args, cwd=None, env=None, stdout=None, cancel_event=None):
+        """
+        Method to run the tool using the first hook able to run it
+
+        :return: CompletedProcess instance or None to run the tool as a process
+        """
+        for hook in self.hooks:
+            cp = hook.run(
+                self.name,
+                args,
+                cwd=cwd,
+                env=env,
+                stdout=stdout,
+                cancel_event=cancel_event,
+            )
+            if cp is not None:
+                return cp
+        return None
+
+    def complete(self, pending, cp=None):
+        """
+        Method to let the hooks process the results of the tool
+
+        :param pending: Hook and state pairs returned by prepare
+        :param cp: CompletedProcess instance
+        """
+        for hook, state in pending:
+            hook.complete(state, cp)
+
+
+def get_flag(name):
+    """
+    Method to read a boolean option which could be set as a string via the environment
+
+    :param name: Config or environment variable name
+    :return: Boolean
+    """
+    value = config.get(name)
+    if isinstance(value, str):
+        return value.lower() in ("true", "1", "yes")
+    return bool(value)
+
+
+def get_arg_value(args, name):
+    """
+    Method to find the value following the option in the command
+
+    :param args: Command and args
+    :param name: Option name such as -output
+    :return: Value or None
+    """
+    if name in args[:-1]:
+        return args[args.index(name) + 1]
+    return None
+
+
+def get_launcher_lib_dir(launcher):
+    """Directory with the jar files loaded by the launcher script of the tool such as pmd"""
+    return os.path.join(os.path.dirname(os.path.dirname(launcher)), "lib")
+
+
+def get_cache_prefix(cache_dir, src, tool_name=None):
+    """
+    Method to construct the prefix of the cache files of the repository. The files of
+    the other versions of the cache share the prefix and are removed using it
+
+    :param cache_dir: Cache directory
+    :param src: Repository directory
+    :param tool_name: Optional tool name when the cache is specific to the tool
+    :return: Prefix string
+    """
+    repo_key = hashlib.sha256(src.encode()).hexdigest()[:12]
+    parts = [os.path.basename(src), repo_key]
+    if tool_name:
+        parts.append(tool_name)
+    return os.path.join(cache_dir, "-".join(parts) + "-")
+
+
+def is_jvm_command(args):
+    """Method to find if the command runs a java based tool"""
+    return bool(args) and (os.path.basename(args[0]) == "java" or "pmd-bin" in args[0])
+
+
+def add_jvm_options(args, env, options):
+    """
+    Method to pass the options to the jvm of a java based tool
+
+    :param args: Command and args
+    :param env: Environment variables
+    :param options: List of jvm options
+    :return: Tuple of args and env
+    """
+    args = list(args)
+    if os.path.basename(args[0]) == "java":
+        args[1:1] = options
+    else:
+        # pmd scripts pass the options to the jvm
+        env = dict(env or os.environ)
+        env["PMD_JAVA_OPTS"] = " ".join(
+            [env.get("PMD_JAVA_OPTS", "")] + list(options)
+        ).strip()
+    return args, env
+
+
+def apply_thread_share(args, env, threads, jvm_options=True):
+    """
+    Method to limit the threads used internally by the tool to its share of the cpus
+    using the arguments in tool_thread_args and the jvm ActiveProcessorCount option
+
+    :param args: Command and args
+    :param env: Environment variables
+    :param threads: Number of cpus given to the tool
+    :param jvm_options: Boolean to limit the jvm as well. False when the tool runs in
+        a jvm shared with other tools
+    :return: Tuple of args and env
+    """
+    args = list(args)
+    names = [os.path.basename(a) for a in args[:3]]
+    for name, thread_args in config.get("tool_thread_args", {}).items():
+        if name not in names or thread_args[0].split("=")[0] in " ".join(args):
+            continue
+        if any("%(threads)s" in a for a in thread_args):
+            args += [a % dict(threads=threads) for a in thread_args]
+        elif threads > 1:
+            args += thread_args
+    if (
+        jvm_options
+        and is_jvm_command(args)
+        and "-XX:ActiveProcessorCount" not in " ".join(args)
+    ):
+        args, env = add_jvm_options(
+            args, env, ["-XX:ActiveProcessorCount={}".format(threads)]
+        )
+    return args, env
+
+
+def register_tool(descriptor):
+    """
+    Register the descriptor for a tool. Registered descriptors take
+    precedence over the descriptors derived from the config
+
+    :param descriptor: ToolDescriptor instance
+    :return: The same descriptor
+    """
+    _registry[descriptor.name] = descriptor
+    return descriptor
+
+
+def register_hook(hook):
+    """
+    Register the hook for the tools that do not list their own hooks.
+    Hooks are applied in the order they are registered
+
+    :param hook: ToolHook instance
+    :return: The same hook
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+    return hook
+
+
+def get_tool(tool_name, type_str=None):
+    """
+    Method to find the descriptor for the given tool
+
+    :param tool_name: Tool or task name
+    :param type_str: Optional project type
+    :return: ToolDescriptor instance
+    """
+    if tool_name in _registry:
+        return _registry[tool_name]
+    declared = config.get("tool_descriptors", {}).get(tool_name, {})
+    cmd_type, cmd = find_command(tool_name, type_str)
+    return ToolDescriptor(
+        tool_name,
+        type_str=type_str or cmd_type or declared.get("type"),
+        cmd=cmd,
+        input_kind=declared.get("input"),
+        output_format=declared.get("output"),
+        parser=declared.get("parser"),
+        incremental=declared.get("incremental", False),
+        shardable=declared.get("shardable"),
+    )
+
+
+def get_tools():
+    """
+    Method to list the descriptors of all the known tools
+
+    :return: Ordered dict of tool name and ToolDescriptor
+    """
+    result = OrderedDict()
+    for type_str, cmd_map_list in config.get("scan_tools_args_map").items():
+        if isinstance(cmd_map_list, list):
+            cmd_map_list = {type_str: cmd_map_list}
+        for tool_name in cmd_map_list.keys():
+            result.setdefault(tool_name, get_tool(tool_name, type_str))
+    for tool_name in config.get("tool_descriptors", {}).keys():
+        result.setdefault(tool_name, get_tool(tool_name))
+    for tool_name, descriptor in _registry.items():
+        result[tool_name] = descriptor
+    return result
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Scan.  If not, see <https://www.gnu.org/licenses/>.
 
+import json
 import os
 import re
 import shutil
@@ -25,6 +26,12 @@ import lib.config as config
 
 HASH_DIGEST_SIZE = 16
 
+# Directories containing the output of the automatic build
+BUILD_OUTPUT_DIRS = ["target", "build", "out", ".gradle"]
+
+# Project types detected during the previous runs
+PROJECT_TYPES_FILE = "project-types.json"
+
 
 def filter_ignored_dirs(dirs):
     """
@@ -305,6 +312,196 @@ def get_report_file(tool_name, reports_dir, convert, ext_name="json"):
     return report_fname
 
 
+def get_cache_dir(*paths):
+    """
+    Method to construct a directory inside the scan cache directory
+
+    :param paths: Sub directories
+    :return: Directory path which is created if required
+    """
+    cache_dir = os.path.join(config.get("SCAN_CACHE_DIR"), *paths)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _get_git_fingerprint(src, exclude_dir, h):
+    """Update the hash with the git tree id along with any uncommitted change
+
+    :return: True if the source directory is a clean or dirty git checkout
+    """
+    if not os.path.isdir(os.path.join(src, ".git")):
+        return False
+    try:
+        from git import Repo
+
+        repo = Repo(src)
+        h.update(repo.head.commit.tree.hexsha.encode())
+        status = repo.git.status("--porcelain", "--untracked-files=all")
+        for line in status.splitlines():
+            fname = os.path.abspath(os.path.join(src, line[3:].strip('"')))
+            if exclude_dir and fname.startswith(exclude_dir + os.sep):
+                continue
+            try:
+                st = os.stat(fname)
+                line = "{}:{}:{}".format(line, st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+            h.update((line + "\n").encode())
+        return True
+    except Exception:
+        return False
+
+
+def get_source_fingerprint(src, exclude_dir=None):
+    """
+    Method to compute a fingerprint for the source directory. The git tree id
+    and the uncommitted changes are used for git checkouts so that the fingerprint
+    is stable across fresh clones. Otherwise, the path, size and modification time
+    of the files are used
+
+    :param src: Source directory
+    :param exclude_dir: Directory to exclude such as the reports directory
+    :return: Hash string that changes whenever any file is added, removed or modified
+    """
+    h = blake2b(digest_size=HASH_DIGEST_SIZE)
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    if _get_git_fingerprint(src, exclude_dir, h):
+        return h.hexdigest()
+    for root, dirs, files in os.walk(src):
+        filter_ignored_dirs(dirs)
+        # Build output should not invalidate the fingerprint computed before the build
+        dirs[:] = [
+            d
+            for d in dirs
+            if d not in BUILD_OUTPUT_DIRS
+            and os.path.abspath(os.path.join(root, d)) != exclude_dir
+        ]
+        dirs.sort()
+        for file in sorted(files):
+            fname = os.path.join(root, file)
+            try:
+                st = os.stat(fname)
+            except OSError:
+                continue
+            h.update(
+                "{}:{}:{}\n".format(
+                    os.path.relpath(fname, src), st.st_size, st.st_mtime_ns
+                ).encode()
+            )
+    return h.hexdigest()
+
+
+def get_tree_signature(src):
+    """
+    Method to compute a cheap signature for the layout of the source directory.
+    The git HEAD tree id is used for git checkouts and the modification time of
+    the top level directories otherwise. Unlike get_source_fingerprint, the signature
+    does not notice every change and is only suitable for speculative decisions
+
+    :param src: Source directory
+    :return: Hash string
+    """
+    h = blake2b(digest_size=HASH_DIGEST_SIZE)
+    h.update(os.path.abspath(src).encode())
+    if os.path.isdir(os.path.join(src, ".git")):
+        try:
+            from git import Repo
+
+            h.update(Repo(src).head.commit.tree.hexsha.encode())
+            return h.hexdigest()
+        except Exception:
+            pass
+    try:
+        entries = sorted(os.scandir(src), key=lambda e: e.name)
+    except OSError:
+        return h.hexdigest()
+    # Directories ignored by the detection such as the reports directory do not count
+    skip_dirs = BUILD_OUTPUT_DIRS + config.ignore_directories
+    for entry in entries:
+        try:
+            if entry.is_dir() and entry.name.lower() not in skip_dirs:
+                h.update(
+                    "{}:{}\n".format(entry.name, entry.stat().st_mtime_ns).encode()
+                )
+            elif entry.is_file():
+                h.update("{}\n".format(entry.name).encode())
+        except OSError:
+            continue
+    return h.hexdigest()
+
+
+def _project_types_key(src, scan_mode):
+    return "{}:{}".format(os.path.abspath(src), scan_mode)
+
+
+def get_cached_project_type(src, scan_mode):
+    """
+    Method to find the project types detected during the previous run
+    for the same source directory and signature
+
+    :param src: Source directory
+    :param scan_mode: Scan mode string
+    :return: List of project types or None
+    """
+    try:
+        with open(os.path.join(get_cache_dir(), PROJECT_TYPES_FILE), mode="r") as fp:
+            entry = json.load(fp).get(_project_types_key(src, scan_mode))
+    except Exception:
+        return None
+    if not entry or entry.get("signature") != get_tree_signature(src):
+        return None
+    return entry.get("types")
+
+
+def save_project_type(src, scan_mode, project_types):
+    """
+    Method to cache the detected project types for the source directory
+
+    :param src: Source directory
+    :param scan_mode: Scan mode string
+    :param project_types: List of detected project types
+    """
+    cache_file = os.path.join(get_cache_dir(), PROJECT_TYPES_FILE)
+    data = {}
+    try:
+        with open(cache_file, mode="r") as fp:
+            data = json.load(fp)
+    except Exception:
+        data = {}
+    data[_project_types_key(src, scan_mode)] = {
+        "signature": get_tree_signature(src),
+        "types": list(project_types),
+    }
+    try:
+        with open(cache_file, mode="w") as fp:
+            json.dump(data, fp)
+    except OSError:
+        pass
+
+
+def detect_project_type_cached(src, scan_mode):
+    """
+    Method to detect the project types using the types cached during the previous run
+    with the same signature. The cached types are returned immediately along with a
+    function that performs the actual detection, so that the tools can start while
+    the detection confirms the types
+
+    :param src: Source directory
+    :param scan_mode: Scan mode string
+    :return: Tuple of the list of project types and the confirm function or None
+    """
+
+    def confirm():
+        project_types = detect_project_type(src, scan_mode)
+        save_project_type(src, scan_mode, project_types)
+        return project_types
+
+    cached = get_cached_project_type(src, scan_mode)
+    if cached:
+        return cached, confirm
+    return confirm(), None
+
+
 def get_workspace(repo_context):
     """
     Construct the workspace url from the given repo context
@@ -14,6 +14,7 @@
 # along with Scan.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+from xml.etree.ElementTree import Element, ElementTree
 
 from defusedxml.ElementTree import parse
 
@@ -88,6 +89,80 @@ def get_report_data(xmlfile, file_path_list=[], working_dir=""):
     return issues, metrics
 
 
+def get_source_path(bug):
+    """Find the source file of the bug instance
+
+    :param bug: BugInstance element
+    :return: Source path of the primary source line or None
+    """
+    source_path = None
+    for ele in bug.iter():
+        if ele.tag.lower() != "SourceLine".lower() or not ele.attrib.get("sourcepath"):
+            continue
+        if ele.attrib.get("synthetic") == "true" or ele.attrib.get("primary") == "true":
+            return ele.attrib["sourcepath"]
+        if not source_path:
+            source_path = ele.attrib["sourcepath"]
+    return source_path
+
+
+def get_bug_class(bug):
+    """Find the class of the bug instance
+
+    :param bug: BugInstance element
+    :return: Name of the primary class or None
+    """
+    class_name = None
+    for ele in bug:
+        if ele.tag.lower() != "Class".lower() or not ele.attrib.get("classname"):
+            continue
+        if ele.attrib.get("primary") == "true":
+            return ele.attrib["classname"]
+        if not class_name:
+            class_name = ele.attrib["classname"]
+    return class_name
+
+
+def split_report(xmlfile, report_files, extensions):
+    """Split the spotbugs xml report covering several languages into a report per
+    language based on the extension of the source files
+
+    :param xmlfile: xml file to split
+    :param report_files: Dict of tool name and the xml file to create
+    :param extensions: Dict of tool name and the list of source file extensions.
+        Bugs in any other file are included in the report of the first tool
+    :return: Dict of tool name and the number of bugs
+    """
+    root = parse(xmlfile).getroot()
+    ext_map = {}
+    for tool_name, exts in extensions.items():
+        for ext in exts:
+            ext_map.setdefault(ext, tool_name)
+    default_tool = next(iter(report_files))
+    roots = {}
+    counts = {}
+    for tool_name in report_files.keys():
+        roots[tool_name] = Element(root.tag, root.attrib)
+        roots[tool_name].text = root.text
+        counts[tool_name] = 0
+    for child in root:
+        if child.tag.lower() != "BugInstance".lower():
+            for tool_root in roots.values():
+                tool_root.append(child)
+            continue
+        ext = os.path.splitext(get_source_path(child) or "")[1].lower()
+        tool_name = ext_map.get(ext, default_tool)
+        if tool_name not in roots:
+            continue
+        roots[tool_name].append(child)
+        counts[tool_name] += 1
+    for tool_name, fname in report_files.items():
+        ElementTree(roots[tool_name]).write(
+            fname, encoding="utf-8", xml_declaration=True
+        )
+    return counts
+
+
 def parse_checkstyle(root, file_path_list, working_dir):
     """Parse checkstyle xml
     """
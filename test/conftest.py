@@ -1,6 +1,8 @@
 import os
+import tempfile
 
 os.environ["PMD_CMD"] = "/opt/pmd-bin/bin/run.sh pmd"
 os.environ["APP_SRC_DIR"] = "/usr/local/src"
 os.environ["TOOLS_CONFIG_DIR"] = "/usr/local/src"
 os.environ["SPOTBUGS_HOME"] = "/opt/spotbugs"
+os.environ["SCAN_CACHE_DIR"] = tempfile.mkdtemp(prefix="scan-cache-")
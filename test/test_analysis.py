@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
+import shutil
 import tempfile
 from pathlib import Path
 
@@ -46,3 +47,16 @@ def test_summary_strict():
     for k, v in report_summary.items():
         assert v["status"] == "❌"
     assert build_status == "fail"
+
+
+def test_build_break_gate():
+    data_dir = Path(__file__).parent / "data"
+    with tempfile.TemporaryDirectory() as reports_dir:
+        gate = analysis.BuildBreakGate(reports_dir)
+        assert not gate.check()
+        shutil.copy(data_dir / "nodejsscan-report.sarif", reports_dir)
+        assert not gate.check()
+        shutil.copy(data_dir / "findsecbugs-report.sarif", reports_dir)
+        assert gate.check()
+        assert gate.failed_tools == ["Java security audit"]
+        assert len(gate.evaluated) == 2
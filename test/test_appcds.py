@@ -0,0 +1,88 @@
+import os
+import stat
+
+import lib.appcds as appcds
+import lib.config as config
+
+FAKE_JAVA = """#!/bin/sh
+for arg in "$@"; do
+  case "$arg" in
+    -XX:SharedArchiveFile=*) echo archive > "${arg#-XX:SharedArchiveFile=}" ;;
+  esac
+done
+"""
+
+
+def test_archive_lifecycle(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path / "cache"))
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    java = bin_dir / "java"
+    java.write_text(FAKE_JAVA)
+    java.chmod(java.stat().st_mode | stat.S_IEXEC)
+    jar_file = tmp_path / "detekt-cli.jar"
+    jar_file.write_text("v1")
+    env = {"PATH": str(bin_dir)}
+    try:
+        args = ["java", "-jar", str(jar_file), "--input", "/app"]
+        assert appcds.prepare(["java", "-jar", "/opt/other.jar"], env)[2] is None
+        run_args, _, pending = appcds.prepare(args, env)
+        assert run_args[1].startswith("-XX:DumpLoadedClassList=")
+        # Classes loaded by the tool
+        with open(pending["classlist"], "w") as fp:
+            fp.write("java/lang/Object\n")
+        archive_file = appcds.build_archive(pending)
+        assert os.path.isfile(archive_file)
+        assert not os.path.exists(pending["classlist"])
+        run_args, _, pending = appcds.prepare(args, env)
+        assert pending is None
+        assert run_args[1:3] == [
+            "-Xshare:auto",
+            "-XX:SharedArchiveFile=" + archive_file,
+        ]
+        # New version of the tool
+        jar_file.write_text("v2")
+        run_args, _, pending = appcds.prepare(args, env)
+        assert pending is not None
+        with open(pending["classlist"], "w") as fp:
+            fp.write("java/lang/Object\n")
+        new_archive = appcds.build_archive(pending)
+        assert new_archive != archive_file
+        assert not os.path.exists(archive_file)
+    finally:
+        config.set("SCAN_CACHE_DIR", cache_dir)
+
+
+def test_build_archives(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path / "cache"))
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    java = bin_dir / "java"
+    java.write_text(FAKE_JAVA)
+    java.chmod(java.stat().st_mode | stat.S_IEXEC)
+    jar_file = tmp_path / "spotbugs.jar"
+    jar_file.write_text("v1")
+    env = {"PATH": str(bin_dir)}
+    hook = appcds.AppCdsHook()
+    try:
+        assert appcds.start_build() is None
+        args = ["java", "-jar", str(jar_file), "-textui", "/app"]
+        classlists = []
+        # Runs of the same tool share the archive
+        for _ in range(2):
+            _, _, pending = hook.prepare("class", args, env)
+            with open(pending["classlist"], "w") as fp:
+                fp.write("java/lang/Object\n")
+            classlists.append(pending["classlist"])
+            hook.complete(pending)
+        # Archive is created only once the scan has run the tools
+        assert appcds.prepare(args, env)[2] is not None
+        thread = appcds.start_build()
+        thread.join()
+        assert appcds.prepare(args, env)[2] is None
+        assert not any(os.path.exists(c) for c in classlists)
+        assert appcds.build_archives() == []
+    finally:
+        config.set("SCAN_CACHE_DIR", cache_dir)
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+
+import lib.budget as budget
+import lib.config as config
+import lib.resources as resources
+import lib.scheduler as scheduler
+
+
+def make_tasks(predictions):
+    tasks = OrderedDict()
+    for name, predicted, deps in predictions:
+        tasks[name] = scheduler.Task(name, "test", None, deps=deps)
+        tasks[name].predicted = predicted
+    return tasks
+
+
+def test_apply_time_budget():
+    config.set("tool_args_removed", {})
+    tasks = make_tasks(
+        [
+            ("audit-init", 10, []),
+            ("audit-php", 100, ["audit-init"]),
+            ("taint-php", 300, ["audit-init"]),
+            ("class", 500, []),
+            ("credscan", 20, []),
+        ]
+    )
+    assert budget.apply_time_budget(tasks, 1000, 2) == []
+    dropped = budget.apply_time_budget(tasks, 450, 2)
+    assert [d["tool"] for d in dropped] == ["class"]
+    assert tasks["class"].predicted == 300
+    assert config.get("tool_args_removed")["class"] == ["-effort:max"]
+    dropped = budget.apply_time_budget(tasks, 320, 2)
+    assert [d["tool"] for d in dropped] == ["audit-php", "taint-php"]
+    assert tasks["taint-php"].status == "skipped"
+    dropped = budget.apply_time_budget(tasks, 200, 2)
+    assert dropped == [{"tool": "class", "action": "skipped", "saving": 300}]
+    assert tasks["audit-init"].status == "pending"
+    config.set("tool_args_removed", {})
+
+
+def test_apply_tiny_budget():
+    config.set("tool_args_removed", {})
+    tasks = make_tasks(
+        [
+            ("source-python", 60, []),
+            ("bandit", 30, []),
+            ("credscan", 20, []),
+            ("depscan", 90, []),
+        ]
+    )
+    tasks["credscan"].type_str = "credscan"
+    dropped = budget.apply_time_budget(tasks, 5, 1)
+    # Cheapest tool of each type is retained however small the budget is
+    assert sorted(d["tool"] for d in dropped) == ["depscan", "source-python"]
+    assert tasks["bandit"].status == "pending"
+    assert tasks["credscan"].status == "pending"
+    config.set("tool_args_removed", {})
+
+
+def test_deadline():
+    config.set("tool_timeouts", {})
+    remaining = budget.start_deadline(100, time.time() - 40)
+    assert 59 <= remaining <= 60
+    assert 59 <= resources.get_tool_timeout("source-python") <= 60
+    assert 59 <= budget.get_remaining() <= 60
+    config.set("scan_deadline", None)
+    assert budget.get_remaining() is None
+    assert resources.get_tool_timeout("source-python") == 1200
@@ -911,3 +911,86 @@ def test_phptaint_extract_issue():
             "medium": 0,
             "low": 0,
         }
+
+
+def test_repair_truncated_json():
+    data = convertLib.repair_truncated_json(
+        '{"results": [{"id": "a", "msg": "x}"}, {"id": "b"}, {"id": "c", "ms'
+    )
+    assert data == {"results": [{"id": "a", "msg": "x}"}, {"id": "b"}]}
+    data = convertLib.repair_truncated_json('[{"a": [1, {"b": 2}, {"c"')
+    assert data == [{"a": [1, {"b": 2}]}]
+    assert convertLib.repair_truncated_json('{"results": {"a": 1') is None
+    assert convertLib.repair_truncated_json("") is None
+
+
+def test_convert_partial_report():
+    with tempfile.NamedTemporaryFile(
+        mode="w", encoding="utf-8", suffix=".json", delete=False
+    ) as rfile:
+        rfile.write('[{"rule": "AWS001", "line": 1, "file": "main.tf"}, {"rule": "AW')
+    with tempfile.NamedTemporaryFile(mode="w", encoding="utf-8", delete=True) as cfile:
+        data = convertLib.convert_file(
+            "tfsec",
+            [],
+            ".",
+            rfile.name,
+            cfile.name,
+            failure_reason="tfsec was terminated",
+        )
+        jsondata = json.loads(data)
+        invocation = jsondata["runs"][0]["invocations"][0]
+        assert not invocation["executionSuccessful"]
+        assert (
+            invocation["toolExecutionNotifications"][0]["message"]["text"]
+            == "tfsec was terminated"
+        )
+        assert len(jsondata["runs"][0]["results"]) == 1
+    os.unlink(rfile.name)
+
+
+def test_split_checkov_report():
+    with open(Path(__file__).parent / "data" / "checkov-report.json") as fp:
+        tf_report = json.load(fp)
+    k8s_report = {
+        "check_type": "kubernetes",
+        "results": {
+            "passed_checks": [],
+            "failed_checks": [
+                {
+                    "check_id": "CKV_K8S_8",
+                    "check_name": "Liveness Probe Should be Configured",
+                    "file_path": "/deploy.yaml",
+                    "file_line_range": [1, 20],
+                }
+            ],
+        },
+    }
+    with tempfile.TemporaryDirectory() as reports_dir:
+        report_file = os.path.join(reports_dir, "checkov-report.json")
+        with open(report_file, "w") as fp:
+            json.dump([tf_report, k8s_report], fp)
+        report_files = {
+            "source-yaml": os.path.join(reports_dir, "source-yaml-report.json"),
+            "source-tf": os.path.join(reports_dir, "source-tf-report.json"),
+        }
+        counts = convertLib.split_checkov_report(
+            report_file,
+            report_files,
+            {
+                "source-yaml": [],
+                "source-tf": ["terraform"],
+                "source-k8s": ["kubernetes"],
+            },
+        )
+        tf_failed = len(tf_report["results"]["failed_checks"])
+        # kubernetes is not part of the scan
+        assert counts == {"source-yaml": 1, "source-tf": tf_failed}
+        issues, _, _ = convertLib.extract_from_file(
+            "checkov", [], reports_dir, report_files["source-tf"]
+        )
+        assert len(issues) == tf_failed
+        issues, _, _ = convertLib.extract_from_file(
+            "checkov", [], reports_dir, report_files["source-yaml"]
+        )
+        assert [i["check_id"] for i in issues] == ["CKV_K8S_8"]
@@ -1,3 +1,4 @@
+import io
 import os
 
 import lib.csv_parser as csv_parser
@@ -12,3 +13,22 @@ def test_pmd_parse():
         headers, report_data = csv_parser.get_report_data(rf)
         assert len(headers) == 8
         assert len(report_data) == 2
+
+
+def test_truncated_parse():
+    with open(
+        os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "data",
+            "pmd-report.csv",
+        )
+    ) as rf:
+        contents = rf.read()
+    # Tool terminated while writing the second row
+    for end in [contents.rindex('","') + 5, contents.rindex('","') - 3]:
+        headers, report_data = csv_parser.get_report_data(io.StringIO(contents[:end]))
+        assert len(headers) == 8
+        assert len(report_data) == 1
+        assert report_data[0]["line"] == "10"
+    headers, report_data = csv_parser.get_report_data(io.StringIO(contents.strip()))
+    assert len(report_data) == 2
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from collections import OrderedDict
+
+import lib.history as history
+import lib.scheduler as scheduler
+
+
+def write_file(dirname, fname, content):
+    fpath = os.path.join(dirname, fname)
+    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+    with open(fpath, "w") as fp:
+        fp.write(content)
+
+
+def test_inventory():
+    with tempfile.TemporaryDirectory() as src:
+        write_file(src, "app.py", "import os\nprint(os)\n")
+        write_file(src, "lib/util.py", "x = 1\n")
+        write_file(src, "web/app.js", "var a = 1;\n")
+        write_file(src, "node_modules/dep/index.js", "var b = 2;\n")
+        write_file(src, "README.md", "# Readme\n")
+        inventory = history.get_inventory(src)
+        assert inventory["total"]["files"] == 3
+        # Lines are estimated from the size of each file
+        assert inventory["extensions"][".py"] == {"files": 2, "bytes": 26, "loc": 2}
+        assert history.get_type_size(inventory, "python")["loc"] == 2
+        assert history.get_type_size(inventory, "nodejs")["loc"] == 1
+        assert history.get_type_size(inventory, "credscan")["files"] == 3
+        assert history.get_type_size(None, "python")["loc"] == 0
+        # Inventory is reused while the layout of the directory is unchanged
+        history._inventories.clear()
+        assert history.get_inventory(src) == inventory
+
+
+def test_predict_duration():
+    size = {"files": 10, "bytes": 10000, "loc": 10000}
+    predicted, source = history.predict_duration("audit-test", size)
+    assert source == "estimate"
+    assert predicted == 100
+    history.record_duration("source-test", {"files": 1, "bytes": 100, "loc": 999}, 10)
+    history.record_duration("source-test", {"files": 1, "bytes": 100, "loc": 99}, 4)
+    predicted, source = history.predict_duration(
+        "source-test", {"files": 2, "bytes": 200, "loc": 1999}
+    )
+    assert source == "history"
+    assert predicted == 50
+    for i in range(20):
+        history.record_duration("source-test", size, i)
+    assert len(history.load_history()["source-test"]) == history.MAX_SAMPLES
+
+
+def test_plan_tasks():
+    tasks = OrderedDict()
+    for name, predicted, deps in [
+        ("audit-init", 10, []),
+        ("audit-php", 50, ["audit-init"]),
+        ("taint-php", 100, ["audit-init"]),
+        ("source-go", 30, []),
+        ("staticcheck", 5, []),
+    ]:
+        tasks[name] = scheduler.Task(name, "test", None, deps=deps)
+        tasks[name].predicted = predicted
+    plan = scheduler.plan_tasks(tasks, 2)
+    assert list(plan.keys()) == [
+        "source-go",
+        "audit-init",
+        "taint-php",
+        "audit-php",
+        "staticcheck",
+    ]
+    assert plan["taint-php"] == (10, 110)
+    assert plan["audit-php"] == (30, 80)
+    assert plan["staticcheck"] == (80, 85)
+    ready = scheduler._ready_tasks(tasks)
+    assert [t.name for t in ready] == ["source-go", "audit-init", "staticcheck"]
+
+
+def test_record_tasks():
+    tasks = OrderedDict()
+    for name, returncode in [("source-ran", 1), ("source-missing", None)]:
+        task = scheduler.Task(name, "test", None)
+        task.status = "success"
+        task.returncode = returncode
+        task.size = {"files": 1, "bytes": 100, "loc": 10}
+        task.start_time, task.end_time = 0, 5
+        tasks[name] = task
+    history.record_tasks(tasks)
+    assert history.load_history()["source-ran"][-1]["duration"] == 5
+    assert "source-missing" not in history.load_history()
+
+
+def test_annotate_tasks_classes():
+    with tempfile.TemporaryDirectory() as src:
+        write_file(src, "src/App.java", "class App {}\n")
+        tasks = OrderedDict()
+        for name, type_str in [("class", "java"), ("source-python", "python")]:
+            tasks[name] = scheduler.Task(name, type_str, None)
+        history.annotate_tasks(tasks, history.get_inventory(src), src)
+        assert tasks["class"].class_dir == src
+        assert tasks["source-python"].class_dir is None
+        demand = tasks["source-python"].memory_demand
+        # Classes produced by the build are counted when the task starts
+        for i in range(100):
+            write_file(src, "target/classes/C{}.class".format(i), "")
+        assert history.count_classes(src) == 100
+        history.update_memory_demand(tasks["class"])
+        assert tasks["class"].memory_demand > tasks["source-python"].memory_demand
+        history.update_memory_demand(tasks["source-python"])
+        assert tasks["source-python"].memory_demand == demand
@@ -0,0 +1,58 @@
+import asyncio
+import fcntl
+import os
+import tempfile
+
+import lib.hostslots as hostslots
+
+
+def test_host_slots_shared():
+    with tempfile.TemporaryDirectory() as slots_dir:
+        first = hostslots.HostSlots(slots_dir, 4, 4096)
+        second = hostslots.HostSlots(slots_dir, 4, 4096)
+        heavy = {"cpu": 2, "memory": 2048}
+        slot = first.try_acquire("class", heavy)
+        assert slot is not None
+        assert second.get_usage() == (1, 2, 2048)
+        other = second.try_acquire("audit-kt", heavy)
+        assert other is not None
+        assert first.try_acquire("source-java", {"cpu": 1, "memory": 256}) is None
+        first.release(slot)
+        assert second.get_usage() == (1, 2, 2048)
+        loop = asyncio.new_event_loop()
+        slot = loop.run_until_complete(first.acquire("source-java", heavy))
+        assert slot is not None
+        first.release_all()
+        second.release_all()
+        assert second.get_usage() == (0, 0, 0)
+
+
+def test_host_slots_stale():
+    with tempfile.TemporaryDirectory() as slots_dir:
+        # Slot of a process that died without releasing it
+        with open(os.path.join(slots_dir, "dead.slot"), "w") as fp:
+            fp.write('{"cpu": 8, "memory": 8192}')
+        slots = hostslots.HostSlots(slots_dir, 4)
+        assert slots.get_usage() == (0, 0, 0)
+        assert not os.path.exists(os.path.join(slots_dir, "dead.slot"))
+        # Host is idle so a tool heavier than the host is still admitted
+        slot = slots.try_acquire("class", {"cpu": 8, "memory": 8192})
+        assert slot is not None
+        slots.release(slot)
+
+
+def test_host_slots_ledger_busy():
+    with tempfile.TemporaryDirectory() as slots_dir:
+        slots = hostslots.HostSlots(slots_dir, 4)
+        # Ledger locked by another scan process
+        with open(os.path.join(slots_dir, hostslots.LEDGER_LOCK_FILE), "w") as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            assert slots.try_acquire("class", {"cpu": 1}) is None
+            loop = asyncio.new_event_loop()
+            task = loop.create_task(slots.acquire("class", {"cpu": 1}))
+            loop.run_until_complete(asyncio.sleep(0.2))
+            assert not task.done()
+            fcntl.flock(fp, fcntl.LOCK_UN)
+            assert loop.run_until_complete(task) is not None
+            loop.close()
+        slots.release_all()
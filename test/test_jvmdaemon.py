@@ -0,0 +1,182 @@
+import json
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+import lib.config as config
+import lib.jvmdaemon as jvmdaemon
+
+
+def test_get_launch(tmp_path):
+    assert jvmdaemon.get_launch(["bandit", "-r", "."]) is None
+    assert jvmdaemon.get_launch(["java", "-jar", "/opt/other.jar", "x"]) is None
+    classpath, main_class, tool_args = jvmdaemon.get_launch(
+        ["java", "-jar", "/opt/spotbugs/lib/spotbugs.jar", "-textui", "/app"]
+    )
+    assert classpath == ["/opt/spotbugs/lib/spotbugs.jar"]
+    assert main_class is None
+    assert tool_args == ["-textui", "/app"]
+    # Options for the jvm need a new jvm
+    assert (
+        jvmdaemon.get_launch(
+            ["java", "-Xmx2g", "-jar", "/opt/spotbugs/lib/spotbugs.jar", "/app"]
+        )
+        is None
+    )
+    lib_dir = tmp_path / "pmd-bin" / "lib"
+    lib_dir.mkdir(parents=True)
+    (lib_dir / "pmd-core.jar").write_text("")
+    (tmp_path / "src").mkdir()
+    launcher = str(tmp_path / "pmd-bin" / "bin" / "run.sh")
+    classpath, main_class, tool_args = jvmdaemon.get_launch(
+        [launcher, "pmd", "-d", "src", "-f", "csv"], cwd=str(tmp_path)
+    )
+    assert classpath == [str(lib_dir / "pmd-core.jar")]
+    assert main_class == "net.sourceforge.pmd.PMD"
+    # Relative paths are resolved since the daemon has its own working directory
+    assert tool_args == ["-d", str(tmp_path / "src"), "-f", "csv"]
+    assert (
+        jvmdaemon.get_launch(
+            [launcher, "pmd", "-d", "src"], env={"PMD_JAVA_OPTS": "-Xmx1g"}
+        )
+        is None
+    )
+
+
+def fake_daemon(server, requests):
+    conn, _ = server.accept()
+    with conn:
+        reader = conn.makefile("r", encoding="utf-8")
+        token = reader.readline().strip()
+        main_class = reader.readline().strip()
+        classpath = [reader.readline().strip() for _ in range(int(reader.readline()))]
+        tool_args = [reader.readline().strip() for _ in range(int(reader.readline()))]
+        requests.append((token, main_class, classpath, tool_args))
+        for chunk in [b"Analysing ", b"classes\n"]:
+            conn.sendall(struct.pack(">i", len(chunk)) + chunk)
+        conn.sendall(struct.pack(">ii", -1, 3))
+
+
+def test_run_tool(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path))
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    with open(os.path.join(str(tmp_path), jvmdaemon.STATE_FILE), "w") as fp:
+        json.dump({"pid": 0, "port": server.getsockname()[1], "token": "t"}, fp)
+    requests = []
+    thread = threading.Thread(target=fake_daemon, args=(server, requests))
+    thread.start()
+    try:
+        cp = jvmdaemon.run_tool(
+            "audit-kt",
+            ["java", "-jar", "/opt/detekt-cli.jar", "--input", "/app"],
+            stdout=subprocess.PIPE,
+        )
+    finally:
+        thread.join()
+        server.close()
+        config.set("SCAN_CACHE_DIR", cache_dir)
+    assert requests == [("t", "", ["/opt/detekt-cli.jar"], ["--input", "/app"])]
+    assert cp.returncode == 3
+    assert cp.stdout == "Analysing classes\n"
+
+
+def stalled_daemon(server, requests):
+    conn, _ = server.accept()
+    with conn:
+        reader = conn.makefile("r", encoding="utf-8")
+        for _ in range(2):
+            reader.readline()
+        for _ in range(2):
+            for _ in range(int(reader.readline())):
+                reader.readline()
+        # The tool does not complete until it is cancelled
+        requests.append(reader.readline().strip())
+
+
+def test_run_tool_cancel(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path))
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    with open(os.path.join(str(tmp_path), jvmdaemon.STATE_FILE), "w") as fp:
+        json.dump({"pid": 0, "port": server.getsockname()[1], "token": "t"}, fp)
+    requests = []
+    thread = threading.Thread(target=stalled_daemon, args=(server, requests))
+    thread.start()
+    cancel_event = threading.Event()
+    timer = threading.Timer(0.2, cancel_event.set)
+    timer.start()
+    try:
+        cp = jvmdaemon.run_tool(
+            "audit-kt",
+            ["java", "-jar", "/opt/detekt-cli.jar", "--input", "/app"],
+            cancel_event=cancel_event,
+        )
+    finally:
+        thread.join()
+        server.close()
+        config.set("SCAN_CACHE_DIR", cache_dir)
+    assert cp.cancelled
+    assert cp.returncode < 0
+    assert requests == ["cancel"]
+
+
+def test_run_tool_start(tmp_path, monkeypatch):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path))
+    starts = []
+    monkeypatch.setattr(
+        jvmdaemon, "start_daemon", lambda env=None: starts.append(env) or None
+    )
+    try:
+        assert (
+            jvmdaemon.run_tool(
+                "audit-kt", ["java", "-jar", "/opt/detekt-cli.jar", "--input", "/app"]
+            )
+            is None
+        )
+    finally:
+        config.set("SCAN_CACHE_DIR", cache_dir)
+    assert len(starts) == 1
+    assert os.path.isfile(os.path.join(str(tmp_path), jvmdaemon.START_LOCK_FILE))
+
+
+def slow_daemon(server, requests):
+    # Longer than the interval at which the client checks for the cancellation
+    time.sleep(jvmdaemon.CANCEL_POLL_INTERVAL * 1.5)
+    fake_daemon(server, requests)
+
+
+def test_run_tool_no_limit(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path))
+    # 0 means the tool has no time limit
+    config.set("tool_timeouts", {"audit-kt": 0})
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    with open(os.path.join(str(tmp_path), jvmdaemon.STATE_FILE), "w") as fp:
+        json.dump({"pid": 0, "port": server.getsockname()[1], "token": "t"}, fp)
+    requests = []
+    thread = threading.Thread(target=slow_daemon, args=(server, requests))
+    thread.start()
+    try:
+        cp = jvmdaemon.run_tool(
+            "audit-kt",
+            ["java", "-jar", "/opt/detekt-cli.jar", "--input", "/app"],
+            stdout=subprocess.PIPE,
+        )
+    finally:
+        thread.join()
+        server.close()
+        config.set("SCAN_CACHE_DIR", cache_dir)
+        config.set("tool_timeouts", {})
+    assert cp.returncode == 3
+    assert not getattr(cp, "timed_out", False)
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+
+import lib.manifest as manifest
+import lib.scheduler as scheduler
+import lib.utils as utils
+
+
+def write_file(fname, content):
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname, "w") as fp:
+        fp.write(content)
+
+
+def report_scan(src, reports_dir, convert, repo_context):
+    fname = os.path.join(reports_dir, "report-report.sarif")
+    write_file(fname, "{}")
+    manifest.record_file(fname)
+    manifest.record_file(os.path.join(reports_dir, "report-report.json"))
+    return 0
+
+
+def missing_scan(src, reports_dir, convert, repo_context):
+    raise ValueError("missing")
+
+
+def unavailable_scan(src, reports_dir, convert, repo_context):
+    # Tool is not installed
+    return None
+
+
+def make_tasks(src, reports_dir):
+    return scheduler.build_task_graph(
+        ["report", "missing", "unavailable"],
+        src,
+        reports_dir,
+        True,
+        "ci",
+        {},
+        sys.modules[__name__],
+    )
+
+
+def test_source_fingerprint():
+    with tempfile.TemporaryDirectory() as src:
+        write_file(os.path.join(src, "app", "main.py"), "print(1)")
+        fingerprint = utils.get_source_fingerprint(src)
+        reports_dir = os.path.join(src, "out-reports")
+        write_file(os.path.join(reports_dir, "a.sarif"), "{}")
+        write_file(os.path.join(src, "target", "main.class"), "x")
+        assert utils.get_source_fingerprint(src, reports_dir) == fingerprint
+        write_file(os.path.join(src, "app", "main.py"), "print(2)")
+        assert utils.get_source_fingerprint(src, reports_dir) != fingerprint
+
+
+def test_manifest_resume():
+    with tempfile.TemporaryDirectory() as src:
+        write_file(os.path.join(src, "main.py"), "print(1)")
+        reports_dir = os.path.join(src, "reports")
+        run_manifest = manifest.RunManifest(reports_dir, src, "run-1")
+        tasks = make_tasks(src, reports_dir)
+        scheduler.run_tasks(tasks, max_workers=1, on_complete=run_manifest.record)
+        run_manifest.wait()
+        assert run_manifest.get_files(".sarif") == [
+            os.path.join(reports_dir, "report-report.sarif")
+        ]
+        assert os.path.exists(os.path.join(reports_dir, manifest.MANIFEST_FILE))
+        # Only the failed task should run again
+        run_manifest = manifest.RunManifest(reports_dir, src, "run-2")
+        tasks = make_tasks(src, reports_dir)
+        assert run_manifest.resume(tasks) == ["report"]
+        assert tasks["report"].status == "success"
+        assert tasks["missing"].status == "pending"
+        assert tasks["unavailable"].status == "pending"
+        assert run_manifest.get_files(".sarif") == [
+            os.path.join(reports_dir, "report-report.sarif")
+        ]
+        # Tiered run restricted to the selected files
+        tasks = make_tasks(src, reports_dir)
+        tasks["report"].scope_args = ["-onlyAnalyze", "com.app.*"]
+        run_manifest = manifest.RunManifest(reports_dir, src, "run-2")
+        assert run_manifest.resume(tasks) == []
+        # Changes to the source make the results stale
+        write_file(os.path.join(src, "main.py"), "print(2)")
+        run_manifest = manifest.RunManifest(reports_dir, src, "run-3")
+        assert run_manifest.resume(make_tasks(src, reports_dir)) == []
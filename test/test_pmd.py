@@ -0,0 +1,94 @@
+import csv
+import os
+import tempfile
+from collections import OrderedDict
+
+import lib.config as config
+import lib.pmd as pmd
+import lib.scheduler as scheduler
+
+
+def ok_scan(src, reports_dir, convert, repo_context):
+    return 0
+
+
+CSV_REPORT = """"Problem","Package","File","Priority","Line","Description","Rule set","Rule"
+"1","com.acme","/app/src/Login.java","3","10","Avoid printStackTrace","Best Practices","AvoidPrintStackTrace"
+"2","","/app/force-app/Account.cls","1","4","Validate CRUD","Security","ApexCRUDViolation"
+"3","","/app/web/index.jsp","2","7","Avoid scriptlets","Security","NoUnsanitizedJSPExpression"
+"4","","/app/pom.xml","3","1","Unused property","Best Practices","UnusedProperty"
+"""
+
+
+def test_split_report():
+    with tempfile.TemporaryDirectory() as reports_dir:
+        report_fname = os.path.join(reports_dir, "source-pmd-report.csv")
+        with open(report_fname, "w") as fp:
+            fp.write(CSV_REPORT)
+        reports = pmd.split_report(
+            report_fname, ["source-java", "source-apex"], reports_dir
+        )
+        assert sorted(reports.keys()) == ["source-apex", "source-java"]
+        rows = {}
+        for tool_name, fname in reports.items():
+            assert fname == os.path.join(reports_dir, tool_name + "-report.csv")
+            with open(fname, newline="") as fp:
+                rows[tool_name] = list(csv.reader(fp))
+        assert rows["source-java"][0][2] == "File"
+        # Files without a dedicated tool are reported by the first tool
+        assert [r[2] for r in rows["source-java"][1:]] == [
+            "/app/src/Login.java",
+            "/app/pom.xml",
+        ]
+        # jsp is not part of the scan
+        assert [r[2] for r in rows["source-apex"][1:]] == ["/app/force-app/Account.cls"]
+
+
+def test_merge_pmd_tasks():
+    tasks = OrderedDict()
+    tasks["auto-build-java"] = scheduler.Task("auto-build-java", "java", ok_scan)
+    tasks["source-java"] = scheduler.Task(
+        "source-java", "java", ok_scan, deps=["auto-build-java"]
+    )
+    tasks["source-apex"] = scheduler.Task("source-apex", "apex", ok_scan)
+    tasks["class"] = scheduler.Task(
+        "class", "java", ok_scan, deps=["auto-build-java", "source-java"]
+    )
+    task = pmd.merge_pmd_tasks(tasks, "/app", "/app/reports", True)
+    assert task.name == pmd.PMD_TASK
+    assert task.merged == ["source-java", "source-apex"]
+    assert task.deps == {"auto-build-java"}
+    assert list(tasks.keys()) == ["auto-build-java", "class", pmd.PMD_TASK]
+    assert tasks["class"].deps == {"auto-build-java", pmd.PMD_TASK}
+    # A single pmd based tool runs on its own
+    tasks = OrderedDict()
+    tasks["source-java"] = scheduler.Task("source-java", "java", ok_scan)
+    assert pmd.merge_pmd_tasks(tasks, "/app", "/app/reports", True) is None
+    assert list(tasks.keys()) == ["source-java"]
+    # Tools with direct arguments are not merged
+    tasks = OrderedDict()
+    for name, type_str in [
+        ("source-java", "java"),
+        ("source-apex", "apex"),
+        ("source-jsp", "jsp"),
+    ]:
+        tasks[name] = scheduler.Task(name, type_str, ok_scan)
+    config.set("source-apex_direct_args", "-min 3")
+    task = pmd.merge_pmd_tasks(tasks, "/app", "/app/reports", True)
+    config.set("source-apex_direct_args", None)
+    assert task.merged == ["source-java", "source-jsp"]
+    assert list(tasks.keys()) == ["source-apex", pmd.PMD_TASK]
+
+
+def test_pmd_merged_scan_removed_args(monkeypatch):
+    commands = []
+    monkeypatch.setattr(pmd.utils, "check_command", lambda cmd: True)
+    monkeypatch.setattr(
+        pmd, "exec_tool", lambda tool_name, args, cwd: commands.append(args)
+    )
+    config.set("tool_args_removed", {"source-apex": ["-no-cache"]})
+    with tempfile.TemporaryDirectory() as reports_dir:
+        pmd.pmd_merged_scan(["source-java", "source-apex"], "/app", reports_dir, True)
+    config.set("tool_args_removed", {})
+    assert "-no-cache" not in commands[0]
+    assert "--failOnViolation" in commands[0]
@@ -0,0 +1,39 @@
+import os
+
+import lib.config as config
+import lib.pmdcache as pmdcache
+
+
+def test_apply_cache(tmp_path):
+    lib_dir = tmp_path / "pmd-bin" / "lib"
+    lib_dir.mkdir(parents=True)
+    (lib_dir / "pmd-core-6.27.0.jar").write_text("")
+    ruleset = tmp_path / "rules-pmd.xml"
+    ruleset.write_text("<ruleset/>")
+    config.set("SCAN_PMD_CACHE_DIR", str(tmp_path / "pmd-cache"))
+    pmd_cmd = str(tmp_path / "pmd-bin" / "bin" / "run.sh")
+    args = [pmd_cmd, "pmd", "-no-cache", "-d", "/app", "-R", str(ruleset)]
+    try:
+        assert pmdcache.apply_cache("bandit", ["bandit", "-r", "/app"]) == [
+            "bandit",
+            "-r",
+            "/app",
+        ]
+        cached_args = pmdcache.apply_cache("source-java", args)
+        assert "-no-cache" not in cached_args
+        cache_file = cached_args[cached_args.index("-cache") + 1]
+        assert cache_file.startswith(str(tmp_path / "pmd-cache" / "app-"))
+        # Same inputs use the same cache
+        assert pmdcache.apply_cache("source-java", args) == cached_args
+        with open(cache_file, "w") as fp:
+            fp.write("cache")
+        # Changes to the rules start a new cache
+        ruleset.write_text("<ruleset><rule/></ruleset>")
+        new_args = pmdcache.apply_cache("source-java", args)
+        assert new_args[new_args.index("-cache") + 1] != cache_file
+        assert not os.path.exists(cache_file)
+        # Caches are specific to the tool
+        apex_args = pmdcache.apply_cache("source-apex", args)
+        assert apex_args[apex_args.index("-cache") + 1] != cache_file
+    finally:
+        config.set("SCAN_PMD_CACHE_DIR", None)
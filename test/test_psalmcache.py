@@ -0,0 +1,105 @@
+import json
+import os
+import stat
+
+import lib.config as config
+import lib.psalmcache as psalmcache
+from lib.scheduler import Task
+
+
+def fake_psalm(tmp_path, version):
+    vendor_dir = tmp_path / "phpsast" / "vendor"
+    (vendor_dir / "bin").mkdir(parents=True, exist_ok=True)
+    (vendor_dir / "composer").mkdir(exist_ok=True)
+    psalm = vendor_dir / "bin" / "psalm"
+    psalm.write_text("#!/bin/sh\n")
+    psalm.chmod(psalm.stat().st_mode | stat.S_IEXEC)
+    with open(str(vendor_dir / "composer" / "installed.json"), "w") as fp:
+        json.dump({"packages": [{"name": "vimeo/psalm", "version": version}]}, fp)
+    psalmcache._versions.clear()
+    return {"PATH": str(vendor_dir / "bin")}
+
+
+def test_apply_cache(tmp_path):
+    env = fake_psalm(tmp_path, "4.1.0")
+    src = tmp_path / "app"
+    src.mkdir()
+    (src / "composer.lock").write_text("{}")
+    config.set("SCAN_PSALM_CACHE_DIR", str(tmp_path / "psalm-cache"))
+    args = ["psalm", "-m", "--no-file-cache", "--no-cache", "--root=" + str(src)]
+    taint_args = [env["PATH"] + "/psalm", "--taint-analysis"] + args[1:]
+    try:
+        assert psalmcache.apply_cache(["bandit", "-r", "/app"], env) == (
+            ["bandit", "-r", "/app"],
+            env,
+        )
+        cached_args, cached_env = psalmcache.apply_cache(args, env)
+        assert cached_args == ["psalm", "-m", "--root=" + str(src)]
+        cache_dir = cached_env["XDG_CACHE_HOME"]
+        assert os.path.isdir(cache_dir)
+        assert "XDG_CACHE_HOME" not in env
+        # Cache is shared by the psalm based tools
+        assert psalmcache.apply_cache(taint_args, env)[1]["XDG_CACHE_HOME"] == cache_dir
+        # Changes to the dependencies start a new cache
+        (src / "composer.lock").write_text('{"packages": []}')
+        new_env = psalmcache.apply_cache(args, env)[1]
+        assert new_env["XDG_CACHE_HOME"] != cache_dir
+        assert not os.path.exists(cache_dir)
+        # Upgrade of psalm starts a new cache
+        env = fake_psalm(tmp_path, "4.2.0")
+        assert (
+            psalmcache.apply_cache(args, env)[1]["XDG_CACHE_HOME"]
+            != new_env["XDG_CACHE_HOME"]
+        )
+    finally:
+        config.set("SCAN_PSALM_CACHE_DIR", None)
+
+
+def test_config_cache(tmp_path):
+    env = fake_psalm(tmp_path, "4.1.0")
+    src = tmp_path / "app"
+    (src / "src").mkdir(parents=True)
+    (src / "src" / "index.php").write_text("<?php")
+    config.set("SCAN_PSALM_CACHE_DIR", str(tmp_path / "psalm-cache"))
+    args = ["psalm", "--init", "--root=" + str(src), ".", "1"]
+    try:
+        assert psalmcache.get_config_cache(args[:1] + args[2:], env) is None
+        config_cache = psalmcache.get_config_cache(args, env)
+        assert not psalmcache.restore_config(config_cache, args)
+        # Configuration generated by psalm --init
+        (src / "psalm.xml").write_text("<psalm/>")
+        psalmcache.save_config(config_cache, args)
+        assert os.path.isfile(config_cache)
+        # Project with its own configuration
+        assert psalmcache.get_config_cache(args, env) is None
+        (src / "psalm.xml").unlink()
+        assert psalmcache.get_config_cache(args, env) == config_cache
+        assert psalmcache.restore_config(config_cache, args)
+        assert (src / "psalm.xml").read_text() == "<psalm/>"
+        (src / "psalm.xml").unlink()
+        # Changes to the source layout require a new configuration
+        (src / "lib").mkdir()
+        (src / "lib" / "util.php").write_text("<?php")
+        assert psalmcache.get_config_cache(args, env) != config_cache
+    finally:
+        config.set("SCAN_PSALM_CACHE_DIR", None)
+
+
+def test_order_tasks():
+    tasks = {
+        "audit-init": Task("audit-init", "php", None, (["psalm", "--init"],)),
+        "audit-php": Task("audit-php", "php", None, (["psalm", "-m"],), ["audit-init"]),
+        "taint-php": Task(
+            "taint-php",
+            "php",
+            None,
+            (["/opt/phpsast/vendor/bin/psalm", "--taint-analysis"],),
+            ["audit-init"],
+        ),
+        "source-php": Task("source-php", "php", None, (["phpstan"],)),
+    }
+    psalmcache.order_tasks(tasks)
+    assert tasks["audit-init"].deps == set()
+    assert tasks["audit-php"].deps == {"audit-init"}
+    assert tasks["taint-php"].deps == {"audit-init", "audit-php"}
+    assert tasks["source-php"].deps == set()
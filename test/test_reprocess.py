@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import lib.manifest as manifest
+import lib.reprocess as reprocess
+from lib.scheduler import Task
+
+data_dir = Path(__file__).parent / "data"
+
+
+def test_jobs_from_file_names():
+    with tempfile.TemporaryDirectory() as reports_dir:
+        shutil.copy(
+            data_dir / "bandit-report.json",
+            os.path.join(reports_dir, "source-python-report.json"),
+        )
+        shutil.copy(
+            data_dir / "taint-php-report.json",
+            os.path.join(reports_dir, "taint-php-report.json"),
+        )
+        shutil.copy(
+            data_dir / "bandit-report.sarif",
+            os.path.join(reports_dir, "source-python-report.sarif"),
+        )
+        jobs = reprocess.jobs_from_file_names(reports_dir, "/app")
+        assert [(j[0], j[4]) for j in jobs] == [
+            ("source-python", os.path.join(reports_dir, "source-python-report.sarif")),
+            (
+                "/opt/phpsast/vendor/bin/psalm",
+                os.path.join(reports_dir, "taint-php-report.sarif"),
+            ),
+        ]
+        assert "--taint-analysis" in jobs[1][1]
+
+
+def test_reprocess():
+    with tempfile.TemporaryDirectory() as src:
+        reports_dir = os.path.join(src, "reports")
+        os.makedirs(reports_dir)
+        report_file = os.path.join(reports_dir, "source-python-report.json")
+        converted_file = os.path.join(reports_dir, "source-python-report.sarif")
+        shutil.copy(data_dir / "bandit-report.json", report_file)
+        run_manifest = manifest.RunManifest(reports_dir, src)
+        task = Task("python", "python", None)
+        task.status = "success"
+        task.files = [report_file]
+        task.conversions = [
+            {
+                "tool_name": "source-python",
+                "tool_args": ["-r"],
+                "working_dir": "/app/missing",
+                "report_file": report_file,
+                "converted_file": converted_file,
+                "file_path_list": None,
+                "failure_reason": None,
+            }
+        ]
+        run_manifest.record(task)
+        sarif_files = reprocess.reprocess(
+            reports_dir, src, manifest.RunManifest(reports_dir, src)
+        )
+        assert sarif_files == [converted_file]
+        with open(converted_file) as fp:
+            data = json.load(fp)
+        assert data["runs"][0]["results"]
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import tempfile
+
+import lib.config as config
+import lib.resources as resources
+
+
+def write_file(dirname, fname, content):
+    fpath = os.path.join(dirname, fname)
+    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+    with open(fpath, "w") as fp:
+        fp.write(content)
+
+
+def test_cgroup_v2_limits():
+    with tempfile.TemporaryDirectory() as root:
+        write_file(root, "cpu.max", "150000 100000\n")
+        write_file(root, "memory.max", "4294967296\n")
+        assert resources.get_cgroup_cpu_limit(root) == 1.5
+        assert resources.get_cgroup_memory_limit(root) == 4096
+        write_file(root, "cpu.max", "max 100000\n")
+        write_file(root, "memory.max", "max\n")
+        assert resources.get_cgroup_cpu_limit(root) is None
+        assert resources.get_cgroup_memory_limit(root) is None
+
+
+def test_cgroup_v1_limits():
+    with tempfile.TemporaryDirectory() as root:
+        write_file(root, "cpu/cpu.cfs_quota_us", "200000")
+        write_file(root, "cpu/cpu.cfs_period_us", "100000")
+        write_file(root, "memory/memory.limit_in_bytes", "2147483648")
+        assert resources.get_cgroup_cpu_limit(root) == 2
+        assert resources.get_cgroup_memory_limit(root) == 2048
+        write_file(root, "cpu/cpu.cfs_quota_us", "-1")
+        write_file(root, "memory/memory.limit_in_bytes", "9223372036854771712")
+        assert resources.get_cgroup_cpu_limit(root) is None
+        assert resources.get_cgroup_memory_limit(root) is None
+
+
+def test_tool_weight():
+    w = resources.get_tool_weight("unknown-tool")
+    assert w == {"cpu": 1, "memory": 256}
+    w = resources.get_tool_weight("audit-kt")
+    assert w["memory"] == 2048
+    resources.record_peak_memory("learnt-tool", 1000)
+    assert resources.get_tool_weight("learnt-tool")["memory"] == 1200
+    resources.record_peak_memory("learnt-tool", 200)
+    assert resources.get_tool_weight("learnt-tool")["memory"] == 480
+
+
+def test_admission():
+    controller = resources.AdmissionController(2, 3000)
+    heavy = {"cpu": 2, "memory": 2048}
+    light = {"cpu": 1, "memory": 256}
+    assert controller.fits(heavy)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(controller.acquire(heavy))
+    assert not controller.fits(light)
+    loop.run_until_complete(controller.release(heavy))
+    loop.run_until_complete(controller.acquire(light))
+    assert controller.fits(light)
+    assert not controller.fits(heavy)
+    # Tools heavier than the budget run alone
+    loop.run_until_complete(controller.release(light))
+    assert controller.fits({"cpu": 8, "memory": 10000})
+    loop.close()
+
+
+def test_tool_timeout():
+    assert resources.get_tool_timeout("audit-init") == 300
+    assert resources.get_tool_timeout("audit-kt") == 2400
+    assert resources.get_tool_timeout("taint-php") == 1800
+    assert resources.get_tool_timeout("yamllint") == 900
+    config.set("tool_timeouts", {"yamllint": 5, "taint-php": 0})
+    assert resources.get_tool_timeout("yamllint") == 5
+    assert resources.get_tool_timeout("taint-php") is None
+    config.set("tool_timeouts", {})
+
+
+def test_jvm_sizing():
+    assert resources.get_jvm_memory_demand(None) == 512
+    size = {"files": 2000, "bytes": 40 * 1024 * 1024, "loc": 800000}
+    demand = resources.get_jvm_memory_demand(size, classes=8000)
+    assert demand == 512 + 500 + 960
+    # Slot is enlarged to fit the heap within the memory budget
+    weight, heap = resources.get_jvm_weight({"cpu": 2, "memory": 1024}, demand, 8192)
+    assert weight["memory"] >= heap / 0.75 and heap == demand
+    weight, heap = resources.get_jvm_weight({"cpu": 2, "memory": 1024}, demand, 2048)
+    assert weight["memory"] == 2048 and heap == 1536
+    options = resources.get_jvm_options(heap, size, 1)
+    assert options == ["-Xmx1536m", "-XX:+UseSerialGC", "-XX:+ExitOnOutOfMemoryError"]
+    options = resources.get_jvm_options(4096, {"files": 1, "bytes": 1 << 20}, 4)
+    assert options == [
+        "-Xmx4096m",
+        "-Xss4m",
+        "-XX:+UseParallelGC",
+        "-XX:+ExitOnOutOfMemoryError",
+    ]
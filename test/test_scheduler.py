@@ -0,0 +1,325 @@
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+import lib.config as config
+import lib.engine as engine
+import lib.scheduler as scheduler
+import lib.tools as tools
+from lib.executor import exec_tool
+
+
+def ok_scan(src, reports_dir, convert, repo_context):
+    return 0
+
+
+def java_scan(src, reports_dir, convert, repo_context):
+    return 0
+
+
+def broken_scan(src, reports_dir, convert, repo_context):
+    raise ValueError("broken")
+
+
+def fake_build(type_list, src, reports_dir):
+    time.sleep(0.1)
+    return True
+
+
+def test_build_task_graph():
+    missing = []
+    tasks = scheduler.build_task_graph(
+        ["php", "java", "ok", "unknown"],
+        "/app",
+        "/app/reports",
+        True,
+        "ci",
+        {},
+        sys.modules[__name__],
+        build_fn=fake_build,
+        on_missing=missing.append,
+    )
+    assert list(tasks.keys()) == [
+        "auto-build-php",
+        "auto-build-java",
+        "audit-init",
+        "audit-php",
+        "taint-php",
+        "java",
+        "ok",
+    ]
+    assert tasks["auto-build-java"].args[0] == ["java"]
+    assert tasks["audit-init"].deps == {"auto-build-php"}
+    assert tasks["audit-php"].deps == {"audit-init", "auto-build-php"}
+    assert tasks["taint-php"].deps == {"audit-init", "auto-build-php"}
+    assert tasks["java"].deps == {"auto-build-java"}
+    assert tasks["ok"].deps == set()
+    assert missing == ["unknown"]
+
+
+def nodejs_scan_tasks():
+    return {"class": ok_scan, "source-js": ok_scan}
+
+
+def test_build_task_graph_split():
+    tasks = scheduler.build_task_graph(
+        ["java", "scala", "nodejs", "depscan"],
+        "/app",
+        "/app/reports",
+        True,
+        "ci",
+        {},
+        sys.modules[__name__],
+        build_fn=fake_build,
+    )
+    assert list(tasks.keys()) == [
+        "auto-build-java",
+        "auto-build-scala",
+        "auto-build-nodejs",
+        "java",
+        "audit-scala",
+        "class",
+        "source-js",
+        "depscan",
+    ]
+    # Builds sharing the build system run one after another
+    assert tasks["auto-build-scala"].deps == {"auto-build-java"}
+    assert tasks["auto-build-nodejs"].deps == set()
+    assert tasks["audit-scala"].deps == {"auto-build-java", "auto-build-scala"}
+    assert tasks["class"].deps == {"auto-build-java", "auto-build-scala"}
+    assert tasks["source-js"].deps == set()
+    assert tasks["depscan"].deps == {"auto-build-nodejs"}
+
+
+def test_run_tasks():
+    tasks = scheduler.build_task_graph(
+        ["java", "ok", "broken"],
+        "/app",
+        "/app/reports",
+        True,
+        "ci",
+        {},
+        sys.modules[__name__],
+        build_fn=fake_build,
+    )
+    scheduler.run_tasks(tasks, max_workers=2)
+    assert tasks["auto-build-java"].status == "success"
+    assert tasks["auto-build-java"].returncode == 0
+    assert tasks["java"].status == "success"
+    assert tasks["java"].returncode == 0
+    assert tasks["java"].start_time >= tasks["auto-build-java"].end_time
+    # Tools not depending on the build run along with the build
+    assert tasks["ok"].start_time < tasks["auto-build-java"].end_time
+    assert tasks["broken"].status == "failed"
+    assert isinstance(tasks["broken"].exception, ValueError)
+
+
+def test_run_tasks_cycle():
+    tasks = scheduler.build_task_graph(
+        ["ok"], "/app", "/app/reports", True, "ci", {}, sys.modules[__name__]
+    )
+    tasks["ok"].deps.add("ok")
+    scheduler.run_tasks(tasks, max_workers=1)
+    assert tasks["ok"].status == "skipped"
+
+
+def sleepy_scan(src, reports_dir, convert, repo_context):
+    return exec_tool("sleepy", ["sh", "-c", "sleep 30 & sleep 30"])
+
+
+def test_run_tasks_timeout():
+    config.set("tool_timeouts", {"sleepy": 1})
+    tasks = scheduler.build_task_graph(
+        ["sleepy"], "/tmp", "/tmp/reports", True, "ci", {}, sys.modules[__name__]
+    )
+    scheduler.run_tasks(tasks, max_workers=1)
+    config.set("tool_timeouts", {})
+    assert tasks["sleepy"].status == "success"
+    assert tasks["sleepy"].duration < 10
+    assert tasks["sleepy"].result.timed_out
+
+
+def missing_scan(src, reports_dir, convert, repo_context):
+    return exec_tool("missing", ["scan-missing-tool", "--version"])
+
+
+def test_run_tasks_missing_tool():
+    tasks = scheduler.build_task_graph(
+        ["missing"], "/tmp", "/tmp/reports", True, "ci", {}, sys.modules[__name__]
+    )
+    scheduler.run_tasks(tasks, max_workers=1)
+    assert tasks["missing"].status == "failed"
+    assert isinstance(tasks["missing"].exception, OSError)
+    # Callers outside the scheduler such as the builder get None
+    assert exec_tool("missing", ["scan-missing-tool", "--version"]) is None
+
+
+FAKE_JAVA = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+[ -f "$(dirname "$0")/calls.log.1" ] && exit 0
+touch "$(dirname "$0")/calls.log.1"
+exit 3
+"""
+
+
+def oom_scan(src, reports_dir, convert, repo_context):
+    return exec_tool("oom", [os.path.join(src, "java"), "-jar", "oom.jar"])
+
+
+def test_run_tasks_oom_retry(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "OOM_PEAK_RATIO", 0)
+    java = tmp_path / "java"
+    java.write_text(FAKE_JAVA)
+    java.chmod(0o755)
+    tasks = scheduler.build_task_graph(
+        ["oom"], str(tmp_path), "/tmp/reports", True, "ci", {}, sys.modules[__name__]
+    )
+    tasks["oom"].memory_demand = 1024
+    scheduler.run_tasks(tasks, max_workers=1)
+    assert tasks["oom"].result.returncode == 0
+    calls = (tmp_path / "calls.log").read_text().splitlines()
+    assert len(calls) == 2
+    assert "-Xmx1024m" in calls[0].split(" ")
+    assert "-XX:+ExitOnOutOfMemoryError" in calls[0].split(" ")
+    assert "-Xmx2048m" in calls[1].split(" ")
+
+
+def failing_scan(src, reports_dir, convert, repo_context):
+    time.sleep(0.5)
+    return 0
+
+
+def after_scan(src, reports_dir, convert, repo_context):
+    return 0
+
+
+def test_run_tasks_cancel():
+    tasks = scheduler.build_task_graph(
+        ["sleepy", "failing", "after"],
+        "/tmp",
+        "/tmp/reports",
+        True,
+        "ci",
+        {},
+        sys.modules[__name__],
+    )
+    tasks["after"].deps.add("failing")
+    scheduler.run_tasks(tasks, on_complete=lambda t: t.name == "failing")
+    assert tasks["failing"].status == "success"
+    assert tasks["after"].status == "skipped"
+    assert tasks["sleepy"].duration < 10
+    assert tasks["sleepy"].result.cancelled
+
+
+class BlockingHook(tools.ToolHook):
+    def run(self, tool_name, args, cwd=None, env=None, stdout=None, cancel_event=None):
+        cancel_event.wait(30)
+        cp = subprocess.CompletedProcess(args, -15)
+        cp.cancelled = cancel_event.is_set()
+        return cp
+
+
+def hooked_scan(src, reports_dir, convert, repo_context):
+    return exec_tool("hooked", ["hooked-tool", "/app"])
+
+
+def test_run_tasks_cancel_hook(monkeypatch):
+    monkeypatch.setitem(
+        tools._registry,
+        "hooked",
+        tools.ToolDescriptor("hooked", hooks=[BlockingHook()]),
+    )
+    tasks = scheduler.build_task_graph(
+        ["hooked", "failing"],
+        "/tmp",
+        "/tmp/reports",
+        True,
+        "ci",
+        {},
+        sys.modules[__name__],
+    )
+    scheduler.run_tasks(tasks, on_complete=lambda t: t.name == "failing")
+    assert tasks["hooked"].duration < 10
+    assert tasks["hooked"].result.cancelled
+
+
+def test_split_tasks():
+    tasks = OrderedDict()
+    tasks["auto-build-go"] = scheduler.Task("auto-build-go", "go", None)
+    tasks["source-go"] = scheduler.Task("source-go", "go", None, deps=["auto-build-go"])
+    tasks["staticcheck"] = scheduler.Task(
+        "staticcheck", "go", None, deps=["auto-build-go"]
+    )
+    gating, advisory = scheduler.split_tasks(tasks, ["staticcheck", "yamllint"])
+    assert list(gating.keys()) == ["auto-build-go", "source-go"]
+    assert gating["source-go"].deps == {"auto-build-go"}
+    assert list(advisory.keys()) == ["staticcheck"]
+    assert advisory["staticcheck"].deps == set()
+
+
+def test_run_tasks_revise():
+    tasks = scheduler.build_task_graph(
+        ["sleepy", "ok"], "/tmp", "/tmp/reports", True, "ci", {}, sys.modules[__name__]
+    )
+
+    def revise():
+        time.sleep(0.5)
+        return scheduler.build_task_graph(
+            ["ok", "after"],
+            "/tmp",
+            "/tmp/reports",
+            True,
+            "ci",
+            {},
+            sys.modules[__name__],
+        )
+
+    scheduler.run_tasks(tasks, revise=revise)
+    assert tasks["ok"].status == "success"
+    assert tasks["after"].status == "success"
+    assert tasks["sleepy"].status == "skipped"
+    assert tasks["sleepy"].duration < 10
+
+
+def combined_scan(tool_names, src, reports_dir, convert):
+    time.sleep(0.3)
+    return 0
+
+
+def combined_graph(names, deps=()):
+    tasks = scheduler.build_task_graph(
+        names, "/tmp", "/tmp/reports", True, "ci", {}, sys.modules[__name__]
+    )
+    task = scheduler.Task(
+        "combined", "any", combined_scan, (names, "/tmp", "/tmp/reports", True)
+    )
+    scheduler.merge_tasks(tasks, names, task)
+    task.deps.update(deps)
+    return tasks
+
+
+def test_run_tasks_revise_merged():
+    # Task that has not started yet serves the tools of the revised graph
+    tasks = combined_graph(["ok"], ["failing"])
+    tasks.update(
+        scheduler.build_task_graph(
+            ["failing"], "/tmp", "/tmp/reports", True, "ci", {}, sys.modules[__name__]
+        )
+    )
+    scheduler.run_tasks(tasks, revise=lambda: combined_graph(["ok", "after"]))
+    assert tasks["combined"].merged == ["ok", "after"]
+    assert tasks["combined"].status == "success"
+    assert "after" not in tasks
+    # Tools missing from the running task run on their own
+    tasks = combined_graph(["ok"])
+
+    def revise():
+        time.sleep(0.1)
+        return combined_graph(["ok", "after"])
+
+    scheduler.run_tasks(tasks, revise=revise)
+    assert tasks["combined"].merged == ["ok"]
+    assert tasks["after"].status == "success"
+    assert "ok" not in tasks
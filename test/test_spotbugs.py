@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+import lib.scheduler as scheduler
+import lib.spotbugs as spotbugs
+
+
+def ok_scan(src, reports_dir, convert, repo_context):
+    return 0
+
+
+def get_tasks():
+    tasks = OrderedDict()
+    tasks["auto-build-kotlin"] = scheduler.Task("auto-build-kotlin", "kotlin", ok_scan)
+    tasks["auto-build-java"] = scheduler.Task("auto-build-java", "java", ok_scan)
+    tasks["audit-kt"] = scheduler.Task(
+        "audit-kt", "kotlin", ok_scan, deps=["auto-build-kotlin"]
+    )
+    tasks["source-java"] = scheduler.Task("source-java", "java", ok_scan)
+    tasks["class"] = scheduler.Task(
+        "class", "java", ok_scan, deps=["auto-build-java", "source-java"]
+    )
+    return tasks
+
+
+def test_merge_spotbugs_tasks():
+    tasks = get_tasks()
+    task = spotbugs.merge_spotbugs_tasks(tasks, "/app", "/app/reports", True)
+    # Bugs in the other files are reported by the class tool
+    assert task.merged == ["class", "audit-kt"]
+    assert task.deps == {"auto-build-kotlin", "auto-build-java", "source-java"}
+    assert "class" not in tasks and "audit-kt" not in tasks
+    assert task.args[0] == ["class", "audit-kt"]
+    # Tiered tools run on their own
+    tasks = get_tasks()
+    assert (
+        spotbugs.merge_spotbugs_tasks(tasks, "/app", "/app/reports", True, True) is None
+    )
+    assert "class" in tasks and "audit-kt" in tasks
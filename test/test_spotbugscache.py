@@ -0,0 +1,157 @@
+import os
+import struct
+import subprocess
+
+import lib.config as config
+import lib.spotbugscache as spotbugscache
+from lib.xml_parser import get_report_data
+
+
+def make_class(name, refs=(), descriptors=()):
+    """Construct a minimal class file with the given constant pool"""
+    pool = []
+    for value in [name] + list(refs) + list(descriptors):
+        data = value.encode()
+        pool.append(struct.pack(">BH", 1, len(data)) + data)
+    # Class entries refer to the utf8 entries of the class names
+    for i in range(1 + len(refs)):
+        pool.append(struct.pack(">BH", 7, i + 1))
+    pool.append(struct.pack(">BQ", 5, 42))
+    count = len(pool) + 2
+    this_class = 2 + len(refs) + len(descriptors)
+    return (
+        struct.pack(">IHHH", 0xCAFEBABE, 0, 55, count)
+        + b"".join(pool)
+        + struct.pack(">HHH", 0x21, this_class, 0)
+    )
+
+
+def write_class(src, name, refs=(), descriptors=()):
+    fname = os.path.join(str(src), name + ".class")
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname, "wb") as fp:
+        fp.write(make_class(name, refs, descriptors))
+    return fname
+
+
+def test_get_class_info():
+    name, refs = spotbugscache.get_class_info(
+        make_class(
+            "com/app/Api",
+            ["java/lang/Object", "[Lcom/app/Item;"],
+            ["(Lcom/app/Dao;Ljava/util/List<Lcom/app/Row;>;)V"],
+        )
+    )
+    assert name == "com/app/Api"
+    assert refs == {
+        "java/lang/Object",
+        "com/app/Item",
+        "com/app/Dao",
+        "java/util/List",
+        "com/app/Row",
+    }
+    assert spotbugscache.get_class_info(b"not a class") is None
+
+
+def write_report(fname, classes):
+    bugs = "".join(
+        '<BugInstance type="SQL_INJECTION" priority="1"><Class classname="{}" primary="true"/>'
+        '<SourceLine classname="{}" start="3" sourcepath="{}.java" primary="true"/></BugInstance>'.format(
+            c, c, c.replace(".", "/")
+        )
+        for c in classes
+    )
+    with open(fname, "w") as fp:
+        fp.write(
+            '<BugCollection><Project projectName=""/>{}<Errors/></BugCollection>'.format(
+                bugs
+            )
+        )
+
+
+def test_incremental_run(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path / "cache"))
+    config.set("SCAN_SPOTBUGS_INCREMENTAL", True)
+    config.set("spotbugs_incremental_max_ratio", 0.8)
+    src = tmp_path / "app"
+    write_class(src, "com/app/Api", ["com/app/Dao"])
+    write_class(src, "com/app/Dao")
+    write_class(src, "com/app/Util")
+    report_file = str(tmp_path / "class-report.xml")
+    args = ["java", "-jar", "/opt/spotbugs/lib/spotbugs.jar", "-textui"]
+    args += ["-output", report_file, str(src)]
+    try:
+        assert spotbugscache.prepare("bandit", ["bandit", "-r", str(src)])[1] is None
+        # First run analyses every class
+        run_args, pending = spotbugscache.prepare("class", args)
+        assert run_args == args
+        assert pending["targets"] is None
+        write_report(report_file, ["com.app.Api", "com.app.Util"])
+        spotbugscache.complete(pending, subprocess.CompletedProcess(args, 0))
+        # Nothing has changed
+        run_args, pending = spotbugscache.prepare("class", args)
+        assert pending["targets"] == set()
+        os.remove(report_file)
+        assert spotbugscache.complete(pending) == 2
+        assert len(get_report_data(report_file)[0]) == 2
+        # Changed class along with the classes referring to it
+        write_class(src, "com/app/Dao", ["java/lang/String"])
+        run_args, pending = spotbugscache.prepare("class", args)
+        assert pending["targets"] == {"com/app/Api", "com/app/Dao"}
+        assert run_args[-4:] == [
+            "-auxclasspath",
+            str(src),
+            "-analyzeFromFile",
+            pending["targets_file"],
+        ]
+        with open(pending["targets_file"]) as fp:
+            assert sorted(fp.read().split()) == [
+                os.path.join(str(src), "com/app/Api.class"),
+                os.path.join(str(src), "com/app/Dao.class"),
+            ]
+        write_report(report_file, ["com.app.Dao"])
+        assert (
+            spotbugscache.complete(pending, subprocess.CompletedProcess(args, 0)) == 1
+        )
+        assert not os.path.exists(pending["targets_file"])
+        issues = get_report_data(report_file)[0]
+        assert sorted(i["filename"] for i in issues) == [
+            "com/app/Dao.java",
+            "com/app/Util.java",
+        ]
+        # Findings of the removed classes are dropped
+        os.remove(os.path.join(str(src), "com/app/Util.class"))
+        _, pending = spotbugscache.prepare("class", args)
+        assert pending["targets"] == set()
+        assert spotbugscache.complete(pending) == 1
+    finally:
+        config.set("SCAN_CACHE_DIR", cache_dir)
+        config.set("SCAN_SPOTBUGS_INCREMENTAL", False)
+        config.set("spotbugs_incremental_max_ratio", 0.3)
+
+
+def test_get_state_file(tmp_path):
+    cache_dir = config.get("SCAN_CACHE_DIR")
+    config.set("SCAN_CACHE_DIR", str(tmp_path / "cache"))
+    jar_file = tmp_path / "lib.jar"
+    jar_file.write_text("v1")
+    aux_file = tmp_path / "aux.txt"
+    aux_file.write_text(str(jar_file) + "\n")
+    args = [
+        "java",
+        "-jar",
+        "spotbugs.jar",
+        "-auxclasspathFromFile",
+        str(aux_file),
+        str(tmp_path),
+    ]
+    try:
+        state_file, prefix = spotbugscache.get_state_file("class", args)
+        assert state_file.startswith(prefix)
+        assert spotbugscache.get_state_file("class", args)[0] == state_file
+        # Dependencies are listed by path so their contents make up the key
+        jar_file.write_text("v2.1")
+        assert spotbugscache.get_state_file("class", args)[0] != state_file
+    finally:
+        config.set("SCAN_CACHE_DIR", cache_dir)
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import lib.config as config
+import lib.manifest as manifest
+import lib.scheduler as scheduler
+import lib.tiers as tiers
+
+
+def write_file(dirname, fname, content):
+    fpath = os.path.join(dirname, fname)
+    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+    with open(fpath, "w") as fp:
+        fp.write(content)
+    return fpath
+
+
+def test_select_files():
+    with tempfile.TemporaryDirectory() as src:
+        web = write_file(
+            src,
+            "src/main/java/com/acme/web/Login.java",
+            'package com.acme.web;\nclass Login { String u = req.getParameter("u"); }',
+        )
+        util = write_file(
+            src,
+            "src/main/java/com/acme/util/Strings.java",
+            "package com.acme.util;\nclass Strings {}",
+        )
+        dao = write_file(
+            src,
+            "src/main/java/com/acme/dao/Dao.java",
+            "package com.acme.dao;\nclass Dao {}",
+        )
+        files = [web, util, dao]
+        rule = config.get("tiered_tools")["class"]
+        assert tiers.build_keyword_index(files, rule["keywords"]) == {web}
+        sarif_file = write_file(
+            src,
+            "reports/source-java-report.sarif",
+            json.dumps(
+                {
+                    "runs": [
+                        {
+                            "results": [
+                                {
+                                    "locations": [
+                                        {
+                                            "physicalLocation": {
+                                                "artifactLocation": {
+                                                    "uri": "https://github.com/acme/app/blob/main/src/main/java/com/acme/dao/Dao.java"
+                                                }
+                                            }
+                                        }
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ),
+        )
+        assert tiers.get_flagged_files([sarif_file], files, src) == {dao}
+        assert tiers.get_scope_args(rule, [web, dao]) == [
+            "-onlyAnalyze",
+            "com.acme.dao.*,com.acme.web.*",
+        ]
+        assert tiers.get_scope_args({"option": []}, [web]) == [web]
+
+
+def dummy_scan(src, reports_dir, convert, repo_context):
+    return 0
+
+
+def test_apply_tiers():
+    tasks = OrderedDict()
+    tasks["source-java"] = scheduler.Task("source-java", "java", dummy_scan)
+    tasks["class"] = scheduler.Task("class", "java", dummy_scan)
+    assert tiers.apply_tiers(tasks, "/app") == ["class"]
+    assert tasks["class"].deps == {"source-java"}
+    assert tasks["class"].fn.__name__ == "dummy_scan"
+
+
+def test_add_scope_args():
+    args = ["psalm", "--taint-analysis", "--report=/reports/taint-php-report.sarif"]
+    assert tiers.add_scope_args("taint-php", args) == args
+    task = scheduler.Task("taint-php", "php", dummy_scan)
+    task.scope_args = ["/app/login.php"]
+    manifest.set_current_task(task)
+    try:
+        assert tiers.add_scope_args("taint-php", args) == args + ["/app/login.php"]
+        task = scheduler.Task("class", "java", dummy_scan)
+        task.scope_args = ["-onlyAnalyze", "com.acme.*"]
+        manifest.set_current_task(task)
+        assert tiers.add_scope_args("class", ["spotbugs", "-xml", "/app"]) == [
+            "spotbugs",
+            "-xml",
+            "-onlyAnalyze",
+            "com.acme.*",
+            "/app",
+        ]
+        assert tiers.add_scope_args("taint-php", args) == args
+    finally:
+        manifest.set_current_task(None)
@@ -0,0 +1,118 @@
+import subprocess
+
+import lib.config as config
+import lib.tools as tools
+
+
+def test_default_cmd_descriptor():
+    tool = tools.get_tool("yamllint")
+    assert tool.type_str == "yaml"
+    assert tool.cmd[0] == "yamllint"
+    assert tool.input_kind == tools.INPUT_FILELIST
+    assert tool.shardable
+    assert tool.parser == "yamllint"
+    assert tool.output_format == "out"
+    assert tool.advisory
+    tool = tools.get_tool("audit-kt")
+    assert tool.input_kind == tools.INPUT_ARTIFACTS
+    assert tool.parser == "audit-kt"
+    assert tool.output_format == "xml"
+    assert tool.needs_build == ["kotlin"]
+    assert tool.weight["memory"] >= 2048
+    assert tool.cost == config.get("tool_cost_estimates")["class"]
+    assert not tool.shardable
+
+
+def test_declared_descriptor():
+    tool = tools.get_tool("source-java")
+    assert tool.type_str == "java"
+    assert tool.cmd is None
+    assert tool.output_format == "csv"
+    assert tool.parser == "source-java"
+    tool = tools.get_tool("class")
+    assert tool.input_kind == tools.INPUT_ARTIFACTS
+    assert tool.tiered["after"] == ["source-java"]
+    assert "class" in tools.get_tools()
+
+
+def test_register_tool():
+    tools.register_tool(
+        tools.ToolDescriptor(
+            "semgrep",
+            type_str="python",
+            cmd=["semgrep", "--json", "-o", "%(report_fname_prefix)s.json"],
+            shardable=True,
+        )
+    )
+    tool = tools.get_tool("semgrep")
+    assert tool.output_format == "json"
+    assert tool.input_kind == tools.INPUT_DIR
+    assert tool.shardable
+    assert tools.get_tools()["semgrep"] is tool
+
+
+def test_apply_thread_share():
+    args, env = tools.apply_thread_share(
+        ["/opt/pmd-bin/bin/run.sh", "pmd", "-d", "/app"], {"PATH": "/bin"}, 4
+    )
+    assert args[-2:] == ["-threads", "4"]
+    assert env["PMD_JAVA_OPTS"] == "-XX:ActiveProcessorCount=4"
+    args, env = tools.apply_thread_share(
+        ["java", "-jar", "/usr/local/bin/detekt-cli.jar", "-i", "/app"], None, 1
+    )
+    assert args[1] == "-XX:ActiveProcessorCount=1"
+    assert "--parallel" not in args
+    args, _ = tools.apply_thread_share(
+        ["java", "-jar", "/usr/local/bin/detekt-cli.jar", "-i", "/app"], None, 2
+    )
+    assert args[-1] == "--parallel"
+    args, _ = tools.apply_thread_share(["psalm", "--threads=1", "--no-cache"], None, 8)
+    assert args == ["psalm", "--threads=1", "--no-cache"]
+    args, _ = tools.apply_thread_share(["bandit", "-r", "/app"], None, 8)
+    assert args == ["bandit", "-r", "/app"]
+
+
+class SkipHook(tools.ToolHook):
+    def prepare(self, tool_name, args, env=None, cwd=None):
+        return args + ["--cached"], env, {"completed": []}
+
+    def reuse(self, state, args, cwd=None):
+        return subprocess.CompletedProcess(args, 0)
+
+    def complete(self, state, cp=None):
+        state["completed"].append(cp.returncode)
+
+
+def test_tool_hooks():
+    hook = SkipHook()
+    tool = tools.ToolDescriptor("lint", cmd=["lint", "/app"], hooks=[hook])
+    args, env, pending = tool.prepare(["lint", "/app"], {"PATH": "/bin"})
+    assert args == ["lint", "/app", "--cached"]
+    assert pending == [(hook, {"completed": []})]
+    cp = tool.reuse(pending, args)
+    assert cp.args == args
+    assert tool.run(args) is None
+    tool.complete(pending, cp)
+    assert pending[0][1]["completed"] == [0]
+    assert tools.ToolDescriptor("lint", hooks=[]).prepare(["lint"]) == (
+        ["lint"],
+        None,
+        [],
+    )
+
+
+def test_command_helpers(monkeypatch):
+    args = ["pmd", "-d", "/app", "-R", "rules.xml", "-no-cache"]
+    assert tools.get_arg_value(args, "-R") == "rules.xml"
+    assert tools.get_arg_value(args, "-no-cache") is None
+    assert tools.get_launcher_lib_dir("/opt/pmd-bin/bin/run.sh") == "/opt/pmd-bin/lib"
+    prefix = tools.get_cache_prefix("/cache", "/work/app", "source-java")
+    assert prefix.startswith("/cache/app-")
+    assert prefix.endswith("-source-java-")
+    assert (
+        tools.get_cache_prefix("/cache", "/work/app") == prefix[: -len("source-java-")]
+    )
+    monkeypatch.setenv("SCAN_JVM_DAEMON", "Yes")
+    assert tools.get_flag("SCAN_JVM_DAEMON")
+    monkeypatch.setenv("SCAN_JVM_DAEMON", "false")
+    assert not tools.get_flag("SCAN_JVM_DAEMON")
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import lib.utils as utils
 
 
@@ -66,3 +69,18 @@ def test_filter_ignored_files():
     assert d
     d = utils.is_ignored_file("", ".eslintrc.js")
     assert d
+
+
+def test_detect_project_type_cached():
+    with tempfile.TemporaryDirectory() as src:
+        with open(os.path.join(src, "app.py"), "w") as fp:
+            fp.write("print(1)")
+        detected, confirm = utils.detect_project_type_cached(src, "ci")
+        assert confirm is None
+        assert detected == utils.detect_project_type(src, "ci")
+        types, confirm = utils.detect_project_type_cached(src, "ci")
+        assert types == detected
+        assert confirm() == detected
+        # Adding a top level directory changes the signature
+        os.makedirs(os.path.join(src, "lib"))
+        assert utils.get_cached_project_type(src, "ci") is None
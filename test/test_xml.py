@@ -33,3 +33,32 @@ def test_checkstyle_parse():
             "test_id": "detekt.UnreachableCode",
             "title": "This expression is followed by unreachable code which should either be used or removed.",
         }
+
+
+def test_split_report(tmp_path):
+    report_file = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "data",
+        "findsecbugs-report.xml",
+    )
+    with open(report_file) as rf:
+        issues, _ = xml_parser.get_report_data(rf)
+    report_files = {
+        "class": str(tmp_path / "class-report.xml"),
+        "audit-kt": str(tmp_path / "audit-kt-report.xml"),
+    }
+    counts = xml_parser.split_report(
+        report_file, report_files, {"class": [".java"], "audit-kt": [".kt"]}
+    )
+    assert counts == {"class": len(issues), "audit-kt": 0}
+    with open(report_files["class"]) as rf:
+        split_issues, metrics = xml_parser.get_report_data(rf)
+        assert split_issues == issues
+        assert len(metrics.keys()) == 1
+    with open(report_files["audit-kt"]) as rf:
+        assert xml_parser.get_report_data(rf)[0] == []
+    # Bugs are assigned by the extension of the source file
+    counts = xml_parser.split_report(
+        report_file, report_files, {"class": [".kt"], "audit-kt": [".java"]}
+    )
+    assert counts == {"class": 0, "audit-kt": len(issues)}
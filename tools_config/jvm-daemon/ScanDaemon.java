@@ -0,0 +1,321 @@
+// This file is part of Scan.
+
+// Scan is free software: you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+
+// Scan is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+
+// You should have received a copy of the GNU General Public License
+// along with Scan.  If not, see <https://www.gnu.org/licenses/>.
+
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.DataOutputStream;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.InetAddress;
+import java.net.MalformedURLException;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.net.SocketTimeoutException;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardCopyOption;
+import java.security.Permission;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.atomic.AtomicBoolean;
+import java.util.concurrent.atomic.AtomicInteger;
+import java.util.jar.JarFile;
+
+/**
+ * Long lived jvm that runs the java based tools used by scan such as PMD, SpotBugs and
+ * detekt in-process, so that repeated scans do not pay for the jvm startup and warm-up.
+ *
+ * <p>Started by lib/jvmdaemon.py with the single-file source launcher:
+ * <pre>java ScanDaemon.java &lt;port file&gt; &lt;idle seconds&gt;</pre>
+ * The daemon listens on the loopback interface and writes the port to the port file. Every
+ * connection carries one tool invocation:
+ * <pre>
+ * token
+ * main class (empty to use the Main-Class of the first jar)
+ * number of classpath entries, followed by one entry per line
+ * number of arguments, followed by one argument per line
+ * </pre>
+ * The output of the tool is streamed back as length prefixed frames followed by the length
+ * -1 and the exit status. The tool is interrupted when the client sends the line cancel or
+ * disconnects before the tool has completed. Every classpath gets its own class loader which
+ * is reused by the later invocations. The daemon exits once it has been idle for the given
+ * duration.
+ *
+ * <p>Tools calling System.exit would terminate the daemon along with the other tools, so the
+ * daemon refuses to start when the jvm cannot trap System.exit with a security manager.
+ */
+public class ScanDaemon {
+
+    private static final InheritableThreadLocal<OutputStream> OUTPUT =
+            new InheritableThreadLocal<>();
+
+    private static final Map<String, URLClassLoader> LOADERS = new ConcurrentHashMap<>();
+
+    private static final AtomicInteger ACTIVE = new AtomicInteger();
+
+    private static volatile long lastActivity = System.currentTimeMillis();
+
+    /** Raised instead of terminating the daemon when a tool calls System.exit */
+    static class ExitException extends SecurityException {
+        final int status;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    /** Security manager that only traps System.exit from the tools */
+    static class ExitTrap extends SecurityManager {
+        @Override
+        public void checkExit(int status) {
+            if (OUTPUT.get() != null) {
+                throw new ExitException(status);
+            }
+        }
+
+        @Override
+        public void checkPermission(Permission perm) {}
+
+        @Override
+        public void checkPermission(Permission perm, Object context) {}
+    }
+
+    /** Routes System.out and System.err to the client of the current tool */
+    static class RoutingStream extends OutputStream {
+        private final OutputStream fallback;
+
+        RoutingStream(OutputStream fallback) {
+            this.fallback = fallback;
+        }
+
+        private OutputStream target() {
+            OutputStream out = OUTPUT.get();
+            return out != null ? out : fallback;
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            target().write(b);
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            target().write(b, off, len);
+        }
+
+        @Override
+        public void flush() throws IOException {
+            target().flush();
+        }
+    }
+
+    /** Writes the output as length prefixed frames */
+    static class FrameStream extends OutputStream {
+        private final DataOutputStream out;
+
+        FrameStream(OutputStream out) {
+            this.out = new DataOutputStream(new BufferedOutputStream(out));
+        }
+
+        @Override
+        public synchronized void write(int b) throws IOException {
+            write(new byte[] {(byte) b}, 0, 1);
+        }
+
+        @Override
+        public synchronized void write(byte[] b, int off, int len) throws IOException {
+            if (len == 0) {
+                return;
+            }
+            out.writeInt(len);
+            out.write(b, off, len);
+        }
+
+        @Override
+        public synchronized void flush() throws IOException {
+            out.flush();
+        }
+
+        synchronized void finish(int status) throws IOException {
+            out.writeInt(-1);
+            out.writeInt(status);
+            out.flush();
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        Path portFile = Paths.get(args[0]);
+        long idleMillis = Long.parseLong(args[1]) * 1000L;
+        String token = System.getenv("SCAN_JVM_DAEMON_TOKEN");
+        System.setOut(new PrintStream(new RoutingStream(System.out), true));
+        System.setErr(new PrintStream(new RoutingStream(System.err), true));
+        try {
+            System.setSecurityManager(new ExitTrap());
+        } catch (UnsupportedOperationException | SecurityException e) {
+            System.err.println("System.exit cannot be trapped on this jvm. Exiting");
+            System.exit(2);
+        }
+        ServerSocket server = new ServerSocket(0, 50, InetAddress.getLoopbackAddress());
+        server.setSoTimeout(10000);
+        Path tmpFile = Paths.get(portFile.toString() + ".tmp");
+        Files.write(
+                tmpFile, String.valueOf(server.getLocalPort()).getBytes(StandardCharsets.UTF_8));
+        Files.move(tmpFile, portFile, StandardCopyOption.REPLACE_EXISTING);
+        ExecutorService pool = Executors.newCachedThreadPool();
+        while (true) {
+            try {
+                Socket socket = server.accept();
+                ACTIVE.incrementAndGet();
+                pool.submit(() -> handle(socket, token));
+            } catch (SocketTimeoutException e) {
+                if (ACTIVE.get() == 0
+                        && System.currentTimeMillis() - lastActivity > idleMillis) {
+                    break;
+                }
+            }
+        }
+        System.exit(0);
+    }
+
+    private static List<String> readList(BufferedReader in) throws IOException {
+        int count = Integer.parseInt(in.readLine().trim());
+        List<String> result = new ArrayList<>(count);
+        for (int i = 0; i < count; i++) {
+            result.add(in.readLine());
+        }
+        return result;
+    }
+
+    private static void handle(Socket socket, String token) {
+        try (Socket s = socket) {
+            BufferedReader in =
+                    new BufferedReader(
+                            new InputStreamReader(s.getInputStream(), StandardCharsets.UTF_8));
+            if (token == null || !token.equals(in.readLine())) {
+                return;
+            }
+            String mainClass = in.readLine();
+            List<String> classpath = readList(in);
+            List<String> toolArgs = readList(in);
+            FrameStream frames = new FrameStream(s.getOutputStream());
+            BufferedOutputStream output = new BufferedOutputStream(frames);
+            AtomicBoolean done = new AtomicBoolean();
+            watch(in, Thread.currentThread(), done);
+            int status;
+            try {
+                status = run(mainClass, classpath, toolArgs, output);
+            } finally {
+                done.set(true);
+            }
+            output.flush();
+            frames.finish(status);
+        } catch (Exception e) {
+            e.printStackTrace();
+        } finally {
+            // Clear an interrupt that arrived as the tool completed
+            Thread.interrupted();
+            lastActivity = System.currentTimeMillis();
+            ACTIVE.decrementAndGet();
+        }
+    }
+
+    /**
+     * Interrupts the tool when the client sends cancel or disconnects, such as when the tool
+     * has exceeded its time limit or the scan has been cancelled
+     */
+    private static void watch(BufferedReader in, Thread worker, AtomicBoolean done) {
+        Thread watcher =
+                new Thread(
+                        () -> {
+                            try {
+                                in.readLine();
+                            } catch (IOException e) {
+                                // The connection is closed
+                            }
+                            if (!done.get()) {
+                                System.err.println("Interrupting the cancelled tool");
+                                worker.interrupt();
+                            }
+                        },
+                        "scan-daemon-watcher");
+        watcher.setDaemon(true);
+        watcher.start();
+    }
+
+    private static URLClassLoader newLoader(List<String> classpath) {
+        URL[] urls = new URL[classpath.size()];
+        try {
+            for (int i = 0; i < urls.length; i++) {
+                urls[i] = new File(classpath.get(i)).toURI().toURL();
+            }
+        } catch (MalformedURLException e) {
+            throw new IllegalArgumentException(e);
+        }
+        // The platform loader keeps the classes of the tools isolated from each other
+        return new URLClassLoader(urls, ClassLoader.getPlatformClassLoader());
+    }
+
+    private static String getMainClass(String jarFile) throws IOException {
+        try (JarFile jar = new JarFile(jarFile)) {
+            return jar.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+    }
+
+    private static int run(
+            String mainClass, List<String> classpath, List<String> toolArgs, OutputStream output)
+            throws Exception {
+        URLClassLoader loader =
+                LOADERS.computeIfAbsent(
+                        String.join(File.pathSeparator, classpath), key -> newLoader(classpath));
+        if (mainClass == null || mainClass.isEmpty()) {
+            mainClass = getMainClass(classpath.get(0));
+        }
+        Method main = Class.forName(mainClass, true, loader).getMethod("main", String[].class);
+        Thread thread = Thread.currentThread();
+        ClassLoader previous = thread.getContextClassLoader();
+        OUTPUT.set(output);
+        thread.setContextClassLoader(loader);
+        try {
+            main.invoke(null, (Object) toolArgs.toArray(new String[0]));
+            return 0;
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (cause instanceof ExitException) {
+                return ((ExitException) cause).status;
+            }
+            cause.printStackTrace();
+            return 1;
+        } finally {
+            System.out.flush();
+            System.err.flush();
+            OUTPUT.remove();
+            thread.setContextClassLoader(previous);
+        }
+    }
+}